@@ -3,7 +3,7 @@
 #   SPDX-License-Identifier: BSD-3-Clause
 #   For full license text, see the LICENSE file in the repo root or https://opensource.org/licenses/BSD-3-Clause
 
-import shutil, psycopg2
+import shutil, json, psycopg2
 import psycopg2.extras
 from botsim.botsim_utils.utils import (
     get_bot_platform_intents,
@@ -114,14 +114,16 @@ def create_bot_test_database(conn):
         cursor.close()
 
 
-def save_result_to_database(conn, bot_id, intent, mode, total, success, intent_error, ner_error, other_error, turns):
+def save_result_to_database(conn, bot_id, intent, mode, total, success, intent_error, ner_error, other_error, turns,
+                            metrics=None):
     with conn:
         cursor = conn.cursor(cursor_factory=psycopg2.extras.DictCursor)
         cursor.execute("""DELETE FROM results where bot_id = %s and intent = %s and mode = %s """,
                        (bot_id, intent, mode))
         cursor.execute("""INSERT INTO results (bot_id, intent, mode, total, success, intent_error, 
-                          ner_error, other_error, turns) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s) """,
-                       (bot_id, intent, mode, total, success, intent_error, ner_error, other_error, turns))
+                          ner_error, other_error, turns, json) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s) """,
+                       (bot_id, intent, mode, total, success, intent_error, ner_error, other_error, turns,
+                        json.dumps({'metrics': metrics}) if metrics else None))
         cursor.close()
         conn.commit()
 
@@ -234,6 +236,17 @@ def get_one_bot_test_instance(conn, id):
     return dict(data)
 
 
+def retrieve_simulation_metrics(conn, test_id):
+    cursor = conn.cursor(cursor_factory=psycopg2.extras.DictCursor)
+    cursor.execute("""SELECT intent, mode, json FROM results WHERE bot_id = %s""", [test_id])
+    metrics = []
+    for row in cursor.fetchall():
+        if row['json']:
+            metrics.append(dict(json.loads(row['json'])['metrics'], intent=row['intent'], mode=row['mode']))
+    cursor.close()
+    return metrics
+
+
 def get_test_ids(conn, platform):
     ids = []
     cursor = conn.cursor(cursor_factory=psycopg2.extras.DictCursor)
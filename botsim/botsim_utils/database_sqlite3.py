@@ -3,7 +3,7 @@
 #   SPDX-License-Identifier: BSD-3-Clause
 #   For full license text, see the LICENSE file in the repo root or https://opensource.org/licenses/BSD-3-Clause
 
-import sqlite3, shutil
+import sqlite3, shutil, json
 from botsim.botsim_utils.utils import (
     get_bot_platform_intents,
     load_reports,
@@ -201,7 +201,7 @@ def create_bot_test_database(db_name):
 
 
 def save_result_to_database(db_name, test_id, intent, mode, total, success, intent_error, ner_error, other_error,
-                            turns):
+                            turns, metrics=None):
     conn = sqlite3.connect(db_name)
     conn.row_factory = sqlite3.Row
     c = conn.cursor()
@@ -211,14 +211,27 @@ def save_result_to_database(db_name, test_id, intent, mode, total, success, inte
         c.execute("""DELETE FROM results where bot_id = :bot_id and intent = :intent and mode = :mode """,
                   {'bot_id': str(test_id), 'intent': intent, 'mode': mode})
         c.execute("""INSERT INTO results 
-        (bot_id, intent, mode, total, success, intent_error, ner_error, other_error, turns) VALUES 
-        (:bot_id, :intent, :mode, :total, :success, :intent_error, :ner_error, :other_error, :turns) """,
+        (bot_id, intent, mode, total, success, intent_error, ner_error, other_error, turns, json) VALUES 
+        (:bot_id, :intent, :mode, :total, :success, :intent_error, :ner_error, :other_error, :turns, :json) """,
                   {'bot_id': str(test_id), 'intent': intent, 'mode': mode, 'total': total, 'success': success,
                    'intent_error': intent_error,
-                   'ner_error': ner_error, 'other_error': other_error, 'turns': turns})
+                   'ner_error': ner_error, 'other_error': other_error, 'turns': turns,
+                   'json': json.dumps({'metrics': metrics}) if metrics else None})
         conn.commit()
 
 
+def retrieve_simulation_metrics(db_name, test_id):
+    conn = sqlite3.connect(db_name)
+    conn.row_factory = sqlite3.Row
+    c = conn.cursor()
+    c.execute("""SELECT intent, mode, json FROM results WHERE bot_id = :id""", {'id': str(test_id)})
+    metrics = []
+    for row in c.fetchall():
+        if row['json']:
+            metrics.append(dict(json.loads(row['json'])['metrics'], intent=row['intent'], mode=row['mode']))
+    return metrics
+
+
 def update_test_session(db_name, bot):
     conn = sqlite3.connect(db_name)
     conn.row_factory = sqlite3.Row
@@ -129,6 +129,25 @@ def list_s3_objects(bucket, name):
     return res
 
 
+def list_s3_keys(bucket, prefix):
+    """ Keys of all the objects whose key starts with prefix, in lexicographic order """
+    s3_client = boto3.client("s3", aws_access_key_id=access_key,
+                             aws_secret_access_key=secret_key)
+    keys = []
+    for page in s3_client.get_paginator("list_objects_v2").paginate(Bucket=bucket, Prefix=prefix):
+        keys.extend(obj["Key"] for obj in page.get("Contents", []))
+    return keys
+
+
+def delete_s3_files(bucket, names):
+    s3_client = boto3.client("s3", aws_access_key_id=access_key,
+                             aws_secret_access_key=secret_key)
+    # at most 1000 keys per request
+    for start in range(0, len(names), 1000):
+        s3_client.delete_objects(Bucket=bucket,
+                                 Delete={"Objects": [{"Key": name} for name in names[start:start + 1000]]})
+
+
 def dump_s3_file(name, object_data):
     s3_client = boto3.client(service_name="s3", aws_access_key_id=access_key,
                              aws_secret_access_key=secret_key)
@@ -17,7 +17,9 @@ if __name__ == "__main__":
     update_paraphraser_config(args, config)
     generator = Generator(config["generator"]["parser_config"],
                           num_t5_paraphrases=config["generator"]["paraphraser_config"]["num_t5_paraphrases"],
-                          num_pegasus_paraphrases=config["generator"]["paraphraser_config"]["num_pegasus_paraphrases"])
+                          num_pegasus_paraphrases=config["generator"]["paraphraser_config"]["num_pegasus_paraphrases"],
+                          paraphrase_device=config["generator"]["paraphraser_config"].get("device"),
+                          paraphrase_backend=config["generator"]["paraphraser_config"].get("backend"))
     if len(config["generator"]["dev_intents"]) == 0:
         set_default_simulation_intents(config, "generator")
     for intent_set in config["generator"]:
@@ -26,3 +28,5 @@ if __name__ == "__main__":
             config["generator"][intent_set],
             config["generator"]["file_paths"]["goals_dir"],
             config["generator"]["paraphraser_config"]["num_utterances"])
+    if hasattr(generator, "paraphraser"):
+        generator.paraphraser.release_models()
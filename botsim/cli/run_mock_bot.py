@@ -0,0 +1,52 @@
+#  Copyright (c) 2022, salesforce.com, inc.
+#   All rights reserved.
+#   SPDX-License-Identifier: BSD-3-Clause
+#   For full license text, see the LICENSE file in the repo root or https://opensource.org/licenses/BSD-3-Clause
+
+import argparse
+from botsim.cli.utils import load_simulation_config
+from botsim.platforms.botbuilder.mock_liveagent_server import MockBot, MockLiveAgentServer
+
+
+def get_mock_bot_argparser():
+    parser = argparse.ArgumentParser(description="Serve a mock bot over the LiveAgent REST API for offline simulation")
+    parser.add_argument("--platform", help="bot platform [DialogFlow_CX, Einstein_Bot]", type=str,
+                        default="Einstein_Bot")
+    parser.add_argument("--test_name", help="name of the test", type=str, required=True)
+    parser.add_argument("--host", help="host to bind", type=str, default="127.0.0.1")
+    parser.add_argument("--port", help="port to bind", type=int, default=8765)
+    parser.add_argument("--client_poll_timeout", help="LiveAgent clientPollTimeout in seconds", type=int, default=10)
+    parser.add_argument("--response_latency", help="mean bot response latency in seconds", type=float, default=0.5)
+    parser.add_argument("--latency_jitter", help="maximum deviation from the mean latency in seconds", type=float,
+                        default=0.2)
+    parser.add_argument("--error_rate", help="ratio of API requests failed with HTTP 503", type=float, default=0.0)
+    parser.add_argument("--intent_error_rate", help="ratio of intent queries routed to a wrong dialog", type=float,
+                        default=0.0)
+    parser.add_argument("--seed", help="random seed", type=int, default=42)
+    return parser
+
+
+if __name__ == "__main__":
+    args = get_mock_bot_argparser().parse_args()
+    config = load_simulation_config(args.platform, args.test_name)
+    file_paths = config["generator"]["file_paths"]
+
+    bot = MockBot.from_files(file_paths["revised_dialog_act_map"],
+                             file_paths["goals_dir"],
+                             file_paths["revised_ontology"],
+                             intent_error_rate=args.intent_error_rate,
+                             seed=args.seed)
+    server = MockLiveAgentServer(bot,
+                                 host=args.host,
+                                 port=args.port,
+                                 client_poll_timeout=args.client_poll_timeout,
+                                 response_latency=args.response_latency,
+                                 latency_jitter=args.latency_jitter,
+                                 error_rate=args.error_rate,
+                                 seed=args.seed)
+    print("serving mock bot of {} at {}".format(args.test_name, server.end_point))
+    print("set \"end_point\" of the \"api\" config to the address above to simulate against the mock bot")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.stop()
@@ -0,0 +1,60 @@
+#  Copyright (c) 2022, salesforce.com, inc.
+#   All rights reserved.
+#   SPDX-License-Identifier: BSD-3-Clause
+#   For full license text, see the LICENSE file in the repo root or https://opensource.org/licenses/BSD-3-Clause
+
+import argparse, json, os, random
+from botsim.cli.utils import load_simulation_config
+from botsim.modules.generator.paraphraser.backend_parity import check_backend_parity
+
+
+def get_backend_check_argparser():
+    parser = argparse.ArgumentParser(description="Check the paraphrase quality of an inference backend against the "
+                                                 "fp32 eager backend")
+    parser.add_argument("--platform", help="bot platform [DialogFlow_CX, Einstein_Bot]", type=str,
+                        default="Einstein_Bot")
+    parser.add_argument("--test_name", help="name of the test", type=str, required=True)
+    parser.add_argument("--backend", help="backend type to check, paraphraser_config[\"backend\"] by default",
+                        type=str)
+    parser.add_argument("--num_threads", help="number of PyTorch threads", type=int)
+    parser.add_argument("--num_sentences", help="number of intent utterances to paraphrase", type=int, default=50)
+    parser.add_argument("--seed", help="random seed of the utterance sample", type=int, default=42)
+    parser.add_argument("--output", help="output json of the parity report", type=str)
+    return parser
+
+
+def load_intent_utterances(config):
+    """ Intent utterances dumped by the parser (<goals_dir>/<intent>.json) of the dev intents """
+    goals_dir = config["generator"]["file_paths"]["goals_dir"]
+    sentences = []
+    for intent in config["generator"]["dev_intents"]:
+        intent_json = os.path.join(goals_dir, intent.replace(" ", "_") + ".json")
+        if os.path.exists(intent_json):
+            with open(intent_json, "r") as fin:
+                for utterances in json.load(fin).values():
+                    sentences.extend(utterances)
+    return sentences
+
+
+if __name__ == "__main__":
+    args = get_backend_check_argparser().parse_args()
+    config = load_simulation_config(args.platform, args.test_name)
+    paraphraser_config = config["generator"]["paraphraser_config"]
+    backend = dict(paraphraser_config.get("backend") or {})
+    if args.backend:
+        backend["type"] = args.backend
+    if args.num_threads:
+        backend["num_threads"] = args.num_threads
+    sentences = list(dict.fromkeys(load_intent_utterances(config)))
+    if not sentences:
+        raise ValueError("No intent utterances found, run the parser and set the dev intents first.")
+    sentences = random.Random(args.seed).sample(sentences, min(args.num_sentences, len(sentences)))
+    report = check_backend_parity(sentences, backend,
+                                  [paraphraser_config["num_t5_paraphrases"],
+                                   paraphraser_config["num_pegasus_paraphrases"]],
+                                  device=paraphraser_config.get("device"))
+    print(json.dumps(report, indent=2))
+    if args.output:
+        with open(args.output, "w") as report_json:
+            json.dump(report, report_json, indent=2)
+    print("parity check", "passed" if report["passed"] else "FAILED")
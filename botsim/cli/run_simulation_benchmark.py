@@ -0,0 +1,38 @@
+#  Copyright (c) 2022, salesforce.com, inc.
+#   All rights reserved.
+#   SPDX-License-Identifier: BSD-3-Clause
+#   For full license text, see the LICENSE file in the repo root or https://opensource.org/licenses/BSD-3-Clause
+
+import argparse, json
+from botsim.cli.utils import load_simulation_config
+from botsim.modules.simulator.simulation_benchmark import SimulationBenchmark
+
+
+def get_benchmark_argparser():
+    parser = argparse.ArgumentParser(description="Benchmark the throughput of the BotSIM user simulator")
+    parser.add_argument("--platform", help="bot platform [DialogFlow_CX, Einstein_Bot]", type=str,
+                        default="Einstein_Bot")
+    parser.add_argument("--test_name", help="name of the test", type=str, required=True)
+    parser.add_argument("--intents", help="intents to simulate, all intents by default", type=str, nargs="*")
+    parser.add_argument("--num_episodes", help="number of simulation episodes per intent", type=int, default=100)
+    parser.add_argument("--seed", help="random seed", type=int, default=42)
+    parser.add_argument("--output", help="output json of the benchmark results", type=str)
+    parser.add_argument("--baseline", help="benchmark results json to compare with", type=str)
+    return parser
+
+
+if __name__ == "__main__":
+    args = get_benchmark_argparser().parse_args()
+    config = load_simulation_config(args.platform, args.test_name)
+    benchmark = SimulationBenchmark(config, args.intents, args.num_episodes, args.seed)
+    results = benchmark.run()
+    output = args.output or "data/bots/{}/{}/benchmarks/simulation_benchmark_{}.json".format(
+        args.platform, args.test_name, results["commit"] or results["timestamp"])
+    benchmark.save_results(results, output)
+    print(json.dumps(results, indent=2))
+    print("benchmark results saved to", output)
+    if args.baseline:
+        with open(args.baseline, "r") as baseline_json:
+            changes = benchmark.compare_results(results, json.load(baseline_json))
+        for metric, change in changes.items():
+            print("{}: {}".format(metric, "n/a" if change is None else "{:+.1%}".format(change)))
@@ -3,15 +3,22 @@
 #   SPDX-License-Identifier: BSD-3-Clause
 #   For full license text, see the LICENSE file in the repo root or https://opensource.org/licenses/BSD-3-Clause
 
-import os
+import os, copy
 
 from botsim.cli.utils import load_simulation_config, set_default_simulation_intents, get_argparser
+from botsim.models.model_registry import preload_simulation_models
+from botsim.modules.simulator.simulation_scheduler import SimulationScheduler
 
 
-def simulate_single_intent(job_config):
+def create_simulation_client(job_config):
+    """
+    Create the simulation client of one intent and mode
+    :param job_config: a dictionary of 1) config: the simulation configuration (copied, not modified)
+        2) intent_name 3) mode: simulation mode (dev/eval)
+    """
     intent_name = job_config["intent_name"]
     mode = job_config["mode"]
-    simulation_config = job_config["config"]
+    simulation_config = copy.deepcopy(job_config["config"])
     para_setting = "{}_{}".format(simulation_config["generator"]["paraphraser_config"]["num_t5_paraphrases"],
                                   simulation_config["generator"]["paraphraser_config"]["num_pegasus_paraphrases"])
     goal_dir = simulation_config["generator"]["file_paths"]["goals_dir"]
@@ -35,57 +42,35 @@ def simulate_single_intent(job_config):
 
     if simulation_config["platform"] == "DialogFlow_CX":
         from botsim.platforms.dialogflow_cx.simulation_client import DialogFlowCXClient  # simulate_conversation
-        client = DialogFlowCXClient(simulation_config)
-    else:
-        from botsim.platforms.botbuilder.simulation_client import LiveAgentClient  # simulate_conversation
-        client = LiveAgentClient(simulation_config)
-    client.simulate_conversation()
-
+        return DialogFlowCXClient(simulation_config)
+    from botsim.platforms.botbuilder.simulation_client import LiveAgentClient  # simulate_conversation
+    return LiveAgentClient(simulation_config)
 
-def simulate_conversations_multithread(simulation_config):
-    print("multiprocess simulation of Einstein Bot")
-    dev_intents = simulation_config["simulator"]["dev_intents"]
-    dev_jobs = []
-    for intent in dev_intents:
-        dev_jobs.append({"config": simulation_config, "intent_name": intent, "mode": "dev"})
-
-    eval_intents = simulation_config["simulator"]["eval_intents"]
-    eval_jobs = []
-    for intent in eval_intents:
-        eval_jobs.append({"config": simulation_config, "intent_name": intent, "mode": "eval"})
-    processed = {}
-    from multiprocessing import Pool
-    num_process = 4
-    try:
-        pool = Pool(num_process)
-        pool.map(simulate_single_intent, dev_jobs)
-    finally:
-        pool.close()
-        pool.join()
-        for intent_name in dev_intents:
-            processed[intent_name] = "success"
 
-    try:
-        pool = Pool(num_process)
-        pool.map(simulate_single_intent, eval_jobs)
-    finally:
-        pool.close()
-        pool.join()
-        for intent_name in eval_intents:
-            processed[intent_name] = "success"
+def simulate_single_intent(job_config):
+    create_simulation_client(job_config).simulate_conversation()
 
 
 def simulate_conversations(simulation_config):
-    if simulation_config["generator"]["paraphraser_config"]["num_utterances"] == -1:
-        simulation_config["generator"]["paraphraser_config"]["num_utterances"] = "all"
-    modes = ["dev"]
-    if len(simulation_config["simulator"]["eval_intents"]) > 0:
-        modes.append("eval")
-    intents = simulation_config["simulator"]["dev_intents"]
-    for intent_name in intents:
-        for mode in modes:
-            job_config = {"config": simulation_config, "intent_name": intent_name, "mode": mode}
-            simulate_single_intent(job_config)
+    """
+    Simulate the dev intents in dev mode and the eval intents in eval mode. The episodes of all intents are
+    scheduled together within the global concurrency cap and requests/second budget of the simulator config.
+    :param simulation_config: the simulation configuration
+    """
+    jobs = [{"config": simulation_config, "intent_name": intent, "mode": "dev"}
+            for intent in simulation_config["simulator"]["dev_intents"]]
+    jobs += [{"config": simulation_config, "intent_name": intent, "mode": "eval"}
+             for intent in simulation_config["simulator"]["eval_intents"]]
+    # load the dialog act map and response template once for all simulation clients
+    preload_simulation_models(simulation_config)
+    scheduler = SimulationScheduler(simulation_config)
+    for job_config in jobs:
+        scheduler.add_client(create_simulation_client(job_config))
+    processed = {}
+    for job in scheduler.run():
+        processed[job.name] = "success" if job.error is None else "failed: {}".format(job.error)
+    print(processed)
+    return processed
 
 
 if __name__ == "__main__":
@@ -99,7 +84,4 @@ if __name__ == "__main__":
                                                               revised_dialog_map))
     if len(config["simulator"]["dev_intents"]) == 0 and len(config["simulator"]["eval_intents"]) == 0:
         set_default_simulation_intents(config, "simulator")
-    if config["platform"] == "DialogFlow_CX":
-        simulate_conversations(config)
-    else:
-        simulate_conversations_multithread(config)
+    simulate_conversations(config)
@@ -0,0 +1,175 @@
+#  Copyright (c) 2022, salesforce.com, inc.
+#   All rights reserved.
+#   SPDX-License-Identifier: BSD-3-Clause
+#   For full license text, see the LICENSE file in the repo root or https://opensource.org/licenses/BSD-3-Clause
+
+import hashlib, json, os, re
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:  # no inter-process locking on Windows
+    fcntl = None
+
+DEFAULT_MODEL_NAME = "paraphrase-MiniLM-L6-v2"
+DEFAULT_STORE_DIR = "data/embedding_store"
+
+# (model name, store dir) -> EmbeddingStore shared by all callers of the process
+loaded_stores = {}
+
+
+class EmbeddingStore:
+    """
+    Content-addressed, persistent store of sentence transformer embeddings. Sentences are keyed by the hash of the
+    model name and the text and only sentences not found in the store are embedded.
+    The embeddings of a model are kept in three local files under store_dir:
+      1) <model>.f32: float32 matrix (one row per sentence) appended to by writers and memory-mapped by readers
+      2) <model>.index.jsonl: sidecar index with one {"key", "row"} record per stored sentence
+      3) <model>.meta.json: model name and embedding dimension
+    Appends are serialised across processes with a file lock and start at a whole row (a partial row left by an
+    interrupted writer is padded and never referenced). The index is written after the matrix rows, so that readers
+    never see a key whose row is incomplete.
+    """
+
+    def __init__(self, model_name=DEFAULT_MODEL_NAME, store_dir=DEFAULT_STORE_DIR, batch_size=256):
+        """
+        :param model_name: sentence transformer model name
+        :param store_dir: directory of the store files
+        :param batch_size: number of sentences per sentence transformer forward pass
+        """
+        self.model_name = model_name
+        self.store_dir = store_dir
+        self.batch_size = batch_size
+        self.sentence_transformer = None
+        file_prefix = os.path.join(store_dir, re.sub(r"[^A-Za-z0-9_.-]", "_", model_name))
+        self.matrix_path = file_prefix + ".f32"
+        self.index_path = file_prefix + ".index.jsonl"
+        self.meta_path = file_prefix + ".meta.json"
+        self.rows = {}
+        self.index_offset = 0
+        self.dimension = None
+        self.matrix = None
+        self.hits, self.misses = 0, 0
+        self._read_meta()
+        self._read_index()
+
+    def _read_meta(self):
+        if self.dimension is None and os.path.exists(self.meta_path):
+            with open(self.meta_path, "r") as meta_file:
+                self.dimension = json.load(meta_file)["dimension"]
+
+    def _key(self, sentence):
+        return hashlib.sha1((self.model_name + "\0" + sentence).encode("UTF-8")).hexdigest()
+
+    def _read_index(self):
+        """ Read the index records appended since the last read, e.g., by other processes """
+        if not os.path.exists(self.index_path):
+            return
+        with open(self.index_path, "rb") as index_file:
+            index_file.seek(self.index_offset)
+            for line in index_file:
+                if not line.endswith(b"\n"):  # a record being written
+                    break
+                self.index_offset += len(line)
+                try:
+                    record = json.loads(line)
+                except ValueError:  # a record left incomplete by an interrupted writer
+                    continue
+                self.rows[record["key"]] = record["row"]
+        self.matrix = None
+
+    def _map_matrix(self):
+        if self.matrix is None and self.dimension and os.path.exists(self.matrix_path):
+            num_rows = os.path.getsize(self.matrix_path) // (4 * self.dimension)
+            if num_rows > 0:
+                self.matrix = np.memmap(self.matrix_path, dtype=np.float32, mode="r",
+                                        shape=(num_rows, self.dimension))
+        return self.matrix
+
+    def _get_sentence_transformer(self):
+        if self.sentence_transformer is None:
+            from sentence_transformers import SentenceTransformer
+            self.sentence_transformer = SentenceTransformer(self.model_name)
+        return self.sentence_transformer
+
+    def _append(self, sentences, keys):
+        """ Embed sentences and append them to the store under their keys """
+        embeddings = self._get_sentence_transformer().encode(sentences,
+                                                             batch_size=self.batch_size,
+                                                             convert_to_numpy=True,
+                                                             show_progress_bar=False).astype(np.float32)
+        os.makedirs(self.store_dir, exist_ok=True)
+        with open(self.index_path, "a") as index_file:
+            if fcntl:
+                fcntl.flock(index_file, fcntl.LOCK_EX)
+            try:
+                self._read_meta()
+                self._read_index()
+                if self.dimension is None:
+                    self.dimension = embeddings.shape[1]
+                    with open(self.meta_path, "w") as meta_file:
+                        json.dump({"model_name": self.model_name, "dimension": self.dimension}, meta_file)
+                new_rows = [i for i, key in enumerate(keys) if key not in self.rows]
+                if not new_rows:
+                    return
+                with open(self.matrix_path, "ab") as matrix_file:
+                    row_bytes = 4 * self.dimension
+                    # an interrupted writer may have left a partial row, pad it to a whole row so that the new rows
+                    # are written where their index records point to. Padded rows are never referenced.
+                    first_row = -(-matrix_file.tell() // row_bytes)
+                    matrix_file.truncate(first_row * row_bytes)
+                    matrix_file.seek(0, os.SEEK_END)
+                    matrix_file.write(np.ascontiguousarray(embeddings[new_rows]).tobytes())
+                records = "".join(json.dumps({"key": keys[i], "row": first_row + offset}) + "\n"
+                                  for offset, i in enumerate(new_rows))
+                if index_file.tell() > self.index_offset:
+                    # terminate the incomplete record of an interrupted writer
+                    records = "\n" + records
+                index_file.write(records)
+                index_file.flush()
+                for offset, i in enumerate(new_rows):
+                    self.rows[keys[i]] = first_row + offset
+                self.index_offset += len(records.encode("UTF-8"))
+                self.matrix = None
+            finally:
+                if fcntl:
+                    fcntl.flock(index_file, fcntl.LOCK_UN)
+
+    def encode(self, sentences, normalize_embeddings=False):
+        """
+        Embed sentences, reusing the stored embeddings
+        :param sentences: list of sentences
+        :param normalize_embeddings: whether to L2-normalise the embeddings
+        :return: float32 matrix of embeddings, one row per sentence
+        """
+        sentences = list(sentences)
+        keys = [self._key(sentence) for sentence in sentences]
+        missing = {key: sentence for key, sentence in zip(keys, sentences) if key not in self.rows}
+        if missing:
+            # other processes may have embedded the sentences in the meantime
+            self._read_index()
+            missing = {key: sentence for key, sentence in missing.items() if key not in self.rows}
+        self.misses += len(missing)
+        self.hits += len(sentences) - len(missing)
+        if missing:
+            self._append(list(missing.values()), list(missing.keys()))
+        if not sentences:
+            return np.zeros((0, self.dimension or 0), dtype=np.float32)
+        embeddings = np.array(self._map_matrix()[[self.rows[key] for key in keys]])
+        if normalize_embeddings:
+            embeddings /= np.maximum(np.linalg.norm(embeddings, axis=1, keepdims=True), 1e-12)
+        return embeddings
+
+
+def load_embedding_store(model_name=DEFAULT_MODEL_NAME, store_dir=None):
+    """
+    Open the embedding store of a model once per process
+    :param model_name: sentence transformer model name
+    :param store_dir: directory of the store, by default $BOTSIM_EMBEDDING_STORE or data/embedding_store
+    :return: the shared EmbeddingStore
+    """
+    store_dir = store_dir or os.environ.get("BOTSIM_EMBEDDING_STORE", DEFAULT_STORE_DIR)
+    key = (model_name, store_dir)
+    if key not in loaded_stores:
+        loaded_stores[key] = EmbeddingStore(model_name, store_dir)
+    return loaded_stores[key]
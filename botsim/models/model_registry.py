@@ -0,0 +1,68 @@
+#  Copyright (c) 2022, salesforce.com, inc.
+#   All rights reserved.
+#   SPDX-License-Identifier: BSD-3-Clause
+#   For full license text, see the LICENSE file in the repo root or https://opensource.org/licenses/BSD-3-Clause
+
+import os
+
+from botsim.models.nlu.nlu_fuzzy_match import FuzzyMatchIntentPredictor
+from botsim.models.nlg.nlg_template import TemplateNLG
+
+# (model class, path, model arguments) -> (file version, model) shared by all simulators of the process
+loaded_models = {}
+
+
+def _file_version(path):
+    """ Modification time and size of a local file, None for S3 objects """
+    if os.environ.get("STORAGE") == "S3" or not os.path.exists(path):
+        return None
+    stat = os.stat(path)
+    return stat.st_mtime_ns, stat.st_size
+
+
+def load_model(model_class, path, **kwargs):
+    """
+    Load a dialog act map (NLU) or response template (NLG) model once per process.
+    The model is reloaded if its file has been modified since it was loaded. Loaded models must be treated as
+    read-only by the simulators sharing them.
+    :param model_class: model class constructed from the path, e.g., FuzzyMatchIntentPredictor or TemplateNLG
+    :param path: path to the dialog act map or response template
+    :param kwargs: additional model arguments
+    :return: the shared model
+    """
+    key = (model_class, path, tuple(sorted(kwargs.items())))
+    version = _file_version(path)
+    if key not in loaded_models or loaded_models[key][0] != version:
+        loaded_models[key] = (version, model_class(path, **kwargs))
+    return loaded_models[key][1]
+
+
+def load_nlu_model(simulation_configs):
+    nlu_cache_config = simulation_configs["simulator"].get("nlu_cache", {})
+    return load_model(FuzzyMatchIntentPredictor,
+                      simulation_configs["generator"]["file_paths"]["revised_dialog_act_map"],
+                      cache_size=nlu_cache_config.get("max_size", 4096),
+                      persist_cache=nlu_cache_config.get("persist", False))
+
+
+def load_nlg_model(simulation_configs):
+    return load_model(TemplateNLG, simulation_configs["generator"]["file_paths"]["response_template"])
+
+
+def save_prediction_caches():
+    """
+    Persist the prediction caches of the NLU models loaded by the process
+    """
+    for _, model in loaded_models.values():
+        if isinstance(model, FuzzyMatchIntentPredictor):
+            model.save_prediction_cache()
+
+
+def preload_simulation_models(simulation_configs):
+    """
+    Load the NLU and NLG models before the simulations start, so that all simulations of the process (run by the
+    SimulationScheduler in one event loop) share them instead of each parsing the files again
+    :param simulation_configs: simulation configurations
+    """
+    load_nlu_model(simulation_configs)
+    load_nlg_model(simulation_configs)
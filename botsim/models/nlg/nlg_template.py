@@ -3,6 +3,8 @@
 #   SPDX-License-Identifier: BSD-3-Clause
 #   For full license text, see the LICENSE file in the repo root or https://opensource.org/licenses/BSD-3-Clause
 
+import re
+
 from botsim.botsim_utils.utils import read_s3_json
 from botsim.models.nlg.nlg_base import NLG
 
@@ -16,27 +18,80 @@ class TemplateNLG(NLG):
 
     def __init__(self, nlg_template_path):
         self.nlg_template = read_s3_json("botsim", nlg_template_path)
+        self.template_index = self._index_templates(self.nlg_template)
+
+    @staticmethod
+    def _compile_sentence(sentence, slots):
+        """ Split a template sentence into literal parts and slot names at the first occurrence of each $slot$,
+        so that slot values can be filled in with a single join
+        """
+        if not isinstance(sentence, str) or not slots:
+            return None
+        pattern = re.compile("|".join(re.escape("$" + slot + "$") for slot in sorted(slots, key=len, reverse=True)))
+        parts, filled, position = [], set(), 0
+        for match in pattern.finditer(sentence):
+            slot = match.group(0)[1:-1]
+            if slot in filled:
+                continue
+            filled.add(slot)
+            parts.append(sentence[position:match.start()])
+            parts.append(slot)
+            position = match.end()
+        parts.append(sentence[position:])
+        return parts
+
+    @staticmethod
+    def _index_templates(nlg_template):
+        """ Index the templates by (dialog act, frozenset(inform_slots), frozenset(request_slots)).
+        Each entry holds the template and, for each role, its sentences split by _compile_sentence
+        """
+        template_index = {}
+        for act, templates in nlg_template["dialog_act"].items():
+            if isinstance(templates, dict):
+                templates = [templates]
+            for ele in templates:
+                key = (act, frozenset(ele["inform_slots"]), frozenset(ele["request_slots"]))
+                # the first matching template is used
+                if key in template_index:
+                    continue
+                slots = set(ele["inform_slots"]) | set(ele["request_slots"])
+                compiled_sentences = {}
+                for role, sentences in ele["response"].items():
+                    compiled = [TemplateNLG._compile_sentence(sentence, slots) for sentence in sentences]
+                    compiled_sentences[role] = compiled if all(compiled) and compiled else None
+                template_index[key] = (ele, compiled_sentences)
+        return template_index
 
     def generate(self, dialog_state, role):
         """ Template-based NLG with dialog state (dialog act + slot) as retrieval key
         :param dialog_state: user/agent dialog state
         :param role: user or agent
         """
-        sentences = []
-        sentences_slots = []
-        matched = False
         assert role == "agent" or role == "user"
-        act = dialog_state["action"]
-        if act in self.nlg_template["dialog_act"].keys():
-            for ele in self.nlg_template["dialog_act"][act]:
-                # both inform_slots and request_slots must match the template
-                if set(ele["inform_slots"]) == set(dialog_state["inform_slots"].keys()) \
-                        and set(ele["request_slots"]) == set(dialog_state["request_slots"].keys()):
-                    sentences, sentences_slots = \
-                        self.dialog_state_to_response_and_slot(dialog_state, ele["response"][role])
-                    matched = True
-                    break
-        assert matched
+        key = (dialog_state["action"],
+               frozenset(dialog_state["inform_slots"]),
+               frozenset(dialog_state["request_slots"]))
+        # both inform_slots and request_slots must match the template
+        assert key in self.template_index
+        ele, compiled_sentences = self.template_index[key]
+        if compiled_sentences.get(role) is None:
+            return self.dialog_state_to_response_and_slot(dialog_state, ele["response"][role])
+        return self._fill_compiled_sentences(dialog_state, compiled_sentences[role])
+
+    @staticmethod
+    def _fill_compiled_sentences(dialog_state, compiled_sentences):
+        """ Same as dialog_state_to_response_and_slot for sentences split by _compile_sentence """
+        slot_values, slot_values_with_names = {}, {}
+        for key in ["inform_slots", "request_slots"]:
+            for slot, slot_val in dialog_state[key].items():
+                slot_values[slot] = str(slot_val)
+                slot_values_with_names[slot] = "@" + slot + ":" + """ + str(slot_val) + """
+        sentences, sentences_slots = [], []
+        for parts in compiled_sentences:
+            # literal parts are at even positions and slot names at odd positions
+            sentences.append("".join([part if i % 2 == 0 else slot_values[part] for i, part in enumerate(parts)]))
+            sentences_slots.append("".join([part if i % 2 == 0 else slot_values_with_names[part]
+                                            for i, part in enumerate(parts)]))
         return sentences, sentences_slots
 
     @staticmethod
@@ -22,3 +22,11 @@ class IntentDetector:
         :param dialog_name: dialog act maps of the given dialog_name will be matched
         """
         raise NotImplementedError
+
+    def score_intents(self, bot_message):
+        """
+        Score the bot message against the dialog acts of every intent
+        :param bot_message: bot message/prompt
+        :return: intent -> best matching score of predict(bot_message, intent)
+        """
+        return {task["intent"]: self.predict(bot_message, task["intent"])[2] for task in self.intent_templates}
@@ -3,46 +3,211 @@
 #   SPDX-License-Identifier: BSD-3-Clause
 #   For full license text, see the LICENSE file in the repo root or https://opensource.org/licenses/BSD-3-Clause
 
-import re
+import re, os, json
+from collections import OrderedDict
+import numpy as np
 from rapidfuzz import process, fuzz
 
 from botsim.models.nlu.nlu_base import IntentDetector
 
+# variable names between $$ and annotations between [] are removed from bot messages before matching
+VARIABLE_REGEX = re.compile(r"\$.*? ")
+ANNOTATION_REGEX = re.compile(r"\[.*?\]")
+
+
+class DialogActIndex:
+    """
+    Flattened candidate messages of a set of dialog acts for vectorised fuzzy matching.
+    The candidate messages of dialog act dialog_acts[i] are examples[starts[i]:ends[i]].
+    """
+    __slots__ = ("dialog_acts", "examples", "starts", "ends")
+
+    def __init__(self, dialog_act_to_examples):
+        self.dialog_acts, self.examples, starts = [], [], []
+        for dialog_act, examples in dialog_act_to_examples:
+            if len(examples) == 0:
+                continue
+            starts.append(len(self.examples))
+            self.dialog_acts.append(dialog_act)
+            self.examples.extend(examples)
+        self.starts = np.array(starts, dtype=np.intp)
+        self.ends = starts[1:] + [len(self.examples)]
+
+
+class PredictionCache:
+    """
+    Bounded LRU memo from (preprocessed bot message, dialog name) to predictions.
+    The cache can be persisted next to the dialog act map so that later runs start warm. A persisted cache is only
+    reloaded if the dialog act map has not been modified since the cache was saved.
+    """
+
+    def __init__(self, max_size, cache_path=None, dialog_act_map_path=None):
+        self.max_size = max_size
+        self.cache_path = cache_path
+        self.dialog_act_map_path = dialog_act_map_path
+        self.predictions = OrderedDict()
+        self.hits, self.misses = 0, 0
+        if self.cache_path:
+            self.load()
+
+    def _dialog_act_map_version(self):
+        stat = os.stat(self.dialog_act_map_path)
+        return "{}_{}".format(stat.st_mtime_ns, stat.st_size)
+
+    def get(self, key):
+        prediction = self.predictions.get(key)
+        if prediction is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self.predictions.move_to_end(key)
+        return prediction
+
+    def put(self, key, prediction):
+        self.predictions[key] = prediction
+        self.predictions.move_to_end(key)
+        if len(self.predictions) > self.max_size:
+            self.predictions.popitem(last=False)
+
+    def info(self):
+        return {"hits": self.hits, "misses": self.misses, "size": len(self.predictions), "max_size": self.max_size}
+
+    def load(self):
+        if not os.path.exists(self.cache_path):
+            return
+        with open(self.cache_path, "r") as cache_file:
+            cache = json.load(cache_file)
+        if cache.get("dialog_act_map_version") != self._dialog_act_map_version():
+            return
+        for bot_message, dialog_name, (dialog_act, example, score, ties) in cache["predictions"][-self.max_size:]:
+            self.put((bot_message, dialog_name), (dialog_act, example, score, [tuple(tie) for tie in ties]))
+
+    def save(self):
+        if not self.cache_path:
+            return
+        cache = {"dialog_act_map_version": self._dialog_act_map_version(),
+                 "predictions": [[bot_message, dialog_name, prediction]
+                                 for (bot_message, dialog_name), prediction in self.predictions.items()]}
+        # write to a temporary file first so that concurrent simulation processes never see a partial cache
+        tmp_path = "{}.{}.tmp".format(self.cache_path, os.getpid())
+        with open(tmp_path, "w") as cache_file:
+            json.dump(cache, cache_file)
+        os.replace(tmp_path, self.cache_path)
+
 
 class FuzzyMatchIntentPredictor(IntentDetector):
-    def __init__(self, dialog_act_map_path=None):
+    def __init__(self, dialog_act_map_path=None, cache_size=4096, persist_cache=False):
+        """
+        :param dialog_act_map_path: path to the (revised) dialog act map
+        :param cache_size: maximum number of cached predictions, 0 to disable caching
+        :param persist_cache: whether to load/save the prediction cache next to the dialog act map
+        """
         super().__init__(dialog_act_map_path)
+        self.prediction_cache = None
+        if dialog_act_map_path and cache_size > 0:
+            cache_path = None
+            if persist_cache and os.environ.get("STORAGE") != "S3":
+                cache_path = os.path.splitext(dialog_act_map_path)[0] + ".prediction_cache.json"
+            self.prediction_cache = PredictionCache(cache_size, cache_path, dialog_act_map_path)
+        self.intent_score_cache = PredictionCache(cache_size) if cache_size > 0 else None
+        # dialog acts and candidate messages of each intent, built once from the dialog act map
+        self.intent_dialog_acts = {}
+        if self.intent_templates:
+            for intent_info in self.intent_templates:
+                self.intent_dialog_acts[intent_info["intent"]] = list(intent_info["dialog_act_and_slot"].items())
+        # dialog_name -> DialogActIndex of all intents matched by the dialog_name
+        self.dialog_indices = {}
+        # candidate messages of all intents for score_intents, with one segment per intent
+        self.intent_index = None
+        # intent -> positions in intent_index of the intents matched by predict(bot_message, intent)
+        self.intent_matches = {}
+
+    def _get_dialog_index(self, dialog_name):
+        if dialog_name not in self.dialog_indices:
+            dialog_act_to_examples = []
+            for intent, dialog_acts in self.intent_dialog_acts.items():
+                if dialog_name.find(intent) != -1:
+                    dialog_act_to_examples.extend(dialog_acts)
+            self.dialog_indices[dialog_name] = DialogActIndex(dialog_act_to_examples)
+        return self.dialog_indices[dialog_name]
+
+    def _get_intent_index(self):
+        if self.intent_index is None:
+            self.intent_index = DialogActIndex(
+                (intent, [example for _, examples in dialog_acts for example in examples])
+                for intent, dialog_acts in self.intent_dialog_acts.items())
+            for intent in self.intent_dialog_acts:
+                self.intent_matches[intent] = np.array(
+                    [position for position, matched_intent in enumerate(self.intent_index.dialog_acts)
+                     if intent.find(matched_intent) != -1], dtype=np.intp)
+        return self.intent_index
+
+    @staticmethod
+    def preprocess(bot_message):
+        return ANNOTATION_REGEX.sub("", VARIABLE_REGEX.sub("$", bot_message))
+
+    def save_prediction_cache(self):
+        if self.prediction_cache:
+            self.prediction_cache.save()
+
+    def cache_info(self):
+        return self.prediction_cache.info() if self.prediction_cache else {}
 
     def predict(self, bot_message, dialog_name):
-        intents = self.intent_templates
-        # remove variable names between $$
-        regex = r"\$.*? "
-        bot_message = re.sub(regex, "$", bot_message)
-        regex = r"\[.*?\]"
-        bot_message = re.sub(regex, "", bot_message)
-
-        max_score, max_index, max_intent = -1, 0, 0
-        matched_dialog_act_and_slot = ""
-        best_match_example = ""
-        score_to_candidates = {}
-
-        for intent_index, intent_info in enumerate(intents):
-            if dialog_name.find(intent_info["intent"]) == -1:
-                continue
-            dialog_act_and_slots = intent_info["dialog_act_and_slot"]
-            res = []
-            for dialog_act_and_slot in dialog_act_and_slots:
-                res.append({"intent": intent_info["intent"],
-                            "dialog_act": dialog_act_and_slot,
-                            "candidate_messages": dialog_act_and_slots[dialog_act_and_slot]})
-            for dialog_act_and_slot_index, dialog_act_and_slot in enumerate(res):
-                examples = dialog_act_and_slot["candidate_messages"]
-                match, score, best_match_example_index = process.extractOne(bot_message, examples)
-                if score not in score_to_candidates:
-                    score_to_candidates[score] = []
-                score_to_candidates[score].append((match, dialog_act_and_slot["dialog_act"]))
-                if score >= max_score:
-                    max_score = score
-                    best_match_example = match
-                    matched_dialog_act_and_slot = dialog_act_and_slot["dialog_act"]
-        return matched_dialog_act_and_slot, best_match_example, max_score, list(score_to_candidates[max_score])
+        """
+        Match the bot message against the candidate messages of all dialog acts of dialog_name in one pass.
+        Predictions of repeated bot messages are served from the prediction cache.
+        :param bot_message: bot message/prompt
+        :param dialog_name: dialog act maps of the given dialog_name will be matched
+        :return: the best matching dialog act, its best matching candidate message, the matching score and
+                 the list of (candidate message, dialog act) of all dialog acts tied at the best score
+        """
+        bot_message = self.preprocess(bot_message)
+        if self.prediction_cache is None:
+            return self._predict(bot_message, dialog_name)
+        prediction = self.prediction_cache.get((bot_message, dialog_name))
+        if prediction is None:
+            prediction = self._predict(bot_message, dialog_name)
+            self.prediction_cache.put((bot_message, dialog_name), prediction)
+        return prediction
+
+    def score_intents(self, bot_message):
+        """
+        Score the bot message against the dialog acts of all intents in one pass instead of calling predict
+        once per intent.
+        :param bot_message: bot message/prompt
+        :return: intent -> best matching score, the same as predict(bot_message, intent)[2]
+        """
+        bot_message = self.preprocess(bot_message)
+        intent_scores = self.intent_score_cache.get(bot_message) if self.intent_score_cache else None
+        if intent_scores is None:
+            intent_scores = self._score_intents(bot_message)
+            if self.intent_score_cache:
+                self.intent_score_cache.put(bot_message, intent_scores)
+        return intent_scores
+
+    def _score_intents(self, bot_message):
+        index = self._get_intent_index()
+        if len(index.dialog_acts) == 0:
+            return {intent: -1 for intent in self.intent_dialog_acts}
+        scores = process.cdist([bot_message], index.examples, scorer=fuzz.WRatio, dtype=np.float64)[0]
+        intent_scores = np.maximum.reduceat(scores, index.starts)
+        return {intent: float(intent_scores[matches].max()) if len(matches) > 0 else -1
+                for intent, matches in self.intent_matches.items()}
+
+    def _predict(self, bot_message, dialog_name):
+        index = self._get_dialog_index(dialog_name)
+        if len(index.dialog_acts) == 0:
+            return "", "", -1, []
+
+        scores = process.cdist([bot_message], index.examples, scorer=fuzz.WRatio, dtype=np.float64)[0]
+        dialog_act_scores = np.maximum.reduceat(scores, index.starts)
+        max_score = dialog_act_scores.max()
+        ties = []
+        for dialog_act_index in np.flatnonzero(dialog_act_scores == max_score):
+            start, end = index.starts[dialog_act_index], index.ends[dialog_act_index]
+            best_match_example = index.examples[start + int(np.argmax(scores[start:end]))]
+            ties.append((best_match_example, index.dialog_acts[dialog_act_index]))
+        # the last dialog act among the ties is the best match
+        best_match_example, matched_dialog_act_and_slot = ties[-1]
+        return matched_dialog_act_and_slot, best_match_example, float(max_score), ties
@@ -25,7 +25,9 @@ class GeneratorBase:
                  parser_config = {},
                  num_t5_paraphrases=0,
                  num_pegasus_paraphrases=0,
-                 num_goals_per_intent=500):
+                 num_goals_per_intent=500,
+                 paraphrase_device=None,
+                 paraphrase_backend=None):
         self.conversation_graph = None
         self.parser = Parser(parser_config)
         self.parser_config = parser_config
@@ -35,7 +37,9 @@ class GeneratorBase:
         if num_t5_paraphrases > 0 or num_pegasus_paraphrases > 0:
             self.paraphraser = Paraphraser(batch_size=16, max_length=128,
                                            num_return_sequences=num_return_sequences,
-                                           beam_size=30)
+                                           beam_size=30,
+                                           device=paraphrase_device,
+                                           backend=paraphrase_backend)
 
         self.num_simulation_goals = num_goals_per_intent
         self.variable_to_entity = {}
@@ -74,12 +78,15 @@ class GeneratorBase:
     def generate_paraphrases(self,
                              intents,
                              intent_utterance_dir=None,
-                             number_utterances=-1):
+                             number_utterances=-1,
+                             batch_intents=True):
         """ Apply paraphrasing models on all intent utterances (<intent-name>.json) under intent_utterance_dir and
         dump the generated paraphrases to json.
         :param intents: intent names to be applied
         :param intent_utterance_dir: the dir containing the  intent utterance json files
         :param number_utterances: number of original intent utterances to be selected for paraphrasing
+        :param batch_intents: whether to stream the utterances of all intents together through the paraphrase pipeline
+            (Paraphraser.paraphrase_stream) instead of paraphrasing intent by intent
         :return:
         """
         destination = intent_utterance_dir
@@ -87,9 +94,21 @@ class GeneratorBase:
             destination = os.path.dirname(intent_utterance_dir)
         intent_to_training_utts = self._load_intent_to_training_utts(intents, destination)
 
-        for intent in intent_to_training_utts:
-            post_processed_paraphrases = self.paraphraser.post_process_paraphrases(
-                self.paraphraser.paraphrase(intent_to_training_utts, intent, number_utterances))
+        if batch_intents:
+            # the paraphrases of an intent are written as soon as they are finished
+            intent_to_paraphrases = self.paraphraser.paraphrase_stream(intent_to_training_utts,
+                                                                       number_utterances=number_utterances)
+        else:
+            intent_to_paraphrases = {intent: self.paraphraser.paraphrase(intent_to_training_utts, intent,
+                                                                         number_utterances, rank=False)
+                                     for intent in intent_to_training_utts}
+            if self.paraphraser.is_ensemble:
+                # rank the pooled paraphrases of all intents in one batch
+                intent_to_paraphrases = self.paraphraser.ranker.rank_intents(intent_to_paraphrases)
+            intent_to_paraphrases = intent_to_paraphrases.items()
+
+        # the paraphrases have been deduplicated and filtered (Paraphraser.post_process_paraphrases) when generated
+        for intent, post_processed_paraphrases in intent_to_paraphrases:
             para_config = "_".join([str(x) for x in self.num_paraphrases_per_model])
             if isinstance(number_utterances, int) and number_utterances > 0:
                 para_config = para_config + "_" + str(number_utterances)+"_utts"
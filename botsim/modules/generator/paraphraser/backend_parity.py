@@ -0,0 +1,84 @@
+#  Copyright (c) 2022, salesforce.com, inc.
+#   All rights reserved.
+#   SPDX-License-Identifier: BSD-3-Clause
+#   For full license text, see the LICENSE file in the repo root or https://opensource.org/licenses/BSD-3-Clause
+
+import time
+import numpy as np
+
+from botsim.modules.generator.paraphraser.paraphrase import Paraphraser
+from botsim.modules.generator.paraphraser.paraphrase_models import release_paraphrase_models
+
+
+def _paraphrase_with_backend(sentences, backend, num_return_sequences, device):
+    """
+    Paraphrase sentences with each enabled model on a backend, bypassing the paraphrase cache
+    :return: (paraphraser, {model name: (paraphrases, generation seconds)})
+    """
+    paraphraser = Paraphraser(num_return_sequences=list(num_return_sequences), device=device, use_cache=False,
+                              backend=backend)
+    results = {}
+    for stages in paraphraser.enabled_model_stages():
+        # load (and quantise) the model before timing the generation
+        paraphraser.load_model(stages.name)
+        start = time.perf_counter()
+        paraphrases = paraphraser.paraphrase_with_model(stages.name, sentences)
+        results[stages.name] = (paraphrases, time.perf_counter() - start)
+    release_paraphrase_models()
+    return paraphraser, results
+
+
+def _quality(ranker, paraphrases):
+    """ Mean similarity of the candidates to their sources and the fraction of candidates kept by the ranker """
+    scores = np.concatenate([np.zeros(0, dtype=np.float32)] + ranker.score(paraphrases))
+    if len(scores) == 0:
+        return {"num_candidates": 0, "similarity": None, "kept_rate": None}
+    # the candidates are embedded by score already, ranking them reads the embeddings from the store
+    num_kept = sum(len(ranked["cands"]) for ranked in ranker.rank(paraphrases))
+    return {"num_candidates": int(len(scores)),
+            "similarity": float(scores.mean()),
+            "kept_rate": num_kept / len(scores)}
+
+
+def check_backend_parity(sentences, backend, num_return_sequences=(16, 16), baseline_backend=None, device=None,
+                         similarity_tolerance=0.02, kept_rate_tolerance=0.05):
+    """
+    Compare the paraphrases of an inference backend (e.g., int8) with the ones of the baseline (fp32 eager) backend.
+    The backends are compared per model on
+      1) overlap: mean Jaccard similarity of the candidate sets of each sentence
+      2) similarity: mean sentence transformer similarity of the candidates to their sources
+      3) kept_rate: fraction of the candidates kept by ParaphraseRanker.rank (within the similarity band and one per
+         score bucket)
+      4) seconds: generation time without model loading
+    :param sentences: list of sentences to paraphrase
+    :param backend: backend settings to check, see DEFAULT_BACKEND
+    :param num_return_sequences: number of T5 and Pegasus paraphrases per sentence
+    :param baseline_backend: backend settings of the baseline, the eager backend by default
+    :param device: torch device of the models
+    :param similarity_tolerance: maximum absolute difference of the mean similarities
+    :param kept_rate_tolerance: maximum absolute difference of the kept rates
+    :return: dict of the per-model comparisons and whether all models pass the tolerances
+    """
+    sentences = list(dict.fromkeys(sentences))
+    _, baseline_results = _paraphrase_with_backend(sentences, baseline_backend, num_return_sequences, device)
+    paraphraser, results = _paraphrase_with_backend(sentences, backend, num_return_sequences, device)
+    report = {"backend": paraphraser.backend, "num_sentences": len(sentences), "models": {}, "passed": True}
+    for name, (paraphrases, seconds) in results.items():
+        baseline_paraphrases, baseline_seconds = baseline_results[name]
+        overlaps = []
+        for paraphrase, baseline_paraphrase in zip(paraphrases, baseline_paraphrases):
+            cands, baseline_cands = set(paraphrase["cands"]), set(baseline_paraphrase["cands"])
+            if cands or baseline_cands:
+                overlaps.append(len(cands & baseline_cands) / len(cands | baseline_cands))
+        quality = _quality(paraphraser.ranker, paraphrases)
+        baseline_quality = _quality(paraphraser.ranker, baseline_paraphrases)
+        passed = quality["num_candidates"] > 0 and baseline_quality["num_candidates"] > 0 and \
+            abs(quality["similarity"] - baseline_quality["similarity"]) <= similarity_tolerance and \
+            abs(quality["kept_rate"] - baseline_quality["kept_rate"]) <= kept_rate_tolerance
+        report["models"][name] = {"overlap": float(np.mean(overlaps)) if overlaps else None,
+                                  "baseline": dict(baseline_quality, seconds=baseline_seconds),
+                                  "backend": dict(quality, seconds=seconds),
+                                  "speedup": baseline_seconds / seconds if seconds > 0 else None,
+                                  "passed": passed}
+        report["passed"] = report["passed"] and passed
+    return report
@@ -3,51 +3,117 @@
 #   SPDX-License-Identifier: BSD-3-Clause
 #   For full license text, see the LICENSE file in the repo root or https://opensource.org/licenses/BSD-3-Clause
 
-import json, os, random, string, torch
+import json, random, string, torch
+from collections import namedtuple
 
-from transformers import (
-    AutoTokenizer,
-    AutoModelWithLMHead,
-    PegasusForConditionalGeneration,
-    PegasusTokenizer)
-
-from botsim.botsim_utils.utils import seed_everything, download_google_drive_url
+from botsim.botsim_utils.utils import seed_everything
+from botsim.modules.generator.paraphraser.paraphrase_cache import load_paraphrase_cache
+from botsim.modules.generator.paraphraser.paraphrase_pipeline import ParaphrasePipeline
+from botsim.modules.generator.paraphraser.paraphrase_models import (
+    load_paraphrase_model,
+    paraphrase_backend,
+    release_paraphrase_models,
+    T5_CHECKPOINT_URL,
+    PEGASUS_MODEL_NAME)
 from botsim.modules.generator.paraphraser.paraphrase_ranker import ParaphraseRanker
 
 
 seed_everything(42)
 
+_PUNCTUATION_TABLE = str.maketrans(dict.fromkeys(string.punctuation))
+# a paraphrase must not swap the speaker, e.g., "I" into "you"
+_WRONG_PRONOUN_PAIRS = {"i": "you", "you": "i", "my": "your", "your": "my"}
+
+
+def _normalise(text):
+    """ Lower-case text and remove its punctuation """
+    return text.lower().translate(_PUNCTUATION_TABLE)
+
+
+def _normalise_all(texts):
+    """ Normalise many texts with a single lower() and translate() """
+    normalised = "\0".join(texts).lower().translate(_PUNCTUATION_TABLE).split("\0")
+    if len(normalised) != len(texts):  # a text contains the separator
+        normalised = [_normalise(text) for text in texts]
+    return normalised
+
+
+def _pronouns(text):
+    return [word for word in text.lower().split() if word in _WRONG_PRONOUN_PAIRS]
+
+
+def _flipped_pronoun(source):
+    """ The pronoun a paraphrase of the source must not contain alone, None if the source has not exactly one """
+    pronouns = _pronouns(source)
+    return _WRONG_PRONOUN_PAIRS[pronouns[0]] if len(pronouns) == 1 else None
+
+
+def _flips_pronoun(cand, flipped_pronoun):
+    pronouns = _pronouns(cand)
+    return len(pronouns) == 1 and pronouns[0] == flipped_pronoun
+
+
+# functions of a paraphrasing model, used by Paraphraser and the stages of the ParaphrasePipeline
+ModelStages = namedtuple("ModelStages", ["name", "settings", "lengths", "tokenize", "generate", "decode"])
+
+
 class Paraphraser:
     def __init__(self, batch_size=16,
                  max_length=128, num_return_sequences=[20, 20],
-                 beam_size=30):
+                 beam_size=30, device=None, max_batch_size=16, max_batch_tokens=1024, max_beam_tokens=16 * 30 * 128,
+                 use_cache=True, backend=None):
+        """
+        :param device: torch device of the paraphrasing models, by default cuda if available. The models are loaded
+            on first use and shared by the paraphrasers of the process until release_models is called
+        :param max_batch_size: maximum number of sentences per batch when paraphrasing a corpus (paraphrase_corpus)
+        :param max_batch_tokens: maximum number of (padded) input tokens per batch when paraphrasing a corpus
+        :param max_beam_tokens: maximum batch size x beam_size x max_length per batch when paraphrasing a corpus. The
+            beam search states, not the inputs, dominate the generation memory, so that larger beams or longer outputs
+            shrink the batches. The default keeps the peak memory of 16-sentence batches with the default beams
+        :param use_cache: whether to reuse the candidates of utterances paraphrased before with the same model settings
+            (see ParaphraseCache)
+        :param backend: inference backend of the paraphrasing models, e.g., {"type": "int8", "num_threads": 8}, see
+            DEFAULT_BACKEND
+        """
         self.batch_size = batch_size
+        self.max_batch_size = max_batch_size
+        self.max_batch_tokens = max_batch_tokens
+        self.max_beam_tokens = max_beam_tokens
+        self.device = device
+        self.backend = paraphrase_backend(backend)
         self.num_return_sequences = num_return_sequences
         self.beam_size = beam_size
         self.max_length = max_length
         self.ranker = ParaphraseRanker()
+        self.cache = load_paraphrase_cache() if use_cache else None
 
-    def _post_process_t5_base_batch(self, sentences, outputs, model_index = 0):
+    def _deduplicate_batch(self, sentences, outputs, model_index=0):
         """
-        Post process T5 generated paraphrases by removing duplicated paraphrases
+        Normalisation and deduplication stage shared by the T5 and Pegasus paths. The generated paraphrases of each
+        sentence (num_return_sequences consecutive outputs) are normalised by lower-casing and removing punctuation,
+        all outputs of the batch at once, and a paraphrase is dropped if it normalises to its source or to an earlier
+        paraphrase. Paraphrases flipping the only first/second person pronoun of their source are dropped in the same
+        pass (see post_process_paraphrases).
         """
+        num_return_sequences = self.num_return_sequences[model_index]
+        normalised_outputs = _normalise_all(outputs)
         paraphrases = []
         for i, sentence in enumerate(sentences):
-            utterance_paraphrases = {"source": sentence, "cands": set()}
-            uniq_paraphrases = set()
-            for j in range(self.num_return_sequences[model_index]):
-                para = outputs[i * self.num_return_sequences[model_index] + j]
-                lower_case_no_punc_para = para.lower().translate(str.maketrans(dict.fromkeys(string.punctuation)))
-                lower_case_no_punc_utt = sentence.lower().translate(str.maketrans(dict.fromkeys(string.punctuation)))
-                if lower_case_no_punc_para != lower_case_no_punc_utt and lower_case_no_punc_para not in uniq_paraphrases:
-                    utterance_paraphrases["cands"].add(para)
-                    uniq_paraphrases.add(lower_case_no_punc_para)
-            utterance_paraphrases["cands"] = list(utterance_paraphrases["cands"])
-            paraphrases.append(utterance_paraphrases)
+            seen = {_normalise(sentence)}
+            flipped_pronoun = _flipped_pronoun(sentence)
+            cands = []
+            for j in range(i * num_return_sequences, (i + 1) * num_return_sequences):
+                if normalised_outputs[j] in seen:
+                    continue
+                seen.add(normalised_outputs[j])
+                if flipped_pronoun and _flips_pronoun(outputs[j], flipped_pronoun):
+                    continue
+                cands.append(outputs[j])
+            paraphrases.append({"source": sentence, "cands": cands})
         return paraphrases
 
-    def _paraphrase_t5_batch(self, sentences, tokenizer, model):
-        batch_input_ids = []
+    def _tokenize_t5_batch(self, sentences, tokenizer):
+        batch_input_ids, batch_attention_masks = [], []
         max_len = 0
         for sentence in sentences:
             input_ids = tokenizer.encode("paraphrase: " + sentence + " </s>",
@@ -60,18 +126,32 @@ class Paraphraser:
                                                 pad=(0, max_len - batch_input_id.size()[1]),
                                                 mode="constant", value=0)
             batch_input_ids[i] = input_ids
-        generated_ids_beam_search = model.generate(input_ids=torch.cat(batch_input_ids, 0),
+            # mask the padding so that the paraphrases of a sentence do not depend on the batch it is in
+            batch_attention_masks.append(torch.nn.functional.pad(torch.ones_like(batch_input_id),
+                                                                 pad=(0, max_len - batch_input_id.size()[1]),
+                                                                 mode="constant", value=0))
+        return {"input_ids": torch.cat(batch_input_ids, 0), "attention_mask": torch.cat(batch_attention_masks, 0)}
+
+    def _generate_t5_batch(self, batch_inputs, model):
+        generated_ids_beam_search = model.generate(input_ids=batch_inputs["input_ids"].to(model.device),
+                                                   attention_mask=batch_inputs["attention_mask"].to(model.device),
                                                    num_return_sequences=self.num_return_sequences[0],
                                                    max_length=self.max_length,
                                                    num_beams=self.beam_size,
                                                    no_repeat_ngram_size=2,
                                                    repetition_penalty=3.5, length_penalty=1.0).reshape(
-            self.num_return_sequences[0] * len(sentences), -1)
-        outputs = []
-        outputs.extend([tokenizer.decode(g, skip_special_tokens=True,
-                                         clean_up_tokenization_spaces=True) for g in generated_ids_beam_search])
-        paraphrases = self._post_process_t5_base_batch(sentences, outputs, 0)
-        return paraphrases
+            self.num_return_sequences[0] * batch_inputs["input_ids"].size()[0], -1)
+        return generated_ids_beam_search
+
+    def _decode_t5_batch(self, sentences, generated_ids_beam_search, tokenizer):
+        outputs = [tokenizer.decode(g, skip_special_tokens=True,
+                                    clean_up_tokenization_spaces=True) for g in generated_ids_beam_search]
+        return self._deduplicate_batch(sentences, outputs, 0)
+
+    @staticmethod
+    def _t5_lengths(sentences, tokenizer):
+        return [len(tokenizer.encode("paraphrase: " + sentence + " </s>", add_special_tokens=True))
+                for sentence in sentences]
 
     @staticmethod
     def _curate_batches(sentences, batch_size):
@@ -85,85 +165,214 @@ class Paraphraser:
             i += 1
         return batched_sentences
 
-    def _paraphrase_t5(self, sentences):
-        i = 0
-        paraphrases = []
-        tokenizer = AutoTokenizer.from_pretrained("t5-base")
-        model_path = "botsim/modules/generator/paraphraser/t5_paraphraser"
-        if not os.path.exists("{}/pytorch_model.bin".format(model_path)) and self.num_return_sequences[0] > 0:
-            # download the model check point
-            url = "https://storage.googleapis.com/sfr-botsim-research/epoch_88_dev_bleu_7.09_tgt_31.81_self_29.99/pytorch_model.bin"
-            download_google_drive_url(url, model_path, "pytorch_model.bin")
-        else:
-            return paraphrases
-        model = AutoModelWithLMHead.from_pretrained(model_path)
+    def _curate_length_sorted_batches(self, lengths):
+        """
+        Group sentences of similar lengths into batches, longest first. A batch holds at most self.max_batch_size
+        sentences, self.max_batch_tokens padded input tokens and self.max_beam_tokens beam search tokens, so that
+        short sentences are paraphrased in larger batches without exceeding the beam search memory
+        :param lengths: number of input tokens of each sentence
+        :return: list of batches of sentence indices
+        """
+        max_batch_size = min(self.max_batch_size, max(1, self.max_beam_tokens // (self.beam_size * self.max_length)))
+        batches, batch = [], []
+        for index in sorted(range(len(lengths)), key=lambda i: -lengths[i]):
+            # the first (longest) sentence determines the padded length of the batch
+            if batch and (len(batch) == max_batch_size or
+                          (len(batch) + 1) * lengths[batch[0]] > self.max_batch_tokens):
+                batches.append(batch)
+                batch = []
+            batch.append(index)
+        if batch:
+            batches.append(batch)
+        return batches
 
-        while i <= int(len(sentences) / self.batch_size):
-            end = (i + 1) * self.batch_size if \
-                (i + 1) * self.batch_size < len(sentences) else \
-                len(sentences)
-            batch_sentences = sentences[i * self.batch_size: end]
-            if len(batch_sentences) > 0:
-                paraphrases.extend(self._paraphrase_t5_batch(batch_sentences, tokenizer, model))
-            i += 1
+    def _paraphrase_batches(self, sentences, paraphrase_batch, lengths=None):
+        """
+        Paraphrase sentences batch by batch
+        :param sentences: list of sentences
+        :param paraphrase_batch: function paraphrasing a list of sentences
+        :param lengths: number of input tokens of each sentence to batch the sentences by length, otherwise the
+            sentences are paraphrased in order in batches of self.batch_size
+        :return: paraphrases in the order of the sentences
+        """
+        if lengths is None:
+            paraphrases = []
+            for batch in self._curate_batches(sentences, self.batch_size):
+                paraphrases.extend(paraphrase_batch(batch))
+            return paraphrases
+        paraphrases = [None] * len(sentences)
+        for batch in self._curate_length_sorted_batches(lengths):
+            for index, paraphrase in zip(batch, paraphrase_batch([sentences[i] for i in batch])):
+                paraphrases[index] = paraphrase
         return paraphrases
 
-    def _remove_duplicate_para(self, sentence, outputs, batch_index):
-        utterance_paraphrases = {"source": sentence, "cands": set()}
-        uniq_paraphrases = set()
-        for j in range(self.num_return_sequences[1]):
-            para = outputs[batch_index * self.num_return_sequences[1] + j]
-            lower_case_no_punc_para = para.lower().translate(str.maketrans(dict.fromkeys(string.punctuation)))
-            lower_case_no_punc_utt = sentence.lower().translate(str.maketrans(dict.fromkeys(string.punctuation)))
-            if lower_case_no_punc_para != lower_case_no_punc_utt and lower_case_no_punc_para not in uniq_paraphrases:
-                utterance_paraphrases["cands"].add(para)
-                uniq_paraphrases.add(lower_case_no_punc_para)
-        utterance_paraphrases["cands"] = list(utterance_paraphrases["cands"])
-        return utterance_paraphrases
-
-    def _paraphrase_pegasus(self, sentences):
-        tokenizer = PegasusTokenizer.from_pretrained("tuner007/pegasus_paraphrase")
-        model = PegasusForConditionalGeneration.from_pretrained(
-            "tuner007/pegasus_paraphrase").to("cuda" if torch.cuda.is_available() else "cpu")
+    def _paraphrase_with_model(self, model_stages, sentences, sort_by_length=False):
+        """
+        Paraphrase sentences with a model. Sentences found in the paraphrase cache are not paraphrased again and the
+        model is only loaded if some sentences are missing from the cache
+        :param model_stages: ModelStages of the model
+        :param sentences: list of sentences
+        :param sort_by_length: whether to batch the sentences by length
+        :return: paraphrases in the order of the sentences
+        """
+        sentence_to_cands = self.cache.get(model_stages.settings, sentences) if self.cache else {}
+        missing = list(dict.fromkeys(sentence for sentence in sentences if sentence not in sentence_to_cands))
+        if missing:
+            tokenizer, model = self.load_model(model_stages.name)
+
+            def paraphrase_batch(batch):
+                return model_stages.decode(batch, model_stages.generate(model_stages.tokenize(batch, tokenizer), model),
+                                           tokenizer)
+
+            lengths = model_stages.lengths(missing, tokenizer) if sort_by_length else None
+            generated = {paraphrase["source"]: paraphrase["cands"] for paraphrase in
+                         self._paraphrase_batches(missing, paraphrase_batch, lengths)}
+            if self.cache:
+                self.cache.put(model_stages.settings, generated)
+            sentence_to_cands.update(generated)
+        return [{"source": sentence, "cands": list(sentence_to_cands[sentence])} for sentence in sentences]
+
+    def paraphrase_with_model(self, name, sentences):
+        """
+        Paraphrase sentences with one model, batched by length, without pooling and ranking the candidates, e.g., to
+        compare the candidates of different backends
+        :param name: "t5" or "pegasus"
+        :param sentences: list of sentences
+        :return: paraphrases in the order of the sentences
+        """
+        return self._paraphrase_with_model(self._model_stages(name), sentences, sort_by_length=True)
+
+    def _model_stages(self, name):
+        """ The cache settings and the length, tokenisation, generation and decoding functions of a model """
+        if name == "t5":
+            return ModelStages("t5", self._model_settings(T5_CHECKPOINT_URL, 0), self._t5_lengths,
+                               self._tokenize_t5_batch, self._generate_t5_batch, self._decode_t5_batch)
+        return ModelStages("pegasus", self._model_settings(PEGASUS_MODEL_NAME, 1), self._pegasus_lengths,
+                           self._tokenize_pegasus_batch, self._generate_pegasus_batch, self._decode_pegasus_batch)
+
+    def enabled_model_stages(self):
+        """ ModelStages of the models generating at least one paraphrase per sentence """
+        return [self._model_stages(name) for index, name in enumerate(["t5", "pegasus"])
+                if self.num_return_sequences[index] > 0]
+
+    def load_model(self, name):
+        """ The shared tokenizer and model of a paraphrasing model ("t5" or "pegasus") on the configured backend """
+        return load_paraphrase_model(name, self.device, self.backend)
+
+    def _model_settings(self, model_id, model_index):
+        settings = {"model_id": model_id,
+                    "beam_size": self.beam_size,
+                    "num_return_sequences": self.num_return_sequences[model_index],
+                    "max_length": self.max_length,
+                    # cached candidates have been filtered by the pronoun rules of _deduplicate_batch
+                    "pronoun_filter": True}
+        if self.backend["type"] != "eager":
+            # quantised models may generate (slightly) different candidates
+            settings["backend"] = self.backend["type"]
+        return settings
+
+    def _paraphrase_t5(self, sentences, sort_by_length=False):
         paraphrases = []
+        if self.num_return_sequences[0] == 0:
+            return paraphrases
+        return self._paraphrase_with_model(self._model_stages("t5"), sentences, sort_by_length)
+
+    def _tokenize_pegasus_batch(self, batch, tokenizer):
+        return tokenizer(batch, truncation=True,
+                         padding="longest", max_length=self.max_length,
+                         return_tensors="pt")
+
+    def _generate_pegasus_batch(self, batch_tokens, model):
         # https://discuss.huggingface.co/t/out-of-index-error-when-using-pre-trained-pegasus-model/5196
         # using max_length > 60 in generate will cause the error "IndexError:
         # index out of range in self" in embedding
-        for batch in self._curate_batches(sentences, self.batch_size):
-            batch_tokens = tokenizer(batch, truncation=True,
-                                     padding="longest", max_length=self.max_length,
-                                     return_tensors="pt").to("cuda" if torch.cuda.is_available() else "cpu")
-            translated = model.generate(**batch_tokens, max_length=60,
-                                        num_beams=self.beam_size,
-                                        num_return_sequences=self.num_return_sequences[1],
-                                        temperature=1.5)
-            outputs = tokenizer.batch_decode(translated, skip_special_tokens=True)
-            for i, sentence in enumerate(batch):
-                paraphrases.append(self._remove_duplicate_para(sentence, outputs, i))
-        return paraphrases
+        return model.generate(**batch_tokens.to(model.device), max_length=60,
+                              num_beams=self.beam_size,
+                              num_return_sequences=self.num_return_sequences[1],
+                              temperature=1.5)
+
+    def _decode_pegasus_batch(self, batch, translated, tokenizer):
+        outputs = tokenizer.batch_decode(translated, skip_special_tokens=True)
+        return self._deduplicate_batch(batch, outputs, 1)
+
+    def _pegasus_lengths(self, sentences, tokenizer):
+        return [len(input_ids) for input_ids in
+                tokenizer(sentences, truncation=True, max_length=self.max_length)["input_ids"]]
+
+    def _paraphrase_pegasus(self, sentences, sort_by_length=False):
+        return self._paraphrase_with_model(self._model_stages("pegasus"), sentences, sort_by_length)
+
+    @staticmethod
+    def release_models():
+        """ Free the paraphrasing models once all intents have been paraphrased """
+        release_paraphrase_models()
+
+    @property
+    def is_ensemble(self):
+        """ Whether the paraphrases of both models are pooled and ranked """
+        return self.num_return_sequences[0] > 0 and self.num_return_sequences[1] > 0
 
-    def paraphrase(self, intent_train_utt, intent_name, number_utterances=-1):
+    def paraphrase(self, intent_train_utt, intent_name, number_utterances=-1, rank=True):
         """
         apply ensemble of paraphrasing models 0 for t5, 1 for pegasus
         The pooled paraphrases will be ranked by the paraphrase ranker
         :param intent_train_utt: a dict of dialog/intent name to list of original  utterances
         :param intent_name: intent/dialog to be applied
         :param number_utterances: number of intent utterances for paraphrasing
+        :param rank: whether to rank the pooled paraphrases, set to False to rank many intents in one batch with
+            self.ranker.rank_intents
         :return:
         """
-        sentences = intent_train_utt[intent_name]
-        if isinstance(number_utterances, int) and number_utterances > 0:
-            sentences = random.sample(sentences, min(number_utterances, len(sentences)))
+        sentences = self._select_sentences(intent_train_utt[intent_name], number_utterances)
         paraphrases, paraphrases_pegasus = [], []
         if self.num_return_sequences[0] > 0:
             paraphrases = self._paraphrase_t5(sentences)
-            if self.num_return_sequences[1] == 0:
-                return paraphrases
         if self.num_return_sequences[1] > 0:
             paraphrases_pegasus = self._paraphrase_pegasus(sentences)
-            if self.num_return_sequences[0] == 0:
-                return paraphrases_pegasus
-        return self.rank_paraphrases(self.combine_paraphrases(paraphrases_pegasus, paraphrases))
+        combined_paraphrases = self._pool_paraphrases(paraphrases, paraphrases_pegasus)
+        if not rank or not self.is_ensemble:
+            return combined_paraphrases
+        return self.rank_paraphrases(combined_paraphrases)
+
+    def paraphrase_stream(self, intent_train_utt, intents=None, number_utterances=-1, rank=True):
+        """
+        Corpus-level alternative to calling paraphrase for each intent. The utterances of all intents are pooled,
+        deduplicated and streamed through the ParaphrasePipeline in length-sorted batches (see
+        _curate_length_sorted_batches). The utterances are sampled in the same way as paraphrase does.
+        :param intent_train_utt: a dict of dialog/intent name to list of original utterances
+        :param intents: intents/dialogs to be applied, all intents of intent_train_utt by default
+        :param number_utterances: number of utterances per intent for paraphrasing
+        :param rank: whether to rank the pooled paraphrases
+        :return: generator of (intent, paraphrases), each intent is yielded as soon as its paraphrases are finished
+        """
+        if intents is None:
+            intents = list(intent_train_utt.keys())
+        intent_to_sentences = {intent: self._select_sentences(intent_train_utt[intent], number_utterances)
+                               for intent in intents}
+        return ParaphrasePipeline(self, rank=rank).run(intent_to_sentences)
+
+    def paraphrase_corpus(self, intent_train_utt, intents=None, number_utterances=-1, rank=True):
+        """
+        Paraphrase the utterances of many intents together, see paraphrase_stream
+        :return: a dict mapping from intent names to their paraphrases
+        """
+        intent_to_paraphrases = dict(self.paraphrase_stream(intent_train_utt, intents, number_utterances, rank))
+        return {intent: intent_to_paraphrases[intent] for intent in (intents or intent_train_utt.keys())}
+
+    @staticmethod
+    def _select_sentences(sentences, number_utterances=-1):
+        """ Randomly select number_utterances sentences, all sentences if number_utterances is not positive """
+        if isinstance(number_utterances, int) and number_utterances > 0:
+            sentences = random.sample(sentences, min(number_utterances, len(sentences)))
+        return sentences
+
+    def _pool_paraphrases(self, paraphrases, paraphrases_pegasus):
+        """ Pool the paraphrases of the T5 and Pegasus models, the paraphrases of a single model are kept as is """
+        if self.num_return_sequences[1] == 0:
+            return paraphrases
+        if self.num_return_sequences[0] == 0:
+            return paraphrases_pegasus
+        return self.combine_paraphrases(paraphrases_pegasus, paraphrases)
 
     def rank_paraphrases(self, paraphrases):
         """ Rank the paraphrase candidates
@@ -194,31 +403,14 @@ class Paraphraser:
         """
         post process paraphrases to remove wrong paraphrases according to some rules
         e.g., cannot paraphrase "I" into "you", etc
+        The paraphrases generated by Paraphraser have already been filtered by _deduplicate_batch
         :param paraphrases: original paraphrase list
         :return:
         """
         for sent in paraphrases:
-            source = sent["source"]
-            wrong_pairs = {"i": "you", "you": "i", "my": "your", "your": "my"}
-            items = source.lower().split()
-            to_check_src = []
-            for pair in items:
-                if pair in wrong_pairs:
-                    to_check_src.append(pair)
-            if len(to_check_src) == 1:
-                cands = sent["cands"]
-                new_cands = []
-                for cand in cands:
-                    items = cand.lower().split()
-                    to_check = []
-                    for pair in items:
-                        if pair in wrong_pairs:
-                            to_check.append(pair)
-                    if len(to_check) == 1:
-                        if to_check[0] == wrong_pairs[to_check_src[0]]:
-                            continue
-                    new_cands.append(cand)
-                sent["cands"] = new_cands
+            flipped_pronoun = _flipped_pronoun(sent["source"])
+            if flipped_pronoun:
+                sent["cands"] = [cand for cand in sent["cands"] if not _flips_pronoun(cand, flipped_pronoun)]
         return paraphrases
 
     def paraphrase_main(self, intent_train_utts, intent_name):
@@ -0,0 +1,108 @@
+#  Copyright (c) 2022, salesforce.com, inc.
+#   All rights reserved.
+#   SPDX-License-Identifier: BSD-3-Clause
+#   For full license text, see the LICENSE file in the repo root or https://opensource.org/licenses/BSD-3-Clause
+
+import hashlib, json, os, sqlite3, threading
+
+DEFAULT_CACHE_PATH = "data/paraphrase_cache.sqlite3"
+
+# cache path -> ParaphraseCache shared by all paraphrasers of the process
+loaded_caches = {}
+
+
+class ParaphraseCache:
+    """
+    Persistent, content-addressed cache of paraphrase candidates. An entry is keyed by the hash of the model
+    settings (model id, beam size, number of returned sequences, maximum length) and the utterance, so that
+    regenerating the paraphrases of a revised bot only runs the models on new utterances.
+    The entries are kept in a SQLite database in WAL mode, which serialises concurrent writers (e.g., generators of
+    several bots) and lets readers proceed while another process writes.
+    """
+
+    def __init__(self, cache_path=DEFAULT_CACHE_PATH, timeout=60.0):
+        """
+        :param cache_path: path to the SQLite database
+        :param timeout: seconds to wait for the write lock held by another process
+        """
+        self.cache_path = cache_path
+        self.timeout = timeout
+        self.lock = threading.Lock()
+        self.connection = None
+        self.connection_pid = None
+        self.hits, self.misses = 0, 0
+
+    def _connect(self):
+        # connections must not be shared with forked processes
+        if self.connection is None or self.connection_pid != os.getpid():
+            os.makedirs(os.path.dirname(self.cache_path) or ".", exist_ok=True)
+            self.connection = sqlite3.connect(self.cache_path, timeout=self.timeout, check_same_thread=False)
+            self.connection.execute("PRAGMA journal_mode=WAL")
+            self.connection.execute("CREATE TABLE IF NOT EXISTS paraphrases "
+                                    "(key TEXT PRIMARY KEY, settings TEXT, utterance TEXT, candidates TEXT)")
+            self.connection_pid = os.getpid()
+        return self.connection
+
+    @staticmethod
+    def _key(settings, utterance):
+        return hashlib.sha1((settings + "\0" + utterance).encode("UTF-8")).hexdigest()
+
+    @staticmethod
+    def _settings(model_settings):
+        return json.dumps(model_settings, sort_keys=True)
+
+    def get(self, model_settings, utterances):
+        """
+        Look up the cached candidates of utterances
+        :param model_settings: dict of the model id and the generation settings
+        :param utterances: list of utterances
+        :return: a dict mapping from the cached utterances to their candidates
+        """
+        settings = self._settings(model_settings)
+        key_to_utterance = {self._key(settings, utterance): utterance for utterance in utterances}
+        cached = {}
+        keys = list(key_to_utterance)
+        with self.lock:
+            connection = self._connect()
+            # stay below the SQLite limit on the number of query parameters
+            for start in range(0, len(keys), 500):
+                chunk = keys[start:start + 500]
+                rows = connection.execute("SELECT key, candidates FROM paraphrases WHERE key IN ({})".format(
+                    ",".join("?" * len(chunk))), chunk).fetchall()
+                for key, candidates in rows:
+                    cached[key_to_utterance[key]] = json.loads(candidates)
+        self.hits += len(cached)
+        self.misses += len(key_to_utterance) - len(cached)
+        return cached
+
+    def put(self, model_settings, utterance_to_candidates):
+        """
+        Add the candidates of utterances to the cache
+        :param model_settings: dict of the model id and the generation settings
+        :param utterance_to_candidates: a dict mapping from utterances to their candidates
+        """
+        settings = self._settings(model_settings)
+        rows = [(self._key(settings, utterance), settings, utterance, json.dumps(candidates))
+                for utterance, candidates in utterance_to_candidates.items()]
+        with self.lock:
+            connection = self._connect()
+            with connection:
+                connection.executemany("INSERT OR REPLACE INTO paraphrases VALUES (?, ?, ?, ?)", rows)
+
+    def close(self):
+        with self.lock:
+            if self.connection is not None and self.connection_pid == os.getpid():
+                self.connection.close()
+            self.connection = None
+
+
+def load_paraphrase_cache(cache_path=None):
+    """
+    Open the paraphrase cache once per process
+    :param cache_path: path to the cache, by default $BOTSIM_PARAPHRASE_CACHE or data/paraphrase_cache.sqlite3
+    :return: the shared ParaphraseCache
+    """
+    cache_path = cache_path or os.environ.get("BOTSIM_PARAPHRASE_CACHE", DEFAULT_CACHE_PATH)
+    if cache_path not in loaded_caches:
+        loaded_caches[cache_path] = ParaphraseCache(cache_path)
+    return loaded_caches[cache_path]
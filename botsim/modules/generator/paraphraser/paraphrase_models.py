@@ -0,0 +1,175 @@
+#  Copyright (c) 2022, salesforce.com, inc.
+#   All rights reserved.
+#   SPDX-License-Identifier: BSD-3-Clause
+#   For full license text, see the LICENSE file in the repo root or https://opensource.org/licenses/BSD-3-Clause
+
+import os, gc, hashlib, warnings, torch, transformers
+
+from transformers import (
+    AutoTokenizer,
+    AutoModelWithLMHead,
+    PegasusForConditionalGeneration,
+    PegasusTokenizer)
+from transformers.file_utils import CONFIG_NAME, WEIGHTS_NAME, cached_path, hf_bucket_url
+
+from botsim.botsim_utils.utils import download_google_drive_url
+
+T5_MODEL_PATH = "botsim/modules/generator/paraphraser/t5_paraphraser"
+T5_CHECKPOINT_URL = "https://storage.googleapis.com/sfr-botsim-research/" \
+                    "epoch_88_dev_bleu_7.09_tgt_31.81_self_29.99/pytorch_model.bin"
+PEGASUS_MODEL_NAME = "tuner007/pegasus_paraphrase"
+
+# inference backend of the paraphrasing models (paraphraser_config["backend"])
+#   type: "eager" (fp32 PyTorch) or "int8" (dynamic int8 quantisation of the linear layers, CPU only)
+#   num_threads, num_interop_threads: PyTorch intra-op and inter-op thread counts, None for the PyTorch defaults
+#   artifact_dir: directory of the cached quantised models
+DEFAULT_BACKEND = {"type": "eager", "num_threads": None, "num_interop_threads": None,
+                   "artifact_dir": "data/paraphrase_models"}
+BACKEND_TYPES = ("eager", "int8")
+
+# (model name, device, backend type) -> (tokenizer, model) shared by all paraphrasers of the process
+loaded_paraphrase_models = {}
+
+
+def default_device():
+    return "cuda" if torch.cuda.is_available() else "cpu"
+
+
+def _load_t5_tokenizer():
+    return AutoTokenizer.from_pretrained("t5-base")
+
+
+def _t5_checkpoint():
+    checkpoint = "{}/pytorch_model.bin".format(T5_MODEL_PATH)
+    if not os.path.exists(checkpoint):
+        # download the model check point
+        download_google_drive_url(T5_CHECKPOINT_URL, T5_MODEL_PATH, "pytorch_model.bin")
+    return checkpoint
+
+
+def _load_t5():
+    _t5_checkpoint()
+    return AutoModelWithLMHead.from_pretrained(T5_MODEL_PATH)
+
+
+def _t5_fingerprint():
+    stat = os.stat(_t5_checkpoint())
+    return "{}-{}".format(stat.st_size, stat.st_mtime_ns)
+
+
+def _load_pegasus_tokenizer():
+    return PegasusTokenizer.from_pretrained(PEGASUS_MODEL_NAME)
+
+
+def _load_pegasus():
+    return PegasusForConditionalGeneration.from_pretrained(PEGASUS_MODEL_NAME)
+
+
+def _pegasus_fingerprint():
+    """
+    Names of the cached config and weights files, which end with a hash of the hub ETag of the file contents. The
+    local cache is looked up first, so that a cached artefact is found without calling the hub
+    """
+    resolved_files = []
+    for filename in (CONFIG_NAME, WEIGHTS_NAME):
+        url = hf_bucket_url(PEGASUS_MODEL_NAME, filename=filename)
+        try:
+            resolved_files.append(cached_path(url, local_files_only=True))
+        except (OSError, ValueError):
+            # not cached yet (or offline without a cache, failing the same way as from_pretrained)
+            resolved_files.append(cached_path(url))
+    return "|".join(os.path.basename(resolved_file) for resolved_file in resolved_files)
+
+
+_MODEL_LOADERS = {"t5": (_load_t5_tokenizer, _load_t5), "pegasus": (_load_pegasus_tokenizer, _load_pegasus)}
+# identify the checkpoint a quantised model is derived from
+_MODEL_FINGERPRINTS = {"t5": _t5_fingerprint, "pegasus": _pegasus_fingerprint}
+
+
+def paraphrase_backend(backend=None):
+    """
+    Complete and validate a backend configuration
+    :param backend: dict of backend settings (see DEFAULT_BACKEND), None for the default eager backend
+    """
+    backend = dict(DEFAULT_BACKEND, **(backend or {}))
+    if backend["type"] not in BACKEND_TYPES:
+        raise ValueError("unknown paraphrase backend {}, expected one of {}".format(backend["type"], BACKEND_TYPES))
+    return backend
+
+
+def _configure_threads(backend):
+    if backend["num_threads"]:
+        torch.set_num_threads(backend["num_threads"])
+    if backend["num_interop_threads"] and torch.get_num_interop_threads() != backend["num_interop_threads"]:
+        try:
+            torch.set_num_interop_threads(backend["num_interop_threads"])
+        except RuntimeError:
+            # can only be set before the first inter-op parallel work of the process
+            warnings.warn("num_interop_threads ignored, PyTorch inter-op parallelism has already started")
+
+
+def _quantized_model_path(name, backend):
+    """
+    Path of the quantised model, keyed by the checkpoint fingerprint and the torch and transformers versions so that
+    an updated checkpoint or library never loads a stale artefact
+    """
+    fingerprint = _MODEL_FINGERPRINTS[name]()
+    return os.path.join(backend["artifact_dir"], "{}.int8.{}.torch-{}.transformers-{}.pt".format(
+        name, hashlib.sha1(fingerprint.encode("utf-8")).hexdigest()[:12], torch.__version__,
+        transformers.__version__))
+
+
+def _load_int8(name, backend):
+    """
+    Dynamically quantise the linear layers of a model to int8. The quantised model is cached under
+    backend["artifact_dir"] so that later runs skip loading the fp32 checkpoint and quantising it.
+    """
+    artifact_path = _quantized_model_path(name, backend)
+    if os.path.exists(artifact_path):
+        return torch.load(artifact_path)
+    model = torch.quantization.quantize_dynamic(_MODEL_LOADERS[name][1]().eval(), {torch.nn.Linear},
+                                                dtype=torch.qint8)
+    # loading the fp32 model may have updated the cached checkpoint
+    artifact_path = _quantized_model_path(name, backend)
+    os.makedirs(backend["artifact_dir"], exist_ok=True)
+    # write to a temporary file first so that concurrent generators never load a partial artefact
+    tmp_path = "{}.{}.tmp".format(artifact_path, os.getpid())
+    torch.save(model, tmp_path)
+    os.replace(tmp_path, artifact_path)
+    return model
+
+
+def load_paraphrase_model(name, device=None, backend=None):
+    """
+    Load a paraphrasing model and its tokenizer once per process and keep them resident until released
+    :param name: "t5" or "pegasus"
+    :param device: torch device of the model, by default cuda if available
+    :param backend: inference backend settings, see DEFAULT_BACKEND
+    :return: (tokenizer, model) in evaluation mode
+    """
+    backend = paraphrase_backend(backend)
+    device = device or ("cpu" if backend["type"] == "int8" else default_device())
+    if backend["type"] == "int8" and device != "cpu":
+        raise ValueError("the int8 paraphrase backend only runs on cpu, got device {}".format(device))
+    key = (name, device, backend["type"])
+    if key not in loaded_paraphrase_models:
+        _configure_threads(backend)
+        tokenizer = _MODEL_LOADERS[name][0]()
+        if backend["type"] == "int8":
+            model = _load_int8(name, backend)
+        else:
+            model = _MODEL_LOADERS[name][1]()
+        loaded_paraphrase_models[key] = (tokenizer, model.to(device).eval())
+    return loaded_paraphrase_models[key]
+
+
+def release_paraphrase_models(name=None):
+    """
+    Free the loaded paraphrasing models, e.g., after all intents have been paraphrased
+    :param name: model to release, all models by default
+    """
+    for key in [key for key in loaded_paraphrase_models if name is None or key[0] == name]:
+        del loaded_paraphrase_models[key]
+    gc.collect()
+    if torch.cuda.is_available():
+        torch.cuda.empty_cache()
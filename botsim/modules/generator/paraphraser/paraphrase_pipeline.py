@@ -0,0 +1,225 @@
+#  Copyright (c) 2022, salesforce.com, inc.
+#   All rights reserved.
+#   SPDX-License-Identifier: BSD-3-Clause
+#   For full license text, see the LICENSE file in the repo root or https://opensource.org/licenses/BSD-3-Clause
+
+import queue, threading
+
+# end of the stream of batches
+_END = object()
+
+
+class _Failure:
+    """ Error raised by a pipeline stage, passed down the pipeline and re-raised by the consumer """
+
+    def __init__(self, error):
+        self.error = error
+
+
+class _Batch:
+    """ A batch of sentences on its way through the pipeline """
+
+    def __init__(self, sentences, cands):
+        self.sentences = sentences
+        # model name -> {sentence: candidates} of the cached and the generated paraphrases
+        self.cands = cands
+        # model name -> (sentences to paraphrase, tokenizer, model, model inputs or outputs)
+        self.pending = {}
+        self.paraphrases = None
+
+
+class ParaphrasePipeline:
+    """
+    Streaming paraphrase pipeline. Batches of sentences flow through four stages connected by bounded queues, each
+    stage running in its own thread so that the stages of successive batches overlap:
+      1) tokenisation: look up the paraphrase cache, batch the remaining sentences by length and tokenise them
+      2) generation: run the paraphrasing models (beam search)
+      3) deduplication: decode and deduplicate the generated paraphrases and add them to the cache
+      4) ranking: pool the paraphrases of the models and rank them with the sentence transformer
+    The consumer receives the paraphrases of each intent as soon as all its sentences have been ranked, so that they
+    can be written to disk while later intents are still paraphrased. The sentences are processed in windows following
+    the intent order and only the batches in flight and the intents not yet finished are held in memory.
+    """
+
+    def __init__(self, paraphraser, rank=True, window_size=None, queue_size=2):
+        """
+        :param paraphraser: the Paraphraser whose models, cache and ranker are used
+        :param rank: whether to rank the pooled paraphrases of an ensemble
+        :param window_size: number of sentences batched together by length, by default 4 * max_batch_size
+        :param queue_size: maximum number of batches waiting between two stages
+        """
+        self.paraphraser = paraphraser
+        self.rank = rank
+        self.window_size = window_size or 4 * paraphraser.max_batch_size
+        self.queue_size = queue_size
+        self.model_stages = paraphraser.enabled_model_stages()
+        # the tokenisation and deduplication stages share the tokenizer of a model, e.g., a fast (Rust) tokenizer
+        # whose padding and truncation settings are mutated by each call and cannot be borrowed by two threads
+        self.tokenizer_locks = {stages.name: threading.Lock() for stages in self.model_stages}
+
+    @staticmethod
+    def _put(out_queue, item, stop):
+        """ Put an item unless the pipeline has been stopped, returns False if stopped """
+        while not stop.is_set():
+            try:
+                out_queue.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    @staticmethod
+    def _get(in_queue, stop):
+        while not stop.is_set():
+            try:
+                return in_queue.get(timeout=0.1)
+            except queue.Empty:
+                continue
+        return _END
+
+    def _run_stage(self, process_batch, in_queue, out_queue, stop):
+        """ Process the batches of in_queue and pass them on until the end of the stream or a failure """
+        while True:
+            batch = self._get(in_queue, stop)
+            if batch is _END or isinstance(batch, _Failure):
+                self._put(out_queue, batch, stop)
+                return
+            try:
+                process_batch(batch)
+            except Exception as error:
+                self._put(out_queue, _Failure(error), stop)
+                return
+            if not self._put(out_queue, batch, stop):
+                return
+
+    def _produce(self, corpus, out_queue, stop):
+        """ Tokenisation stage, the source of the pipeline """
+        try:
+            for start in range(0, len(corpus), self.window_size):
+                for batch in self._batches(corpus[start:start + self.window_size]):
+                    if not self._put(out_queue, batch, stop):
+                        return
+        except Exception as error:
+            self._put(out_queue, _Failure(error), stop)
+            return
+        self._put(out_queue, _END, stop)
+
+    def _batches(self, window):
+        """ Batches of a window of sentences, with the inputs of the models the sentences are not cached for """
+        cache = self.paraphraser.cache
+        cached = {stages.name: cache.get(stages.settings, window) if cache else {} for stages in self.model_stages}
+        missing = [sentence for sentence in window
+                   if any(sentence not in cached[stages.name] for stages in self.model_stages)]
+        missing_set = set(missing)
+        done = [sentence for sentence in window if sentence not in missing_set]
+        if done:
+            yield _Batch(done, {stages.name: {sentence: cached[stages.name][sentence] for sentence in done}
+                                for stages in self.model_stages})
+        if not missing:
+            return
+        # batch by the input lengths of the first model to run
+        length_stages = next(stages for stages in self.model_stages
+                             if any(sentence not in cached[stages.name] for sentence in missing))
+        with self.tokenizer_locks[length_stages.name]:
+            lengths = length_stages.lengths(missing, self.paraphraser.load_model(length_stages.name)[0])
+        for indices in self.paraphraser._curate_length_sorted_batches(lengths):
+            sentences = [missing[i] for i in indices]
+            batch = _Batch(sentences, {stages.name: {sentence: cached[stages.name][sentence]
+                                                     for sentence in sentences if sentence in cached[stages.name]}
+                                       for stages in self.model_stages})
+            for stages in self.model_stages:
+                to_paraphrase = [sentence for sentence in sentences if sentence not in cached[stages.name]]
+                if to_paraphrase:
+                    tokenizer, model = self.paraphraser.load_model(stages.name)
+                    with self.tokenizer_locks[stages.name]:
+                        inputs = stages.tokenize(to_paraphrase, tokenizer)
+                    batch.pending[stages.name] = (to_paraphrase, tokenizer, model, inputs)
+            yield batch
+
+    def _generate(self, batch):
+        for stages in self.model_stages:
+            if stages.name in batch.pending:
+                sentences, tokenizer, model, inputs = batch.pending[stages.name]
+                batch.pending[stages.name] = (sentences, tokenizer, model, stages.generate(inputs, model))
+
+    def _deduplicate(self, batch):
+        for stages in self.model_stages:
+            if stages.name in batch.pending:
+                sentences, tokenizer, _, outputs = batch.pending.pop(stages.name)
+                with self.tokenizer_locks[stages.name]:
+                    paraphrases = stages.decode(sentences, outputs, tokenizer)
+                generated = {paraphrase["source"]: paraphrase["cands"] for paraphrase in paraphrases}
+                if self.paraphraser.cache:
+                    self.paraphraser.cache.put(stages.settings, generated)
+                batch.cands[stages.name].update(generated)
+
+    def _rank(self, batch):
+        model_paraphrases = {"t5": [], "pegasus": []}
+        for stages in self.model_stages:
+            model_paraphrases[stages.name] = [{"source": sentence, "cands": list(batch.cands[stages.name][sentence])}
+                                              for sentence in batch.sentences]
+        paraphrases = self.paraphraser._pool_paraphrases(model_paraphrases["t5"], model_paraphrases["pegasus"])
+        if self.rank and self.paraphraser.is_ensemble:
+            paraphrases = self.paraphraser.ranker.rank(paraphrases)
+        batch.paraphrases = paraphrases
+        batch.cands = None
+
+    def run(self, intent_to_sentences):
+        """
+        Paraphrase the sentences of the intents
+        :param intent_to_sentences: a dict mapping from intent names to the sentences to be paraphrased
+        :return: generator of (intent, paraphrases) in the order the intents are finished
+        """
+        sentence_to_intents = {}
+        remaining = {}
+        for intent, sentences in intent_to_sentences.items():
+            remaining[intent] = set(sentences)
+            for sentence in remaining[intent]:
+                sentence_to_intents.setdefault(sentence, []).append(intent)
+        for intent in intent_to_sentences:
+            if not remaining[intent]:
+                yield intent, []
+        if not sentence_to_intents or not self.model_stages:
+            for intent in intent_to_sentences:
+                if remaining[intent]:
+                    yield intent, []
+            return
+
+        stop = threading.Event()
+        queues = [queue.Queue(self.queue_size) for _ in range(4)]
+        threads = [threading.Thread(target=self._produce, args=(list(sentence_to_intents), queues[0], stop))]
+        for process_batch, in_queue, out_queue in zip([self._generate, self._deduplicate, self._rank],
+                                                      queues[:-1], queues[1:]):
+            threads.append(threading.Thread(target=self._run_stage, args=(process_batch, in_queue, out_queue, stop)))
+        for thread in threads:
+            thread.daemon = True
+            thread.start()
+
+        # ranked paraphrases of the sentences whose intents are not finished yet
+        sentence_paraphrases = {}
+        try:
+            while True:
+                batch = self._get(queues[-1], stop)
+                if batch is _END:
+                    break
+                if isinstance(batch, _Failure):
+                    raise batch.error
+                finished = []
+                for sentence, paraphrase in zip(batch.sentences, batch.paraphrases):
+                    sentence_paraphrases[sentence] = paraphrase
+                    for intent in sentence_to_intents[sentence]:
+                        remaining[intent].discard(sentence)
+                        if not remaining[intent]:
+                            finished.append(intent)
+                for intent in finished:
+                    # copies, the same sentence may belong to several intents
+                    yield intent, [{"source": sentence, "cands": list(sentence_paraphrases[sentence]["cands"])}
+                                   for sentence in intent_to_sentences[intent]]
+                    for sentence in set(intent_to_sentences[intent]):
+                        sentence_to_intents[sentence].remove(intent)
+                        if not sentence_to_intents[sentence]:
+                            del sentence_paraphrases[sentence]
+        finally:
+            stop.set()
+            for thread in threads:
+                thread.join()
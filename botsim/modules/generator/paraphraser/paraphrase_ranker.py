@@ -3,18 +3,46 @@
 #   SPDX-License-Identifier: BSD-3-Clause
 #   For full license text, see the LICENSE file in the repo root or https://opensource.org/licenses/BSD-3-Clause
 
-from sentence_transformers import SentenceTransformer, util
 import numpy as np
+from botsim.models.embedding_store import load_embedding_store
 
 
 class ParaphraseRanker:
     """
     Rank and filter the paraphrases according to the semantic similarity measured by sentence transformer.
     Paraphrases with very high or very low semantic scores are discarded.
+    All sources and candidates passed to one call (an intent or a whole run) are encoded together in large batches
+    and their similarities are computed with one vectorised operation. Embeddings are read from (and added to) the
+    persistent embedding store, so that regenerating paraphrases only embeds new sentences.
     """
 
-    def __init__(self):
-        self.sentence_transformer = SentenceTransformer("paraphrase-MiniLM-L6-v2")
+    def __init__(self, model_name="paraphrase-MiniLM-L6-v2"):
+        """
+        :param model_name: sentence transformer model name
+        """
+        self.embedding_store = load_embedding_store(model_name)
+
+    def _encode(self, sentences):
+        """ Encode sentences into L2-normalised embeddings, so that dot products are cosine similarities """
+        return self.embedding_store.encode(sentences, normalize_embeddings=True)
+
+    def score(self, paraphrases):
+        """ Cosine similarities between the sources and their candidates. Each distinct sentence is encoded once.
+        :param paraphrases: list of {"source": utterance, "cands": candidates}
+        :return: list of score arrays aligned with the candidates of each source
+        """
+        sentence_index = {}
+        for paraphrase in paraphrases:
+            for sentence in [paraphrase["source"]] + list(paraphrase["cands"]):
+                sentence_index.setdefault(sentence, len(sentence_index))
+        num_cands = [len(paraphrase["cands"]) for paraphrase in paraphrases]
+        if sum(num_cands) == 0:
+            return [np.zeros(0, dtype=np.float32) for _ in paraphrases]
+        embeddings = self._encode(list(sentence_index))
+        source_indices = np.repeat([sentence_index[paraphrase["source"]] for paraphrase in paraphrases], num_cands)
+        cand_indices = np.array([sentence_index[cand] for paraphrase in paraphrases for cand in paraphrase["cands"]])
+        scores = np.einsum("ij,ij->i", embeddings[source_indices], embeddings[cand_indices])
+        return np.split(scores, np.cumsum(num_cands)[:-1])
 
     def _rank_by_sentence_transformer(self, paraphrases, lower=0.6, higher=0.95):
         """ Rank paraphrases according to sentence transformer cosine distance
@@ -24,26 +52,19 @@ class ParaphraseRanker:
         :return:
         """
         cosine_ranked_paraphrases = []
-        for paraphrase in paraphrases:
-            para_embeddings = self.sentence_transformer.encode(
-                paraphrase["cands"], convert_to_tensor=True)
-            query_embedding = self.sentence_transformer.encode(
-                [paraphrase["source"]], convert_to_tensor=True)
+        for paraphrase, scores in zip(paraphrases, self.score(paraphrases)):
             bucket = {}
             ranked_paraphrases = {"source": paraphrase["source"], "cands": []}
-            res = util.pytorch_cos_sim(query_embedding, para_embeddings)[0].sort(descending=True)
-            para_list = np.array(paraphrase["cands"])[res.indices[res.values >= 0.0].cpu()].tolist()
-
-            for item in zip(res.values.tolist(), para_list):
-                score = item[0]
-                if score >= higher or score <= lower:
+            for index in np.argsort(-scores, kind="stable"):
+                score = float(scores[index])
+                if score < 0.0 or score >= higher or score <= lower:
                     continue
+                # keep one candidate per score bucket
                 key = str(score)[:4]
-                if key not in bucket:
-                    bucket[key] = item[1]
-                else:
+                if key in bucket:
                     continue
-                ranked_paraphrases["cands"].append(item[1])
+                bucket[key] = paraphrase["cands"][index]
+                ranked_paraphrases["cands"].append(paraphrase["cands"][index])
 
             cosine_ranked_paraphrases.append(ranked_paraphrases)
         return cosine_ranked_paraphrases
@@ -54,3 +75,18 @@ class ParaphraseRanker:
         :return: ranked and filtered paraphrases
         """
         return self._rank_by_sentence_transformer(paraphrases)
+
+    def rank_intents(self, intent_to_paraphrases):
+        """ Rank the paraphrases of many intents (e.g., a whole generation run) in one batch
+        :param intent_to_paraphrases: a dict mapping from intent names to the paraphrases to be ranked
+        :return: a dict mapping from intent names to the ranked and filtered paraphrases
+        """
+        intents = list(intent_to_paraphrases.keys())
+        ranked = self._rank_by_sentence_transformer(
+            [paraphrase for intent in intents for paraphrase in intent_to_paraphrases[intent]])
+        intent_to_ranked_paraphrases, start = {}, 0
+        for intent in intents:
+            end = start + len(intent_to_paraphrases[intent])
+            intent_to_ranked_paraphrases[intent] = ranked[start:end]
+            start = end
+        return intent_to_ranked_paraphrases
@@ -6,19 +6,20 @@
 import json
 import os
 import random
+import numpy as np
 import pandas as pd
-from sentence_transformers import SentenceTransformer, util
 from nltk.tokenize.treebank import TreebankWordDetokenizer
 from rapidfuzz import fuzz
 
 from datasets import load_dataset
 from botsim.botsim_utils.utils import seed_everything
+from botsim.models.embedding_store import load_embedding_store
 
 seed_everything(42)
 os.environ["WANDB_DISABLED"] = "true"
 
 detokenizer = TreebankWordDetokenizer()
-sentence_transformer = SentenceTransformer("paraphrase-MiniLM-L6-v2")
+embedding_store = load_embedding_store("paraphrase-MiniLM-L6-v2")
 
 
 def score_paraphrase(text, paraphrase):
@@ -29,19 +30,17 @@ def score_paraphrase(text, paraphrase):
     :return cosine_sims: cosine similarity computed from sentence transformer
     :return cosine_sims: cosine similarity computed from sentence transformer
     """
-    para_embeddings = sentence_transformer.encode(text, convert_to_tensor=True)
-    query_embedding = sentence_transformer.encode(paraphrase, convert_to_tensor=True)
     if isinstance(text, str):
-        return util.pytorch_cos_sim(
-            query_embedding, para_embeddings)[0], \
-               fuzz.ratio(text.lower(), paraphrase.lower())
-    cos_scores = util.pytorch_cos_sim(query_embedding, para_embeddings)
+        para_embedding, query_embedding = embedding_store.encode([text, paraphrase], normalize_embeddings=True)
+        return np.dot(query_embedding, para_embedding), fuzz.ratio(text.lower(), paraphrase.lower())
+    para_embeddings = embedding_store.encode(text, normalize_embeddings=True)
+    query_embeddings = embedding_store.encode(paraphrase, normalize_embeddings=True)
+    # only the similarities of the aligned pairs are needed
+    cosine_sims = list(np.einsum("ij,ij->i", query_embeddings, para_embeddings))
     edit_distances = []
-    cosine_sims = []
     for i in range(len(text)):
         edit_distance = fuzz.ratio(text[i].lower(), paraphrase[i].lower())
         edit_distances.append(edit_distance)
-        cosine_sims.append(cos_scores[i][i])
     return cosine_sims, edit_distances
 
 
@@ -7,7 +7,7 @@ import random
 from faker import Factory
 import sre_yield
 from google.cloud.dialogflowcx_v3beta1.services.agents import AgentsClient
-from google.cloud.dialogflowcx_v3beta1.services.sessions import SessionsClient
+from google.cloud.dialogflowcx_v3beta1.services.sessions import SessionsClient, SessionsAsyncClient
 from google.cloud.dialogflowcx_v3beta1.services.entity_types import EntityTypesClient
 from google.cloud.dialogflowcx_v3beta1.types import IntentView, \
     ListIntentsRequest, ListFlowsRequest, ListPagesRequest, ListEntityTypesRequest
@@ -31,13 +31,33 @@ def create_session(agent_path):
         client_options
         session_client
     """
+    client_options = _session_client_options(agent_path)
+    session_client = SessionsClient(client_options=client_options)
+    return client_options, session_client
+
+
+def create_async_session(agent_path):
+    """ Create a DialogFlow CX asyncio session client. The client can be shared by concurrent sessions and must be
+    created within the event loop it is used in.
+    :param agent_path: The absolute path to the CX agent/bot. For example,
+    projects/["project_id"]/locations/["location_id"]/agents/["agent_id"]"
+    :return:
+        client_options
+        session_client
+    """
+    client_options = _session_client_options(agent_path)
+    session_client = SessionsAsyncClient(client_options=client_options)
+    return client_options, session_client
+
+
+def _session_client_options(agent_path):
     agent_components = AgentsClient.parse_agent_path(agent_path)
     location_id = agent_components["location"]
+    client_options = None
     if location_id != "global":
         api_endpoint = f"{location_id}-dialogflow.googleapis.com:443"
         client_options = {"api_endpoint": api_endpoint}
-    session_client = SessionsClient(client_options=client_options)
-    return client_options, session_client
+    return client_options
 
 
 def list_intents(agent_path, intent_client):
@@ -6,7 +6,8 @@
 import json, time, os
 import botsim.modules.remediator.remediator_utils.utils as remediator_utils
 import botsim.modules.remediator.remediator_utils.analytics as analytics
-from botsim.botsim_utils.utils import read_s3_json, dump_s3_file
+from botsim.botsim_utils.utils import read_s3_json, dump_s3_file, file_exists
+from botsim.modules.simulator.episode_log import read_episode_log, episode_log_path
 
 
 class Remediator:
@@ -22,6 +23,8 @@ class Remediator:
           conversation turns) and simulation goals for all simulated dialogs/episodes
        2) configs["remediator"]["file_paths"]["simulation_error_info"]: a json file containing error info for all failed
           dialogs
+       Both are superseded by the JSON Lines episode log (episodes_<setting>.jsonl next to the simulation log) with
+       the typed simulation result of each episode. The json files are only used if the episode log does not exist.
 
        Output bot health reports for each intent:
        1) aggregated_simulation_result_json report containing
@@ -44,6 +47,7 @@ class Remediator:
             "<para_setting>", para_setting).replace(
             "<num_utterances>", num_seed_intent_utterances).replace(
             "<num_simulations>", num_simulation_episodes).replace("<mode>", self.mode)
+        self.simulation_episode_log_path = episode_log_path(self.simulation_log_json_path)
         self.aggregated_simulation_result_json_path = self.configs["remediator"]["file_paths"][
             "simulated_dialogs"].replace(
             "<para_setting>", para_setting).replace(
@@ -372,11 +376,59 @@ class Remediator:
                 self.aggregated_results[intent].append(episode)
                 sessions_processed.add(session_index)
 
+    def episode_dialog_error(self, episode):
+        """
+        Dialog error info of a failed episode from the typed fields of its episode log record, in the same format
+        as the entries returned by parse_simulation_error_info
+        :param episode: episode record of the JSON Lines episode log
+        """
+        session_index = episode["episode_index"] + 1
+        if episode["status"] == 1:
+            return {"session": session_index, "error": "Intent Error",
+                    "error_turn_index": episode["error_turn_index"], "error_turn": episode["error_turn"],
+                    "intent_error": {"ground_truth": episode["intent"]}, "num_turns": episode["num_turns"]}
+        if episode["status"] == 2:
+            return {"session": session_index, "error": "NER Error", "error_turn_index": episode["error_turn_index"],
+                    "error_turn": episode["error_turn"], "error_slot": episode["error_slot"],
+                    "num_turns": episode["num_turns"],
+                    "ner_errors": {"slot": episode["error_slot"], "ground_truth": "TBD",
+                                   "error_type": episode["ner_error_type"]}}
+        return {"session": session_index, "error": "Other Error", "error_turn_index": "TBD", "error_turn": ""}
+
+    def analyse_episode_log(self, episode_log, intent):
+        """
+        Same as parse_simulation_error_info followed by analyse_simulated_conversations, but streamed from the
+        typed records of the JSON Lines episode log
+        """
+        sessions_processed = set()
+        self.simulation_error_info[intent] = {}
+        for episode in read_episode_log(episode_log.replace("<intent>", intent)):
+            if episode["status"] != 0:
+                self.simulation_error_info[intent][episode["episode_index"] + 1] = self.episode_dialog_error(episode)
+            episode_info, session_index = \
+                remediator_utils.analyse_one_simulation_episode(
+                    episode["goal"]["name"],
+                    episode["chat_log"],
+                    intent,
+                    self.simulation_error_info, self.ner_errors,
+                    self.intent_predictions,
+                    self.customer_entities, self.paraphrase_intent_queries,
+                    self.intent_success_messages, self.intent_check_turn_index,
+                    episode_result=episode)
+            if episode_info and session_index not in sessions_processed:
+                self.aggregated_results[intent].append(episode_info)
+                sessions_processed.add(session_index)
+
     def generate_intent_report(self, intent):
-        # Step 1: parse the error info generated by the Simulator
-        self.simulation_error_info[intent] = self.parse_simulation_error_info(self.simulation_error_info_path, intent)
-        # Step 2: perform analysis based on the simulation logs generated by the Simulator
-        self.analyse_simulated_conversations(self.simulation_log_json_path, intent)
+        if file_exists("botsim", self.simulation_episode_log_path.replace("<intent>", intent)):
+            # Step 1 & 2: stream the typed episode records of the episode log generated by the Simulator
+            self.analyse_episode_log(self.simulation_episode_log_path, intent)
+        else:
+            # Step 1: parse the error info generated by the Simulator
+            self.simulation_error_info[intent] = self.parse_simulation_error_info(self.simulation_error_info_path,
+                                                                                  intent)
+            # Step 2: perform analysis based on the simulation logs generated by the Simulator
+            self.analyse_simulated_conversations(self.simulation_log_json_path, intent)
         aggregated_results_str = json.dumps(self.aggregated_results[intent], indent=4)
 
         # Step 3: dump the aggregated simulation results
@@ -12,7 +12,8 @@ from botsim.botsim_utils.utils import (
     read_s3_data,
     convert_list_to_dict,
     S3_BUCKET_NAME)
-from sentence_transformers import SentenceTransformer
+from botsim.modules.simulator.simulation_metrics import merge_latencies
+from botsim.models.embedding_store import load_embedding_store
 
 
 def color_cell(val, threshold=60):
@@ -24,8 +25,8 @@ def color_cell(val, threshold=60):
     return f"color: {color}"
 
 
-def extract_sentence_transformer_embedding(sentence_transformer, utterances, intent):
-    embedding = sentence_transformer.encode(utterances, convert_to_tensor=True)
+def extract_sentence_transformer_embedding(embedding_store, utterances, intent):
+    embedding = embedding_store.encode(utterances)
     labels = [intent] * embedding.shape[0]
     return embedding, labels
 
@@ -44,15 +45,10 @@ def get_embedding(intents, database, test_id="169", paraphrase=False, para_setti
                                                                                                                   384)
             dev_labels = read_s3_json(S3_BUCKET_NAME, goals_dir + "/dev_embedding_label.npy")["label"]
             return dev_embedding, dev_labels
-    else:
-        if os.path.exists(goals_dir + "/dev_embedding.npy"):
-            with open(goals_dir + "/dev_embedding.npy", "rb") as f:
-                dev_embedding = np.load(f)
-            with  open(goals_dir + "/dev_embedding_label.npy", "rb") as f:
-                dev_labels = np.load(f, allow_pickle=True)
-            return dev_embedding, dev_labels.item().get("label")
-
-    sentence_transformer = SentenceTransformer("paraphrase-MiniLM-L6-v2")
+
+    # local embeddings are not snapshotted: the embedding store only embeds the utterances changed since the last
+    # time, so the embeddings always reflect the current goals_dir
+    embedding_store = load_embedding_store()
     for i, intent in enumerate(intents):
         file_name = goals_dir + "/" + intent + "_" + para_setting + ".paraphrases.json"
         if "STORAGE" in os.environ and os.environ["STORAGE"] == "S3":
@@ -81,18 +77,13 @@ def get_embedding(intents, database, test_id="169", paraphrase=False, para_setti
                     if paraphrase:
                         utterances.extend(p["cands"])
 
-        embedding, labels = extract_sentence_transformer_embedding(sentence_transformer, utterances, intent)
+        embedding, labels = extract_sentence_transformer_embedding(embedding_store, utterances, intent)
         dev_embedding = np.concatenate((dev_embedding, embedding))
         dev_labels["label"].extend([intent] * embedding.shape[0])
 
     if "STORAGE" in os.environ and os.environ["STORAGE"] == "S3":
         dump_s3_file(goals_dir + "/dev_embedding.npy", dev_embedding.tobytes())
         dump_s3_file(goals_dir + "/dev_embedding_label.npy", bytes(json.dumps(dev_labels, indent=2).encode("UTF-8")))
-    else:
-        with open(goals_dir + "/dev_embedding.npy", "wb") as f:
-            np.save(f, dev_embedding, allow_pickle=False)
-        with  open(goals_dir + "/dev_embedding_label.npy", "wb") as f:
-            np.save(f, dev_labels, allow_pickle=True)
 
     return dev_embedding, dev_labels.get("label")
 
@@ -113,6 +104,16 @@ def get_number_dialogs(overall_performance, mode):
     return num_dialogs, num_success_dialogs, intent_to_errors
 
 
+def get_bot_response_latency(database, test_id, mode):
+    """
+    Bot response latency distribution of a test across all its intents of the given mode
+    :return: dict of count, mean, p50, p90, p99 and max (in seconds), None if no metrics have been recorded
+    """
+    metrics = [intent_metrics for intent_metrics in database.retrieve_simulation_metrics(test_id)
+               if intent_metrics["mode"] == mode.lower()]
+    return merge_latencies(metrics, "bot_response")
+
+
 def get_bot_health_reports(database, test_id):
     config = dict(database.get_one_bot_test_instance(test_id))
     report_path = "data/bots/{}/{}/aggregated_report.json".format(config["type"], test_id)
@@ -68,6 +68,14 @@ def render_summary_reports(database, mode, test, dataset_info, overall_performan
         str_num_successes = "✔️ ***" + str(success_convs) + " Completed Dialogs***"
         st.markdown(str_num_successes)
 
+    bot_response_latency = dashboard_utils.get_bot_response_latency(database, test, mode)
+    if bot_response_latency:
+        row_latency_spacer1, row_latency_1, row_latency_spacer2 = st.columns((.8, 6.6, .2))
+        with row_latency_1:
+            st.markdown("⏱️ ***Bot response latency: p50 {:.2f}s, p90 {:.2f}s, p99 {:.2f}s over {} "
+                        "responses***".format(bot_response_latency["p50"], bot_response_latency["p90"],
+                                              bot_response_latency["p99"], bot_response_latency["count"]))
+
     row4_spacer1, row4_1, row4_spacer2 = st.columns((.8, 6.6, .2))
     with row4_1:
         st.plotly_chart(dashboard_plot.plot_simulation_summary(intent_to_errors), use_container_width=True)
@@ -161,11 +161,22 @@ def _parse_episode_summary(summary_message):
     return error_type, error_turn_index, total_number_of_turns
 
 
+def _episode_result_summary(episode_result):
+    """
+    Same as _parse_episode_summary but read from the typed fields of an episode log record
+    :param episode_result: episode record of the JSON Lines episode log
+    :return: a tuple of error type, index of dialog turn causing the error, total number of dialog turns
+    """
+    error_type = {1: "Intent_error", 2: "NER_error"}.get(episode_result["status"], "Other_error")
+    return error_type, int(episode_result["error_turn_index"]), int(episode_result["num_turns"]) + 1
+
+
 def analyse_one_simulation_episode(goal, history, intent, dialog_errors, ner_errors,
                                    intent_classification_to_queries,
                                    customer_entities,
                                    paraphrase_intent_queries,
-                                   intent_success_messages, intent_query_index):
+                                   intent_success_messages, intent_query_index,
+                                   episode_result=None):
     """
     Analyse one episode  of simulation from the json simulation log produced by the simulator.
     :param goal: the goal name
@@ -179,14 +190,19 @@ def analyse_one_simulation_episode(goal, history, intent, dialog_errors, ner_err
     :param paraphrase_intent_queries: mapping from intent to its paraphrase intent queries
     :param intent_success_messages: mapping from intent to its success messages
     :param intent_query_index: the dialog turn index of the intent query
+    :param episode_result: the episode record of the JSON Lines episode log. If given, the episode result is read
+                           from its typed fields instead of being parsed from the summary message of the chat log
     """
     assert len(dialog_errors) > 0
     if len(history) == 0:
         return None, None
     summary = history[-1]
-    if not summary[0] == "=":  # discard episodes with API communication errors
+    if episode_result is not None:
+        session_index = episode_result["episode_index"] + 1
+    elif not summary[0] == "=":  # discard episodes with API communication errors
         return None, None
-    session_index = int((summary.split()[2]).strip())
+    else:
+        session_index = int((summary.split()[2]).strip())
     episode = {"dialog_history": history, "episode": "E" + str(session_index),
                "goal": goal, "intent_prediction": intent}
 
@@ -207,10 +223,15 @@ def analyse_one_simulation_episode(goal, history, intent, dialog_errors, ner_err
         intent_success = True
         classified_intent = intent
 
-    if summary.find("SUCCESS") != -1:
+    if episode_result is not None and episode_result["status"] == 0:
+        process_success_episode(":" + str(episode_result["num_turns"]), episode)
+    elif episode_result is None and summary.find("SUCCESS") != -1:
         process_success_episode(summary, episode)
     else:
-        error, error_turn_index, total_turns = _parse_episode_summary(summary)
+        if episode_result is not None:
+            error, error_turn_index, total_turns = _episode_result_summary(episode_result)
+        else:
+            error, error_turn_index, total_turns = _parse_episode_summary(summary)
         if session_index not in dialog_errors[intent]:
             return None, None
         episode["error_turn"] = str(error_turn_index)
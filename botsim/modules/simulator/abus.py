@@ -3,15 +3,44 @@
 #   SPDX-License-Identifier: BSD-3-Clause
 #   For full license text, see the LICENSE file in the repo root or https://opensource.org/licenses/BSD-3-Clause
 
-import random, copy
+import random
+from collections import namedtuple
+from types import MappingProxyType
 
 from botsim.conf.ABUS import FAILURE, botsim_default_key
-from botsim.models.nlu.nlu_fuzzy_match import FuzzyMatchIntentPredictor
-from botsim.models.nlg.nlg_template import TemplateNLG
+from botsim.models.model_registry import load_nlu_model, load_nlg_model
 from botsim.botsim_utils.utils import seed_everything
 
 seed_everything(42)
 
+# One entry of the dialog turn stack: the BotSIM action frame, the dialog turn index, the natural language
+# BotSIM message, the message with slot annotations and the dialog/intent name for simulation
+DialogTurn = namedtuple("DialogTurn", ["user_action", "turn_index", "message", "message_with_slots", "intent"])
+
+
+class DialogActionFrame:
+    """
+    Immutable snapshot of a BotSIM action (dialog act, inform slots and request slots).
+    The slot values are strings, so read-only views over shallow copies of the dialog state slots are sufficient
+    to keep the frame unaffected by later state updates. Dict-style access is kept for the NLG models.
+    """
+    __slots__ = ("action", "inform_slots", "request_slots")
+
+    def __init__(self, action, inform_slots, request_slots):
+        object.__setattr__(self, "action", action)
+        object.__setattr__(self, "inform_slots", MappingProxyType(dict(inform_slots)))
+        object.__setattr__(self, "request_slots", MappingProxyType(dict(request_slots)))
+
+    def __setattr__(self, key, value):
+        raise AttributeError("DialogActionFrame is immutable")
+
+    def __getitem__(self, key):
+        return getattr(self, key)
+
+    def __repr__(self):
+        return "DialogActionFrame(action={!r}, inform_slots={!r}, request_slots={!r})".format(
+            self.action, dict(self.inform_slots), dict(self.request_slots))
+
 
 class UserSimulatorInterface:
     """Agenda-based dialog user simulator interface.
@@ -31,12 +60,11 @@ class UserSimulatorInterface:
         self.max_round = simulation_configs["simulator"]["run_time"]["max_round_num"]
         self.default_key = botsim_default_key
 
-        self.nlu_model = \
-            FuzzyMatchIntentPredictor( simulation_configs["generator"]["file_paths"]["revised_dialog_act_map"])
-
-        self.nlg_model = TemplateNLG(simulation_configs["generator"]["file_paths"]["response_template"])
+        # the models are loaded once per process and shared by all simulators
+        self.nlu_model = load_nlu_model(simulation_configs)
+        self.nlg_model = load_nlg_model(simulation_configs)
 
-        # a stack for keeping track of BotSIM dialog turns. Each element includes
+        # a stack for keeping track of BotSIM dialog turns. Each element is a DialogTurn including
         # 1. user dialog acts
         # 2. dialog_error_turn_index
         # 3. user_natural_lang_response
@@ -102,8 +130,8 @@ class UserSimulatorInterface:
         self.state["request_slots"][req_key] = "UNK"
 
         botsim_response = {"action": self.state["action"],
-                           "request_slots": copy.deepcopy(self.state["request_slots"]),
-                           "inform_slots": copy.deepcopy(self.state["inform_slots"]),
+                           "request_slots": dict(self.state["request_slots"]),
+                           "inform_slots": dict(self.state["inform_slots"]),
                            "response": ""}
         if "init_response" in self.goal:
             botsim_response["response"] = random.choice(self.goal["init_response"])
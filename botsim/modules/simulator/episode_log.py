@@ -0,0 +1,174 @@
+#  Copyright (c) 2022, salesforce.com, inc.
+#   All rights reserved.
+#   SPDX-License-Identifier: BSD-3-Clause
+#   For full license text, see the LICENSE file in the repo root or https://opensource.org/licenses/BSD-3-Clause
+
+import json, os
+
+from botsim.botsim_utils.utils import dump_s3_file, read_s3_data, file_exists, list_s3_keys, delete_s3_files
+
+# typed fields of an episode record, filled from the error_info of UserSimulator.log_episode_simulation_results
+EPISODE_RESULT_FIELDS = {"status": -1, "error": "", "error_turn_index": -1, "num_turns": 0, "error_turn": "",
+                         "error_turn_slots": "", "error_slot": "", "ner_error_type": "", "intent": ""}
+
+
+def episode_result(error_info):
+    """
+    Typed result of a finished episode
+    :param error_info: simulation result of the episode (see UserSimulator.log_episode_simulation_results)
+    """
+    result = {}
+    for field, default in EPISODE_RESULT_FIELDS.items():
+        value = error_info.get(field, default)
+        result[field] = value.strip() if isinstance(value, str) else value
+    return result
+
+
+class EpisodeLogWriter:
+    """
+    Append-only JSON Lines log of the simulated episodes. Every line is a JSON object of one of the types:
+      1) {"type": "episode", "episode_index": goal index, "goal": ..., "chat_log": [...], "status": 0 (success),
+          1 (intent error), 2 (NER error) or 3 (other error), "error", "error_turn_index", "num_turns",
+          "error_turn", "error_turn_slots", "error_slot", "ner_error_type", "intent"}
+      2) {"type": "summary", "total_episodes", "total_turns", "success", "intent_error", "ner_error",
+          "other_error", "summary": human-readable summary, "final": whether the simulation has finished}
+    Episodes are written and flushed as soon as they finish, so the memory use does not grow with the number of
+    episodes and completed episodes survive a crashed run. S3 does not support appends, so with S3 storage the log is
+    a sequence of objects: the log itself holds the records the log is started with, and the lines written since the
+    previous checkpoint are uploaded as the next part object (<log>.part-000001, ...) at every checkpoint and when the
+    log is closed. Only the lines of one checkpoint interval are held in memory and uploaded at a time.
+    """
+
+    def __init__(self, log_path, records=()):
+        """
+        :param log_path: path to the .jsonl log
+        :param records: records to start the log with, e.g., the finished episodes of a resumed simulation
+        """
+        self.log_path = log_path
+        self.s3_lines = None
+        self.num_s3_parts = 0
+        self.log_file = None
+        if os.environ.get("STORAGE") == "S3":
+            # the parts of a previous run are replaced by the records
+            stale_parts = list_s3_keys("botsim", s3_part_prefix(log_path))
+            dump_s3_file(log_path, bytes("".join(json.dumps(record) + "\n" for record in records).encode("UTF-8")))
+            if stale_parts:
+                delete_s3_files("botsim", stale_parts)
+            self.s3_lines = []
+        else:
+            os.makedirs(os.path.dirname(os.path.abspath(log_path)), exist_ok=True)
+            # rewrite the log through a temporary file so that the kept records are never lost by a crash
+            tmp_path = "{}.{}.tmp".format(log_path, os.getpid())
+            with open(tmp_path, "w") as tmp_file:
+                for record in records:
+                    tmp_file.write(json.dumps(record) + "\n")
+            os.replace(tmp_path, log_path)
+            self.log_file = open(log_path, "a")
+
+    def write(self, record):
+        line = json.dumps(record)
+        if self.s3_lines is not None:
+            self.s3_lines.append(line)
+        else:
+            self.log_file.write(line + "\n")
+            self.log_file.flush()
+
+    def write_episode(self, episode_index, episode_log):
+        """
+        :param episode_index: index of the simulation goal of the episode
+        :param episode_log: {"goal", "chat_log", "result"} entry of the episode in the client's dialog_logs
+        """
+        record = {"type": "episode", "episode_index": episode_index,
+                  "goal": episode_log["goal"], "chat_log": episode_log["chat_log"]}
+        record.update(episode_log["result"])
+        self.write(record)
+
+    def write_summary(self, summary, total_episodes, total_turns, success, intent_error, ner_error, other_error,
+                      final=False):
+        self.write({"type": "summary", "total_episodes": total_episodes, "total_turns": total_turns,
+                    "success": success, "intent_error": intent_error, "ner_error": ner_error,
+                    "other_error": other_error, "summary": summary, "final": final})
+
+    def checkpoint(self):
+        """
+        Make the episodes written so far durable. Local logs are flushed line by line, the lines of S3 logs written
+        since the previous checkpoint are uploaded as the next part
+        """
+        if self.s3_lines:
+            self.num_s3_parts += 1
+            dump_s3_file("{}{:06d}".format(s3_part_prefix(self.log_path), self.num_s3_parts),
+                         bytes("".join(line + "\n" for line in self.s3_lines).encode("UTF-8")))
+            self.s3_lines = []
+
+    def close(self):
+        if self.s3_lines is not None:
+            self.checkpoint()
+            self.s3_lines = None
+        elif self.log_file:
+            self.log_file.close()
+            self.log_file = None
+
+
+def s3_part_prefix(log_path):
+    """ Key prefix of the part objects of an episode log stored on S3 """
+    return log_path + ".part-"
+
+
+def read_episode_log_lines(log_path):
+    """ Complete lines of an episode log, read lazily from local files and part by part from S3 """
+    if os.environ.get("STORAGE") == "S3":
+        for key in [log_path] + list_s3_keys("botsim", s3_part_prefix(log_path)):
+            lines = read_s3_data("botsim", key).decode("UTF-8").splitlines()
+            yield from (line.strip() for line in lines if line.strip())
+        return
+    with open(log_path, "r") as log_file:
+        for line in log_file:
+            # a crashed run may leave a partially written last line without the newline
+            if line.endswith("\n") and line.strip():
+                yield line.strip()
+
+
+def read_episode_log(log_path, record_type="episode"):
+    """
+    Iterate over the records of a JSON Lines episode log
+    :param log_path: path to the .jsonl log
+    :param record_type: "episode" or "summary", None for all records
+    :return: generator of the records of the given type
+    """
+    for line in read_episode_log_lines(log_path):
+        try:
+            record = json.loads(line)
+        except json.JSONDecodeError:
+            continue
+        if record_type is None or record["type"] == record_type:
+            yield record
+
+
+def load_episode_checkpoint(log_path):
+    """
+    Load the finished episodes of a simulation from its episode log
+    :param log_path: path to the .jsonl log
+    :return: episode index -> episode record of the finished episodes (the latest record if an episode was logged
+             more than once) and whether the simulation has finished
+    """
+    episodes, finished = {}, False
+    if not file_exists("botsim", log_path):
+        return episodes, finished
+    for record in read_episode_log(log_path, record_type=None):
+        if record["type"] == "episode":
+            episodes[record["episode_index"]] = record
+            finished = False
+        elif record["type"] == "summary":
+            finished = record.get("final", False)
+    return episodes, finished
+
+
+def episode_log_path(simulation_log_path):
+    """
+    Path to the JSON Lines episode log replacing the JSON simulation log (and its error file) at simulation_log_path,
+    e.g., .../logs_<setting>.json ==> .../episodes_<setting>.jsonl
+    """
+    log_dir, log_name = os.path.split(simulation_log_path)
+    if log_name.startswith("logs_"):
+        log_name = "episodes_" + log_name[len("logs_"):]
+    return os.path.join(log_dir, os.path.splitext(log_name)[0] + ".jsonl")
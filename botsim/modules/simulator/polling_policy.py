@@ -0,0 +1,82 @@
+#  Copyright (c) 2022, salesforce.com, inc.
+#   All rights reserved.
+#   SPDX-License-Identifier: BSD-3-Clause
+#   For full license text, see the LICENSE file in the repo root or https://opensource.org/licenses/BSD-3-Clause
+
+from collections import deque
+
+
+class AdaptivePollingPolicy:
+    """
+    Deadlines of the long polls retrieving bot messages. A poll timing out means that the bot has finished its turn.
+    1) The first poll after a user message waits up to response_timeout for the bot reply, by default the poll
+       timeout of the LiveAgent session (10% of its clientPollTimeout).
+    2) Once a bot message has arrived, the turn ends after a quiet period without further messages. The quiet
+       period is quiet_period_factor times the 90th percentile of the response latencies observed for the dialog
+       (time to the first reply and between the replies of a turn), bounded by [min_quiet_period, response_timeout].
+       Until min_samples latencies have been observed, the quiet period is response_timeout.
+    3) If the last message asks the user for a response (e.g., a request dialog act), the bot is expected to wait
+       for the user and the turn ends after min_quiet_period.
+    """
+
+    def __init__(self,
+                 response_timeout=None,
+                 min_quiet_period=0.3,
+                 quiet_period_factor=2.0,
+                 min_samples=10,
+                 window_size=200,
+                 end_turn_on_request=True):
+        """
+        :param response_timeout: maximum time (in seconds) to wait for bot messages, None for the poll timeout of
+            the LiveAgent session
+        :param min_quiet_period: minimum time (in seconds) to wait for further bot messages of a turn
+        :param quiet_period_factor: the quiet period in multiples of the 90th percentile response latency
+        :param min_samples: number of observed latencies before the quiet period adapts
+        :param window_size: number of the most recent latencies to learn from
+        :param end_turn_on_request: whether to end the turn early once the bot asks the user for a response
+        """
+        self.response_timeout = response_timeout
+        self.min_quiet_period = min_quiet_period
+        self.quiet_period_factor = quiet_period_factor
+        self.min_samples = min_samples
+        self.end_turn_on_request = end_turn_on_request
+        self.latencies = deque(maxlen=window_size)
+
+    @classmethod
+    def from_config(cls, simulation_config):
+        """
+        Create the policy from the optional "polling" section of the simulator configuration
+        :param simulation_config: the simulation configuration
+        """
+        return cls(**simulation_config["simulator"].get("polling", {}))
+
+    def first_poll_timeout(self, client_poll_timeout):
+        """
+        :param client_poll_timeout: poll timeout (in seconds) of the LiveAgent session
+        """
+        if self.response_timeout is not None:
+            return self.response_timeout
+        return client_poll_timeout
+
+    def record_latency(self, latency):
+        self.latencies.append(latency)
+
+    def latency_percentile(self, percentile):
+        if not self.latencies:
+            return None
+        latencies = sorted(self.latencies)
+        return latencies[min(len(latencies) - 1, int(len(latencies) * percentile / 100))]
+
+    def quiet_period(self, client_poll_timeout, expects_user_response):
+        """
+        Deadline of the next poll once bot messages of the turn have arrived
+        :param client_poll_timeout: poll timeout (in seconds) of the LiveAgent session
+        :param expects_user_response: whether the last bot message asks the user for a response
+        """
+        max_timeout = self.first_poll_timeout(client_poll_timeout)
+        if expects_user_response and self.end_turn_on_request:
+            return min(self.min_quiet_period, max_timeout)
+        if len(self.latencies) < self.min_samples:
+            return max_timeout
+        quiet_period = self.quiet_period_factor * self.latency_percentile(90)
+        return min(max_timeout, max(self.min_quiet_period, quiet_period))
@@ -0,0 +1,50 @@
+#  Copyright (c) 2022, salesforce.com, inc.
+#   All rights reserved.
+#   SPDX-License-Identifier: BSD-3-Clause
+#   For full license text, see the LICENSE file in the repo root or https://opensource.org/licenses/BSD-3-Clause
+
+import asyncio, time
+
+# project/bot key -> AsyncRateLimiter shared by all simulation clients of the process
+_rate_limiters = {}
+
+
+class AsyncRateLimiter:
+    """
+    Non-blocking request rate limiter for the bot API calls issued by the async simulation clients.
+    Requests are spaced 1 / qps seconds apart, allowing bursts of up to "burst" requests after idle periods.
+    Waiting requests only suspend their own coroutine.
+    """
+
+    def __init__(self, qps=10.0, burst=1):
+        """
+        :param qps: maximum number of requests per second, 0 or negative to disable rate limiting
+        :param burst: maximum number of requests issued back to back
+        """
+        self.qps = qps
+        self.burst = max(1, burst)
+        self.next_request_time = 0.0
+
+    @classmethod
+    def from_config(cls, simulation_config, key):
+        """
+        Get the limiter shared by all clients of the process calling the API of the same project/bot.
+        The limits are read from the optional "rate_limit" section of the simulator configuration.
+        :param simulation_config: the simulation configuration
+        :param key: the project/bot identifier the limit applies to
+        """
+        if key not in _rate_limiters:
+            _rate_limiters[key] = cls(**simulation_config["simulator"].get("rate_limit", {}))
+        return _rate_limiters[key]
+
+    async def acquire(self):
+        """ Wait until the next request can be issued """
+        if self.qps <= 0:
+            return
+        interval = 1.0 / self.qps
+        now = time.monotonic()
+        # unused request slots of idle periods are kept for bursts of at most self.burst requests
+        request_time = max(self.next_request_time, now - (self.burst - 1) * interval)
+        self.next_request_time = request_time + interval
+        if request_time > now:
+            await asyncio.sleep(request_time - now)
@@ -0,0 +1,111 @@
+#  Copyright (c) 2022, salesforce.com, inc.
+#   All rights reserved.
+#   SPDX-License-Identifier: BSD-3-Clause
+#   For full license text, see the LICENSE file in the repo root or https://opensource.org/licenses/BSD-3-Clause
+
+import asyncio, random
+
+
+class RetryBudget:
+    """
+    Number of retries a single simulation session may spend across all of its API calls.
+    Once exhausted, failed calls are no longer retried and the session is expected to be discarded.
+    """
+
+    def __init__(self, max_retries):
+        self.remaining = max_retries
+        self.used = 0
+
+    def consume(self):
+        if self.remaining <= 0:
+            return False
+        self.remaining -= 1
+        self.used += 1
+        return True
+
+
+class AsyncRetryPolicy:
+    """
+    Non-blocking retry policy for the bot API calls issued by the async simulation clients.
+    Retries are delayed with asyncio.sleep so that a slow session only suspends its own coroutine,
+    using exponential backoff with full jitter: delay = uniform(0, min(max_delay, base_delay * 2 ** attempt)).
+    Every attempt, including the retries, first waits for the optional AsyncRateLimiter of the bot API.
+    Failed attempts and retries are counted as "api_errors" and "retries" by the optional SimulationMetrics.
+    """
+
+    def __init__(self,
+                 max_retries=3,
+                 base_delay=1.0,
+                 max_delay=30.0,
+                 session_retry_budget=10,
+                 retry_status_codes=(429, 500, 502, 503, 504),
+                 rate_limiter=None,
+                 metrics=None):
+        """
+        :param max_retries: maximum number of retries of one API call
+        :param base_delay: backoff delay (in seconds) of the first retry
+        :param max_delay: upper bound of the backoff delay (in seconds)
+        :param session_retry_budget: maximum number of retries of one simulation session
+        :param retry_status_codes: HTTP status codes to be retried
+        :param rate_limiter: optional AsyncRateLimiter applied to every request
+        :param metrics: optional SimulationMetrics counting the failed attempts and retries
+        """
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.session_retry_budget = session_retry_budget
+        self.retry_status_codes = set(retry_status_codes)
+        self.rate_limiter = rate_limiter
+        self.metrics = metrics
+
+    @classmethod
+    def from_config(cls, simulation_config, rate_limiter=None, metrics=None):
+        """
+        Create the policy from the optional "retry_policy" section of the simulator configuration
+        :param simulation_config: the simulation configuration
+        :param rate_limiter: optional AsyncRateLimiter applied to every request
+        :param metrics: optional SimulationMetrics counting the failed attempts and retries
+        """
+        return cls(rate_limiter=rate_limiter, metrics=metrics,
+                   **simulation_config["simulator"].get("retry_policy", {}))
+
+    def new_session_budget(self):
+        return RetryBudget(self.session_retry_budget)
+
+    def backoff_delay(self, attempt):
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+
+    async def call(self, send_request, budget, retry_exceptions, retry_status_codes=None):
+        """
+        Issue an API request with retries
+        :param send_request: coroutine function sending the request and returning the response
+        :param budget: RetryBudget of the session issuing the request
+        :param retry_exceptions: exception types to be retried. The last exception is re-raised when
+            the retries are exhausted
+        :param retry_status_codes: HTTP status codes to be retried for this request, self.retry_status_codes by
+            default, e.g., only the codes returned before a non-idempotent request is processed
+        :return: the first response whose status code is not retried, or the last response otherwise
+        """
+        if retry_status_codes is None:
+            retry_status_codes = self.retry_status_codes
+        attempt = 0
+        while True:
+            try:
+                if self.rate_limiter:
+                    await self.rate_limiter.acquire()
+                response = await send_request()
+                if getattr(response, "status_code", None) not in retry_status_codes:
+                    return response
+                failure = None
+            except retry_exceptions as ex:
+                response, failure = None, ex
+            if self.metrics:
+                self.metrics.increment("api_errors")
+            if attempt >= self.max_retries or not budget.consume():
+                if failure:
+                    raise failure
+                return response
+            if self.metrics:
+                self.metrics.increment("retries")
+            await asyncio.sleep(self.backoff_delay(attempt))
+            attempt += 1
@@ -0,0 +1,183 @@
+#  Copyright (c) 2022, salesforce.com, inc.
+#   All rights reserved.
+#   SPDX-License-Identifier: BSD-3-Clause
+#   For full license text, see the LICENSE file in the repo root or https://opensource.org/licenses/BSD-3-Clause
+
+import contextlib, copy, datetime, json, os, resource, subprocess, sys, time
+import numpy as np
+
+from botsim.botsim_utils.utils import create_goals, seed_everything
+from botsim.modules.simulator.abus import DialogTurn
+from botsim.modules.simulator.user_simulator import UserSimulator
+from botsim.platforms.botbuilder.mock_liveagent_server import MockBot, MockSession
+
+
+def peak_rss_mb():
+    """ Peak resident set size of the process in MB (ru_maxrss is in bytes on macOS and in KB elsewhere) """
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return max_rss / (1024 * 1024) if sys.platform == "darwin" else max_rss / 1024
+
+
+def current_commit():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"],
+                                       stderr=subprocess.DEVNULL).decode("UTF-8").strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+class SimulationBenchmark:
+    """
+    Throughput benchmark of the user simulator hot path. Episodes are simulated in-process end to end
+    (reset, enqueue_bot_actions_from_bot_messages, policy and log_episode_simulation_results) against a MockBot
+    replaying canned responses from the dialog act maps, with synthetic goals created from the ontology.
+    No bot API is called, so the measured time is spent in BotSIM only.
+    """
+
+    def __init__(self, simulation_config, intents=None, num_episodes=100, seed=42):
+        """
+        :param simulation_config: simulation configuration of the test, the dialog act map, ontology and
+            response template file paths are used
+        :param intents: intents/dialogs to simulate, all dialogs of the dialog act map by default
+        :param num_episodes: number of episodes per intent
+        :param seed: random seed for goal creation and simulation
+        """
+        self.config = copy.deepcopy(simulation_config)
+        # benchmark runs must not persist NLU predictions across runs
+        self.config["simulator"].setdefault("nlu_cache", {})["persist"] = False
+        self.num_episodes = num_episodes
+        self.seed = seed
+        file_paths = self.config["generator"]["file_paths"]
+        with open(file_paths["revised_dialog_act_map"], "r") as dialog_act_map_file:
+            self.dialog_act_maps = json.load(dialog_act_map_file)["DIALOGS"]
+        with open(file_paths["revised_ontology"], "r") as ontology_file:
+            self.ontology = json.load(ontology_file)
+        self.intents = intents or [intent for intent in self.dialog_act_maps if intent in self.ontology]
+
+    def _create_goals(self, intent):
+        queries = ["{} request number {}".format(intent.replace("_", " "), index)
+                   for index in range(self.num_episodes)]
+        return list(create_goals(intent, self.ontology, queries)["Goal"].values())
+
+    @staticmethod
+    def _simulate_episode(user_simulator, bot, episode_index, dialog_logs, dialog_errors, turn_latencies):
+        """
+        Simulate one episode following the dialog loop of the LiveAgent client
+        :return: (success, intent_error, ner_error, other_error, num_turns), or None if the episode is discarded
+        """
+        user_simulator.reset(episode_index)
+        dialog_logs[episode_index] = {"goal": user_simulator.goal, "chat_log": []}
+        bot_action_frame = {"inform_slots": {}, "request_slots": {}, "round": 1, "action": "", "message": ""}
+        session = MockSession()
+        bot_messages = bot.welcome(session)
+        while bot_messages:
+            turn_start = time.perf_counter()
+            res = user_simulator.enqueue_bot_actions_from_bot_messages(bot.bot_name, bot_messages,
+                                                                       bot_action_frame, episode_index, dialog_logs)
+            if res:
+                turn_latencies.append(time.perf_counter() - turn_start)
+                if "to_discard" in res:
+                    return None
+                return user_simulator.log_episode_simulation_results(res, episode_index, dialog_logs, dialog_errors)
+            reply, result = None, None
+            for act in user_simulator.state["bot_action_queue"]:
+                usr_action, user_response, user_response_slots = user_simulator.policy(act)
+                user_simulator.state["user_response"] = user_response
+                user_simulator.dialog_turn_stack.append(
+                    DialogTurn(usr_action, bot_action_frame["round"], user_response, user_response_slots,
+                               user_simulator.goal["name"]))
+                reply = user_response
+                if user_simulator.state["action"] == "fail":
+                    result = user_simulator.backtrack_simulation_errors()
+                elif "Goodbye" in user_simulator.state["inform_slots"] \
+                        or user_simulator.state["action"] == "thanks":
+                    result = {"num_turns": bot_action_frame["round"], "error": "Success", "status": 0,
+                              "error_turn_index": -1, "error_turn": "", "error_turn_slots": "", "error_slot": ""}
+                if result:
+                    break
+            turn_latencies.append(time.perf_counter() - turn_start)
+            if result:
+                return user_simulator.log_episode_simulation_results(result, episode_index,
+                                                                     dialog_logs, dialog_errors)
+            if reply is None:
+                return None
+            bot_action_frame["round"] += 1
+            user_simulator.state["bot_action_queue"] = []
+            bot_messages = bot.respond(session, reply)
+        return None
+
+    def run(self):
+        """
+        Run the benchmark
+        :return: benchmark results including episodes/sec, turns/sec, p50/p99 turn latency (None without turns)
+            and peak RSS
+        """
+        seed_everything(self.seed)
+        goals = {intent: self._create_goals(intent) for intent in self.intents}
+        intent_queries = {goal["inform_slots"]["intent"]: intent
+                          for intent in self.intents for goal in goals[intent]}
+        bot = MockBot(self.dialog_act_maps, intent_queries, self.ontology, seed=self.seed)
+        turn_latencies = []
+        counters = np.zeros(5, dtype=np.int64)
+        num_processed = 0
+        start = time.perf_counter()
+        with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+            for intent in self.intents:
+                user_simulator = UserSimulator(goals[intent], self.config)
+                dialog_logs, dialog_errors = {}, {}
+                for episode_index in range(len(goals[intent])):
+                    episode_result = self._simulate_episode(user_simulator, bot, episode_index,
+                                                            dialog_logs, dialog_errors, turn_latencies)
+                    if episode_result:
+                        counters += episode_result
+                        num_processed += 1
+        elapsed = time.perf_counter() - start
+        if num_processed == 0:
+            raise ConnectionRefusedError("all dialogs have been discarded")
+        success, intent_error, ner_error, other_error, _ = counters.tolist()
+        if turn_latencies:
+            latencies_ms = np.array(turn_latencies) * 1000
+            turn_latency_ms = {"mean": float(latencies_ms.mean()),
+                               "p50": float(np.percentile(latencies_ms, 50)),
+                               "p99": float(np.percentile(latencies_ms, 99))}
+        else:
+            turn_latency_ms = {"mean": None, "p50": None, "p99": None}
+        return {
+            "commit": current_commit(),
+            "timestamp": datetime.datetime.now().isoformat(timespec="seconds"),
+            "intents": self.intents,
+            "num_episodes": num_processed,
+            "num_discarded": len(self.intents) * self.num_episodes - num_processed,
+            "num_turns": len(turn_latencies),
+            "elapsed_seconds": elapsed,
+            "episodes_per_second": num_processed / elapsed,
+            "turns_per_second": len(turn_latencies) / elapsed,
+            "turn_latency_ms": turn_latency_ms,
+            "peak_rss_mb": peak_rss_mb(),
+            "outcomes": {"success": success, "intent_error": intent_error,
+                         "ner_error": ner_error, "other_error": other_error}
+        }
+
+    @staticmethod
+    def save_results(results, output_json):
+        os.makedirs(os.path.dirname(os.path.abspath(output_json)), exist_ok=True)
+        with open(output_json, "w") as json_file:
+            json.dump(results, json_file, indent=2)
+
+    @staticmethod
+    def compare_results(results, baseline):
+        """
+        Relative change of the benchmark metrics w.r.t. a baseline run, e.g., from an earlier commit
+        :param results: results of the current run
+        :param baseline: results of the baseline run
+        :return: metric name -> relative change, positive values mean larger metrics than the baseline, None if
+            either run has no value for the metric
+        """
+        metrics = {"episodes_per_second": (results["episodes_per_second"], baseline["episodes_per_second"]),
+                   "turns_per_second": (results["turns_per_second"], baseline["turns_per_second"]),
+                   "turn_latency_p50": (results["turn_latency_ms"]["p50"], baseline["turn_latency_ms"]["p50"]),
+                   "turn_latency_p99": (results["turn_latency_ms"]["p99"], baseline["turn_latency_ms"]["p99"]),
+                   "peak_rss_mb": (results["peak_rss_mb"], baseline["peak_rss_mb"])}
+        return {name: None if current is None or previous is None else
+                (current - previous) / previous if previous else 0.0
+                for name, (current, previous) in metrics.items()}
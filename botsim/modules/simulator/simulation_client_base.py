@@ -5,6 +5,10 @@
 
 import os, random, json
 from botsim.botsim_utils.utils import read_s3_json, seed_everything
+from botsim.models.model_registry import save_prediction_caches
+from botsim.modules.simulator.episode_log import EpisodeLogWriter, episode_log_path, load_episode_checkpoint
+from botsim.modules.simulator.simulation_metrics import SimulationMetrics, metrics_path
+from botsim.modules.simulator.simulation_scheduler import SimulationScheduler
 
 seed_everything(42)
 
@@ -15,8 +19,17 @@ class UserSimulatorClientInterface:
         self.start_episode = 0
         self.intent_name = ""
         self.mode = "dev"
+        # chat logs and error info of the episodes in progress, finished episodes are moved to the episode log
         self.dialog_errors = {}
         self.dialog_logs = {}
+        self.episode_log = None
+        # episode index -> episode record of the episodes finished by a previous (interrupted) run
+        self.completed_episodes = {}
+        self.simulation_goals = []
+        self.simulation_intent = ""
+        # timing spans and counters of the simulation, saved next to the episode log
+        self.metrics = SimulationMetrics()
+        self.metrics_file = None
         self.config = config
         self.batch_size = 25
 
@@ -55,14 +68,69 @@ class UserSimulatorClientInterface:
         simulation_log_dir = os.path.dirname(log_file_name)
         os.makedirs(simulation_log_dir, exist_ok=True)
 
-        chatlog = "{}/logs_{}.json".format(simulation_log_dir, identifier)
-        simulation_errors = "{}/errors_{}.json".format(simulation_log_dir, identifier)
+        episode_log_file = episode_log_path("{}/logs_{}.json".format(simulation_log_dir, identifier))
 
         simulation_goals = [x for x in user_goals if x["name"] == intent.replace("_eval", "")]
         if simulation_config["num_simulations"] != -1:
-            simulation_goals = random.sample(simulation_goals,
-                                             min(len(simulation_goals), simulation_config["num_simulations"]))
-        return simulation_goals, chatlog, simulation_errors
+            # sample with a dedicated generator so that a resumed run simulates the same goals
+            simulation_goals = random.Random(42).sample(
+                simulation_goals, min(len(simulation_goals), simulation_config["num_simulations"]))
+        return simulation_goals, episode_log_file
+
+    def open_episode_log(self, episode_log_file, simulation_goals):
+        """
+        Open the JSON Lines episode log, which is also the checkpoint of the simulation. If a previous run of the
+        simulation did not finish (or the simulation continues from a later episode), the episodes it finished for
+        the same goals are kept in the log and recorded in self.completed_episodes to be skipped.
+        Resuming can be disabled with simulator["run_time"]["resume"].
+        :param episode_log_file: path to the episode log
+        :param simulation_goals: list of simulation goals
+        :return: the counters (success, ner_error, intent_error, other_error, total_turns, total_episodes) of the
+                 completed episodes
+        """
+        self.dialog_logs, self.dialog_errors = {}, {}
+        self.completed_episodes = {}
+        if self.config["simulator"]["run_time"].get("resume", True) or self.continue_episode > 0:
+            episodes, finished = load_episode_checkpoint(episode_log_file)
+            if not finished or self.continue_episode > 0:
+                self.completed_episodes = {
+                    episode_index: episode for episode_index, episode in episodes.items()
+                    if episode_index < len(simulation_goals) and
+                    self._same_goal(episode["goal"], simulation_goals[episode_index])}
+        self.episode_log = EpisodeLogWriter(episode_log_file,
+                                            [self.completed_episodes[index] for index in
+                                             sorted(self.completed_episodes)])
+
+        success, ner_error, intent_error, other_error, total_turns = 0, 0, 0, 0, 0
+        for episode in self.completed_episodes.values():
+            success += episode["status"] == 0
+            intent_error += episode["status"] == 1
+            ner_error += episode["status"] == 2
+            other_error += episode["status"] == 3
+            total_turns += episode["num_turns"]
+        if self.completed_episodes:
+            print("resuming {} with {} completed episodes".format(self.intent_name, len(self.completed_episodes)))
+        return success, ner_error, intent_error, other_error, total_turns, len(self.completed_episodes)
+
+    @staticmethod
+    def _same_goal(logged_goal, goal):
+        return logged_goal["name"] == goal["name"] and logged_goal["inform_slots"] == goal["inform_slots"]
+
+    def close_episode_log(self):
+        if self.episode_log:
+            self.episode_log.close()
+            self.episode_log = None
+
+    def log_finished_episode(self, episode_index):
+        """
+        Append a finished episode to the episode log and release its chat log from memory.
+        Discarded episodes without simulation results are not logged.
+        :param episode_index: index of the simulation goal of the episode
+        """
+        episode_log = self.dialog_logs.pop(episode_index, None)
+        self.dialog_errors.pop(episode_index, None)
+        if episode_log and "result" in episode_log and self.episode_log:
+            self.episode_log.write_episode(episode_index, episode_log)
 
     def simulation_summary(self,
                            header,
@@ -71,7 +139,8 @@ class UserSimulatorClientInterface:
                            success,
                            intent_error,
                            ner_error,
-                           other_error):
+                           other_error,
+                           final=False):
         summary = header
         summary += "total_episodes: " + str(total_episodes) + "\n"
         summary += "success_rate: " + str(success / total_episodes) + "\n"
@@ -81,7 +150,13 @@ class UserSimulatorClientInterface:
         summary += "intent_errors: " + str(intent_error) + "\n"
         summary += "NER_errors: " + str(ner_error) + "\n"
         summary += "other_errors: " + str(other_error) + "\n"
-        self.dialog_logs["summary"][total_episodes] = summary
+        bot_response = self.metrics.to_dict()["latencies"].get("bot_response")
+        if bot_response:
+            summary += "bot_response_latency_p50/p90/p99: {:.3f}s/{:.3f}s/{:.3f}s\n".format(
+                bot_response["p50"], bot_response["p90"], bot_response["p99"])
+        if self.episode_log:
+            self.episode_log.write_summary(summary, total_episodes, total_turns, success, intent_error, ner_error,
+                                           other_error, final)
         return summary
 
     def dump_simulation_logs(self,
@@ -92,10 +167,9 @@ class UserSimulatorClientInterface:
                              success,
                              intent_error,
                              ner_error,
-                             other_error,
-                             chatlog_file,
-                             user_error_turns_file):
+                             other_error):
 
+        self.save_metrics()
         if database:
             database.save_result_to_database(self.config["id"],
                                              self.intent_name,
@@ -105,26 +179,93 @@ class UserSimulatorClientInterface:
                                              intent_error,
                                              ner_error,
                                              other_error,
-                                             total_turns
+                                             total_turns,
+                                             self.metrics.to_dict()
                                              )
         print(summary)
-        self.dialog_logs["summary"][total_episodes] = summary
-
-        if "STORAGE" in os.environ and os.environ["STORAGE"] == "S3":
-            from botsim.botsim_utils.utils import dump_s3_file
-            dump_s3_file(chatlog_file, bytes(json.dumps(self.dialog_logs, indent=2).encode("UTF-8")))
-            dump_s3_file(user_error_turns_file, bytes(json.dumps(self.dialog_errors, indent=2).encode("UTF-8")))
-        else:
-            with open(chatlog_file, "w") as log_file:
-                json.dump(self.dialog_logs, log_file, indent=2)
-            with open(user_error_turns_file, "w") as error_file:
-                json.dump(self.dialog_errors, error_file, indent=2)
+        save_prediction_caches()
+        # the episodes and the summary have already been appended to the episode log
+        self.close_episode_log()
 
         ret = {"summary": summary}
         return json.dumps(ret)
 
+    def start_simulation(self):
+        """
+        Prepare the simulation goals and open the episode log
+        :return: the indices of the episodes to simulate and the counters (success, ner_error, intent_error,
+                 other_error, total_turns, total_episodes) of the episodes completed by a previous run
+        """
+        self.simulation_goals, episode_log_file = self._prepare_simulation()
+        self.simulation_intent = self.intent_name
+        self.metrics.intent, self.metrics.mode = self.intent_name, self.mode
+        self.metrics_file = metrics_path(episode_log_file)
+        counters = self.open_episode_log(episode_log_file, self.simulation_goals)
+        episode_indices = [episode_index for episode_index in range(self.continue_episode, len(self.simulation_goals))
+                           if episode_index not in self.completed_episodes]
+        return episode_indices, counters
+
+    async def simulate_episode(self, user_simulator, episode_index):
+        """
+        Simulate one episode and move it to the episode log
+        :param user_simulator: the UserSimulator instance owned by this episode until it finishes
+        :param episode_index: index of the simulation goal to simulate
+        :return: (success, ner_error, intent_error, other_error, num_turns, num_processed) of the episode
+        """
+        with self.metrics.span("episode"):
+            episode_result = await self._simulate_episode(user_simulator, self.simulation_intent, episode_index,
+                                                          self.config)
+        self.metrics.increment("episodes" if episode_result[5] > 0 else "discarded_episodes")
+        self.log_finished_episode(episode_index)
+        return episode_result
+
+    def save_metrics(self):
+        """ Save the metrics of the simulation run next to its episode log """
+        if self.metrics_file:
+            self.metrics.save(self.metrics_file)
+
+    def finish_simulation(self, database, success, ner_error, intent_error, other_error, total_turns,
+                          total_episodes):
+        """ Log the final summary of the simulation and close the episode log """
+        if total_episodes == 0:
+            self.close_episode_log()
+            raise ConnectionRefusedError("all dialogs have been discarded")
+        header = "\n\n========= Simulation summary: ==========\n"
+        summary = self.simulation_summary(header, total_episodes, total_turns, success, intent_error, ner_error,
+                                          other_error, final=True)
+        return self.dump_simulation_logs(summary,
+                                         database,
+                                         total_episodes,
+                                         total_turns,
+                                         success,
+                                         intent_error,
+                                         ner_error,
+                                         other_error)
+
     def simulate_conversation(self, database=None):
+        """
+        Simulate the intent and mode selected by self.config["simulation"]. Simulations of many intents should be
+        run together by one SimulationScheduler instead.
+        """
+        scheduler = SimulationScheduler(self.config)
+        scheduler.add_client(self, database)
+        job = scheduler.run()[0]
+        if job.error is not None:
+            raise job.error
+        return job.result
+
+    async def _simulate_episode(self, user_simulator, simulation_intent, episode_index, simulation_config):
+        raise NotImplementedError
+
+    def api_client_key(self):
+        """ Clients with the same key call the same bot and share one API client """
+        raise NotImplementedError
+
+    async def create_api_client(self):
+        raise NotImplementedError
+
+    def set_api_client(self, api_client):
         raise NotImplementedError
 
-    def perform_batch_simulation(self, simulation_goals, simulation_intent, start_episode, simulation_config):
+    async def close_api_client(self, api_client):
         raise NotImplementedError
@@ -0,0 +1,255 @@
+#  Copyright (c) 2022, salesforce.com, inc.
+#   All rights reserved.
+#   SPDX-License-Identifier: BSD-3-Clause
+#   For full license text, see the LICENSE file in the repo root or https://opensource.org/licenses/BSD-3-Clause
+
+import bisect, json, os, threading, time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from botsim.botsim_utils.utils import dump_s3_file
+
+# upper bounds (in seconds) of the latency histogram buckets, the last bucket is +Inf
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+# span names of the simulation phases, "bot_response" is the latency from a user message to the first bot reply
+SPANS = ("session", "chasitor_init", "poll", "chat_message", "chat_end", "detect_intent", "nlu", "nlg",
+         "bot_response", "episode")
+COUNTERS = ("episodes", "discarded_episodes", "session_failures", "retries", "api_errors")
+
+
+class LatencyHistogram:
+    """
+    Latency histogram with per-bucket counts over LATENCY_BUCKETS. Histograms of different runs or intents can be
+    merged and their quantiles are estimated by linear interpolation within the buckets as Prometheus does.
+    """
+
+    def __init__(self, counts=None, total=0.0, maximum=0.0):
+        self.counts = list(counts) if counts else [0] * (len(LATENCY_BUCKETS) + 1)
+        self.total = total
+        self.maximum = maximum
+
+    @property
+    def count(self):
+        return sum(self.counts)
+
+    def observe(self, seconds):
+        self.counts[bisect.bisect_left(LATENCY_BUCKETS, seconds)] += 1
+        self.total += seconds
+        self.maximum = max(self.maximum, seconds)
+
+    def merge(self, other):
+        self.counts = [count + other_count for count, other_count in zip(self.counts, other.counts)]
+        self.total += other.total
+        self.maximum = max(self.maximum, other.maximum)
+
+    def quantile(self, q):
+        count = self.count
+        if count == 0:
+            return None
+        rank = q * count
+        cumulative = 0
+        for index, bucket_count in enumerate(self.counts):
+            if cumulative + bucket_count >= rank and bucket_count > 0:
+                lower = LATENCY_BUCKETS[index - 1] if index > 0 else 0.0
+                upper = LATENCY_BUCKETS[index] if index < len(LATENCY_BUCKETS) else self.maximum
+                return min(self.maximum, lower + (upper - lower) * (rank - cumulative) / bucket_count)
+            cumulative += bucket_count
+        return self.maximum
+
+    def to_dict(self):
+        count = self.count
+        return {"count": count,
+                "sum": round(self.total, 6),
+                "mean": round(self.total / count, 6) if count else None,
+                "p50": self.quantile(0.5),
+                "p90": self.quantile(0.9),
+                "p99": self.quantile(0.99),
+                "max": round(self.maximum, 6),
+                "buckets": self.counts}
+
+    @classmethod
+    def from_dict(cls, histogram):
+        return cls(histogram["buckets"], histogram["sum"], histogram["max"])
+
+
+class SimulationMetrics:
+    """
+    Timing spans and counters of the simulation of one intent and mode, see SPANS and COUNTERS.
+    The metrics are updated by the episodes running in the event loop and read by the Prometheus endpoint
+    (MetricsServer) from its own thread.
+    """
+
+    def __init__(self, intent="", mode=""):
+        self.intent = intent
+        self.mode = mode
+        self.latencies = {}
+        self.counters = dict.fromkeys(COUNTERS, 0)
+        self.lock = threading.Lock()
+
+    @contextmanager
+    def span(self, name):
+        """
+        Time a block of code, including the time the episode is suspended by other episodes
+        :param name: span name, one of SPANS
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start)
+
+    def observe(self, name, seconds):
+        with self.lock:
+            if name not in self.latencies:
+                self.latencies[name] = LatencyHistogram()
+            self.latencies[name].observe(seconds)
+
+    def increment(self, counter, value=1):
+        with self.lock:
+            self.counters[counter] = self.counters.get(counter, 0) + value
+
+    def to_dict(self):
+        with self.lock:
+            return {"intent": self.intent,
+                    "mode": self.mode,
+                    "counters": dict(self.counters),
+                    "latencies": {name: histogram.to_dict() for name, histogram in self.latencies.items()}}
+
+    def save(self, metrics_file):
+        """ Save the metrics next to the episode log, i.e., to S3 if STORAGE is S3 and to a local file otherwise """
+        if os.environ.get("STORAGE") == "S3":
+            dump_s3_file(metrics_file, bytes(json.dumps(self.to_dict(), indent=2).encode("UTF-8")))
+            return
+        os.makedirs(os.path.dirname(metrics_file) or ".", exist_ok=True)
+        with open(metrics_file, "w") as metrics_json:
+            json.dump(self.to_dict(), metrics_json, indent=2)
+
+
+def metrics_path(episode_log_file):
+    """
+    Path to the metrics file of a simulation run, e.g., .../episodes_<setting>.jsonl ==> .../metrics_<setting>.json
+    """
+    log_dir, log_name = os.path.split(episode_log_file)
+    if log_name.startswith("episodes_"):
+        log_name = log_name[len("episodes_"):]
+    return os.path.join(log_dir, "metrics_" + os.path.splitext(log_name)[0] + ".json")
+
+
+def merge_latencies(metrics_list, name):
+    """
+    Merge a latency histogram across the metrics of many simulations (e.g., all intents of a test)
+    :param metrics_list: list of metrics dicts as returned by SimulationMetrics.to_dict
+    :param name: span name
+    :return: the merged histogram summary, None if the span has not been observed
+    """
+    merged = None
+    for metrics in metrics_list:
+        if name not in metrics.get("latencies", {}):
+            continue
+        histogram = LatencyHistogram.from_dict(metrics["latencies"][name])
+        if merged is None:
+            merged = histogram
+        else:
+            merged.merge(histogram)
+    return merged.to_dict() if merged else None
+
+
+def _escape_label(value):
+    return str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+
+def _format_labels(labels):
+    return "{" + ",".join("{}=\"{}\"".format(key, _escape_label(value)) for key, value in labels) + "}"
+
+
+def render_prometheus(metrics_list):
+    """
+    Render metrics in the Prometheus text exposition format
+    :param metrics_list: list of SimulationMetrics or metrics dicts
+    """
+    metrics_list = [metrics.to_dict() if isinstance(metrics, SimulationMetrics) else metrics
+                    for metrics in metrics_list]
+    lines = ["# HELP botsim_latency_seconds Duration of the simulation spans and bot response latency",
+             "# TYPE botsim_latency_seconds histogram"]
+    for metrics in metrics_list:
+        for name, histogram in sorted(metrics["latencies"].items()):
+            labels = [("intent", metrics["intent"]), ("mode", metrics["mode"]), ("span", name)]
+            cumulative = 0
+            for upper_bound, count in zip(LATENCY_BUCKETS + ("+Inf",), histogram["buckets"]):
+                cumulative += count
+                lines.append("botsim_latency_seconds_bucket{} {}".format(
+                    _format_labels(labels + [("le", upper_bound)]), cumulative))
+            lines.append("botsim_latency_seconds_sum{} {}".format(_format_labels(labels), histogram["sum"]))
+            lines.append("botsim_latency_seconds_count{} {}".format(_format_labels(labels), histogram["count"]))
+    counters = sorted(set(counter for metrics in metrics_list for counter in metrics["counters"]))
+    for counter in counters:
+        lines.append("# TYPE botsim_{}_total counter".format(counter))
+        for metrics in metrics_list:
+            labels = [("intent", metrics["intent"]), ("mode", metrics["mode"])]
+            lines.append("botsim_{}_total{} {}".format(counter, _format_labels(labels),
+                                                       metrics["counters"].get(counter, 0)))
+    return "\n".join(lines) + "\n"
+
+
+class MetricsServer:
+    """
+    Prometheus text endpoint (GET /metrics) serving the metrics of running simulations from a background thread
+    """
+
+    def __init__(self, get_metrics, host="127.0.0.1", port=9464):
+        """
+        :param get_metrics: function returning the list of SimulationMetrics to serve
+        :param host: host to bind, the loopback interface by default. The endpoint is not authenticated, bind a wider
+            interface (e.g., "0.0.0.0") only where the port is not reachable from untrusted networks
+        :param port: port to bind, 0 for a free port
+        """
+        self.get_metrics = get_metrics
+        self.httpd = ThreadingHTTPServer((host, port), self._handler_class())
+        self.httpd.daemon_threads = True
+        self.thread = None
+
+    @classmethod
+    def from_config(cls, simulation_config, get_metrics):
+        """
+        Create the server if simulator["metrics"]["port"] is configured, bound to simulator["metrics"]["host"]
+        (127.0.0.1 by default)
+        :param simulation_config: the simulation configuration
+        :param get_metrics: function returning the list of SimulationMetrics to serve
+        """
+        metrics_config = simulation_config["simulator"].get("metrics", {})
+        if metrics_config.get("port") is None:
+            return None
+        return cls(get_metrics, metrics_config.get("host", "127.0.0.1"), metrics_config["port"])
+
+    def start(self):
+        """ Serve in a background thread """
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def _handler_class(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+
+            def log_message(self, format, *args):
+                pass
+
+            def do_GET(self):
+                if self.path.split("?")[0] != "/metrics":
+                    self.send_response(404)
+                    self.end_headers()
+                    return
+                payload = render_prometheus(server.get_metrics()).encode("UTF-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4")
+                self.send_header("Content-Length", str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+        return Handler
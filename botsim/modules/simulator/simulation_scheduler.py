@@ -0,0 +1,179 @@
+#  Copyright (c) 2022, salesforce.com, inc.
+#   All rights reserved.
+#   SPDX-License-Identifier: BSD-3-Clause
+#   For full license text, see the LICENSE file in the repo root or https://opensource.org/licenses/BSD-3-Clause
+
+import asyncio, itertools
+
+from botsim.modules.simulator.user_simulator import UserSimulator
+from botsim.modules.simulator.simulation_metrics import MetricsServer
+
+
+class SimulationJob:
+    """
+    Simulation of one (intent, mode) by a simulation client, i.e., a LiveAgentClient or a DialogFlowCXClient whose
+    config["simulation"] selects the intent and mode
+    """
+
+    def __init__(self, client, database=None):
+        self.client = client
+        self.database = database
+        self.episode_indices = []
+        # success, ner_error, intent_error, other_error, total_turns, total_episodes
+        self.counters = [0] * 6
+        self.num_pending = 0
+        self.num_finished = 0
+        self.idle_simulators = []
+        self.result = None
+        self.error = None
+
+    @property
+    def name(self):
+        # the intent names of eval simulations end with "_eval"
+        return self.client.intent_name
+
+    def start(self):
+        self.episode_indices, counters = self.client.start_simulation()
+        self.counters = list(counters)
+        self.num_pending = len(self.episode_indices)
+
+    def get_simulator(self):
+        if self.idle_simulators:
+            return self.idle_simulators.pop()
+        return UserSimulator(self.client.simulation_goals, self.client.config)
+
+    def add_episode_result(self, episode_result):
+        """
+        :param episode_result: (success, ner_error, intent_error, other_error, num_turns, num_processed) of an
+                               episode returned by the client's _simulate_episode
+        """
+        self.counters = [count + episode_count for count, episode_count in zip(self.counters, episode_result)]
+        self.num_pending -= 1
+        self.num_finished += 1
+        success, ner_error, intent_error, other_error, total_turns, total_episodes = self.counters
+        if self.num_finished % self.client.batch_size == 0:
+            self.client.episode_log.checkpoint()
+            self.client.save_metrics()
+            if self.database:
+                self.database.save_result_to_database(self.client.config["id"], self.client.intent_name,
+                                                      self.client.mode, total_episodes, success, intent_error,
+                                                      ner_error, other_error, total_turns,
+                                                      self.client.metrics.to_dict())
+        if episode_result[5] > 0 and total_episodes % 50 == 0:
+            header = "\n\n========= Simulation up to Episode " + str(total_episodes) + ": ==========\n"
+            self.client.simulation_summary(header, total_episodes, total_turns, success, intent_error, ner_error,
+                                           other_error)
+
+    def finish(self):
+        if self.error is not None:
+            # no final summary, so that the episode log can be resumed
+            self.client.close_episode_log()
+            self.client.save_metrics()
+            return
+        success, ner_error, intent_error, other_error, total_turns, total_episodes = self.counters
+        try:
+            self.result = self.client.finish_simulation(self.database, success, ner_error, intent_error,
+                                                        other_error, total_turns, total_episodes)
+        except ConnectionRefusedError as error:
+            self.error = error
+
+
+class SimulationScheduler:
+    """
+    Run the simulations of many (intent, mode) jobs in one event loop. The episodes of all jobs are queued as
+    (job, episode) work items, interleaved across the jobs, and served by a fixed number of workers. Hence
+    1) the number of concurrent sessions against the bot is capped globally by
+       simulator["run_time"]["num_concurrent_sessions"],
+    2) the API requests of all sessions share the requests/second budget of simulator["rate_limit"],
+    3) jobs with many goals keep all workers busy after the smaller jobs have finished.
+    Jobs calling the same bot share one API client (and its connection pool).
+    If simulator["metrics"]["port"] is set, the metrics of all jobs are served in the Prometheus text format at
+    /metrics during the run.
+    """
+
+    def __init__(self, simulation_config):
+        """
+        :param simulation_config: the simulation configuration
+        """
+        self.max_concurrent_sessions = max(
+            1, simulation_config["simulator"]["run_time"].get("num_concurrent_sessions", 5))
+        self.jobs = []
+        self.metrics_server = MetricsServer.from_config(
+            simulation_config, lambda: [job.client.metrics for job in list(self.jobs)])
+
+    def add_client(self, client, database=None):
+        """
+        Queue the simulation of a client
+        :param client: a simulation client (UserSimulatorClientInterface) configured for one intent and mode
+        :param database: optional database to save the simulation results to
+        """
+        self.jobs.append(SimulationJob(client, database))
+
+    def run(self):
+        """
+        Run all queued simulations
+        :return: the list of finished SimulationJob with either the result (summary json) or the error of each job
+        """
+        event_loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(event_loop)
+        if self.metrics_server:
+            self.metrics_server.start()
+        try:
+            event_loop.run_until_complete(self._run())
+        finally:
+            event_loop.close()
+            if self.metrics_server:
+                self.metrics_server.stop()
+        return self.jobs
+
+    async def _run(self):
+        for job in self.jobs:
+            try:
+                job.start()
+            except Exception as error:
+                print("simulation of {} failed: {}".format(job.name, error))
+                job.error = error
+        work_items = asyncio.Queue()
+        # round robin over the jobs so that all intents make progress at the same time
+        for work_item in itertools.zip_longest(*[[(job, episode_index) for episode_index in job.episode_indices]
+                                                 for job in self.jobs]):
+            for job_episode in work_item:
+                if job_episode:
+                    work_items.put_nowait(job_episode)
+        for job in self.jobs:
+            if job.num_pending == 0:
+                job.finish()
+
+        api_clients = {}
+        try:
+            for job in self.jobs:
+                key = job.client.api_client_key()
+                if key not in api_clients:
+                    api_clients[key] = (job.client, await job.client.create_api_client())
+                job.client.set_api_client(api_clients[key][1])
+            num_workers = min(self.max_concurrent_sessions, work_items.qsize())
+            await asyncio.gather(*[self._worker(work_items) for _ in range(num_workers)])
+        finally:
+            for client, api_client in api_clients.values():
+                await client.close_api_client(api_client)
+
+    @staticmethod
+    async def _worker(work_items):
+        while not work_items.empty():
+            job, episode_index = work_items.get_nowait()
+            if job.error is not None:  # the job has failed, skip its remaining episodes
+                job.num_pending -= 1
+            else:
+                user_simulator = job.get_simulator()
+                try:
+                    episode_result = await job.client.simulate_episode(user_simulator, episode_index)
+                except Exception as error:
+                    print("simulation of {} failed: {}".format(job.name, error))
+                    job.error = error
+                    job.num_pending -= 1
+                else:
+                    job.add_episode_result(episode_result)
+                finally:
+                    job.idle_simulators.append(user_simulator)
+            if job.num_pending == 0:
+                job.finish()
@@ -3,11 +3,12 @@
 #   SPDX-License-Identifier: BSD-3-Clause
 #   For full license text, see the LICENSE file in the repo root or https://opensource.org/licenses/BSD-3-Clause
 
-import random, copy
+import random
 
 from botsim.conf.ABUS import INTENT_ERROR, NER_ERROR, OTHER_ERROR
 from botsim.botsim_utils.utils import cut_string, seed_everything
-from botsim.modules.simulator.abus import UserSimulatorInterface
+from botsim.modules.simulator.abus import UserSimulatorInterface, DialogActionFrame
+from botsim.modules.simulator.episode_log import episode_result
 
 seed_everything(42)
 
@@ -71,7 +72,7 @@ class UserSimulator(UserSimulatorInterface):
             5. "message" is the current agent message
         bot_action is obtained from the dialog act map NLU which maps from bot messages to dialog acts via fuzzy matching.
         :return:
-            botsim_state for keeping track of the dialog states
+            botsim_state, an immutable DialogActionFrame for keeping track of the dialog states
             nl_message: natural language response
             semantic_message: response augmented with slot names for keeping track of entities
         """
@@ -94,9 +95,9 @@ class UserSimulator(UserSimulatorInterface):
         else:
             raise Exception("No rule defined for bot action type " + bot_action["action"] + " yet")
         self._dialog_state_sanity_check()
-        botsim_state = {"action": self.state["action"],
-                        "request_slots": copy.deepcopy(self.state["request_slots"]),
-                        "inform_slots": copy.deepcopy(self.state["inform_slots"])}
+        botsim_state = DialogActionFrame(self.state["action"],
+                                         self.state["inform_slots"],
+                                         self.state["request_slots"])
         nl_message, semantic_message = self.generate_user_response(botsim_state)
         return botsim_state, nl_message, semantic_message
 
@@ -143,6 +144,7 @@ class UserSimulator(UserSimulatorInterface):
         status = error_info["status"]
         error_type = error_info["error"]
         error = ""
+        chat_log_json[episode_index]["result"] = episode_result(error_info)
         if status == 0:
             summary = "=" * 10 + " Episode {}\t {} \tNum_of_turns"":{}".format(episode_index + 1,
                                                                                "SUCCESS " + "=" * 10,
@@ -198,7 +200,8 @@ class UserSimulator(UserSimulatorInterface):
             7. error_turn: the natural language response of the turn with errors
             8. error_turn_slots: same as error_turn but with additional slot information
         :param episode_index: the current episode index
-        :param chat_log_json: output chat log file
+        :param chat_log_json: output chat logs, the typed result of the episode is stored as
+                              chat_log_json[episode_index]["result"] for the episode log
         :param user_error_turns_json: output dialog error turns
         :return: binary indicator of (success, intent_error, NER_error, other_error)
                  and total number of dialog turns so far
@@ -469,6 +472,15 @@ class UserSimulator(UserSimulatorInterface):
 
         return None
 
+    def expects_user_response(self, bot_message):
+        """
+        Whether the bot message asks the user for a response, i.e., it matches a request dialog act and the bot is
+        expected to wait for the user. Used to end the polling of bot messages early.
+        :param bot_message: the last bot message received
+        """
+        best_matching_dialog_act, _, _, _ = self.nlu_model.predict(bot_message, self.goal["name"])
+        return best_matching_dialog_act.find("request_") != -1
+
     def enqueue_bot_actions_from_bot_messages(self,
                                               bot_name,
                                               bot_api_response,
@@ -507,9 +519,9 @@ class UserSimulator(UserSimulatorInterface):
                 self.nlu_model.predict(bot_message, self.goal["name"])
             if bot_action["round"] == self.intent_check_turn_index:
                 # check for intent errors on the intent_check_turn
-                for intent_index, task in enumerate(self.nlu_model.intent_templates):
-                    if task["intent"] == self.goal["name"]: continue
-                    _, _, match_score, _ = self.nlu_model.predict(bot_message, task["intent"])
+                intent_scores = self.nlu_model.score_intents(bot_message)
+                for intent, match_score in intent_scores.items():
+                    if intent == self.goal["name"]: continue
                     if match_score > best_matching_score:
                         self.state["request_slots"]["fall_back"] = "UNK"
                         self.state["intent_error"] = \
@@ -19,7 +19,10 @@ class Generator(GeneratorBase):
                  parser_config={},
                  num_t5_paraphrases=0,
                  num_pegasus_paraphrases=0,
-                 num_goals_per_intent=500):
-        super().__init__(parser_config, num_t5_paraphrases, num_pegasus_paraphrases, num_goals_per_intent)
+                 num_goals_per_intent=500,
+                 paraphrase_device=None,
+                 paraphrase_backend=None):
+        super().__init__(parser_config, num_t5_paraphrases, num_pegasus_paraphrases, num_goals_per_intent,
+                         paraphrase_device, paraphrase_backend)
         self.parser = EinsteinBotMetaDataParser(parser_config)
         self.parser_config = parser_config
@@ -0,0 +1,305 @@
+#  Copyright (c) 2022, salesforce.com, inc.
+#   All rights reserved.
+#   SPDX-License-Identifier: BSD-3-Clause
+#   For full license text, see the LICENSE file in the repo root or https://opensource.org/licenses/BSD-3-Clause
+
+import glob, json, os, random, threading, time, uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+from rapidfuzz import process
+
+
+class MockBot:
+    """
+    Offline stand-in for an Einstein bot replaying the dialog act maps produced by the parser.
+    The parser has already aggregated the dialog acts of all dialogs on the conversation graph paths from each
+    dialog to the ending dialog, so the revised dialog act map of a dialog is replayed as:
+      1. a "request_intent" (welcome) message when the chat starts
+      2. "intent_success_message" followed by the "request_*" questions of the recognised dialog, one per turn.
+         If an ontology is given, only the slots listed for the dialog are requested
+      3. "dialog_success_message" after the last question, or "intent_failure_message" for unrecognised intents
+    User intent queries are recognised by fuzzy matching against the intent queries of the simulation goals.
+    """
+
+    def __init__(self, dialog_act_maps, intent_queries, ontology=None, bot_name="MockBot",
+                 intent_error_rate=0.0, seed=42):
+        """
+        :param dialog_act_maps: revised dialog act maps (dialog name -> dialog act -> messages)
+        :param intent_queries: intent query -> dialog name, used as the intent model of the bot
+        :param ontology: optional ontology (dialog name -> slot -> values)
+        :param bot_name: name of the bot sending the messages
+        :param intent_error_rate: probability of routing an intent query to a wrong dialog
+        :param seed: random seed of the bot
+        """
+        self.dialog_act_maps = dialog_act_maps
+        self.intent_queries = intent_queries
+        self.queries = list(intent_queries.keys())
+        self.bot_name = bot_name
+        self.intent_error_rate = intent_error_rate
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.dialog_requests = {}
+        for dialog, dialog_acts in dialog_act_maps.items():
+            slots = ontology.get(dialog) if ontology else None
+            self.dialog_requests[dialog] = [
+                dialog_act for dialog_act in dialog_acts
+                if dialog_act.startswith("request_") and dialog_act != "request_intent" and dialog_acts[dialog_act]
+                and (slots is None or dialog_act[len("request_"):] in slots
+                     or dialog_act[len("request_"):].split("@")[0] in slots)]
+            # the dialog act maps do not keep the order of the questions, but "Goodbye" ends the conversation
+            self.dialog_requests[dialog].sort(key=lambda dialog_act: dialog_act.startswith("request_Goodbye"))
+        # the welcome messages are sent before the intent is known, so only those shared by all dialogs are used
+        welcome_messages = [set(message.strip() for message in dialog_acts.get("request_intent", []))
+                            for dialog_acts in dialog_act_maps.values()]
+        self.welcome_messages = sorted(set.intersection(*welcome_messages) or set.union(*welcome_messages)) \
+            if welcome_messages else []
+
+    @classmethod
+    def from_files(cls, dialog_act_map_path, goals_dir, ontology_path=None, **kwargs):
+        """
+        Create the bot from the generator outputs
+        :param dialog_act_map_path: path to dialog_act_map.revised.json
+        :param goals_dir: directory of the simulation goals (*.goal.json) whose intent queries are recognised
+        :param ontology_path: optional path to ontology.revised.json
+        """
+        with open(dialog_act_map_path, "r") as dialog_act_map_file:
+            dialog_act_maps = json.load(dialog_act_map_file)["DIALOGS"]
+        intent_queries = {}
+        for goal_file in sorted(glob.glob(os.path.join(goals_dir, "*.goal.json"))):
+            with open(goal_file, "r") as goal_json:
+                for goal in json.load(goal_json)["Goal"].values():
+                    intent_queries[goal["inform_slots"]["intent"]] = goal["name"]
+        ontology = None
+        if ontology_path:
+            with open(ontology_path, "r") as ontology_file:
+                ontology = json.load(ontology_file)
+        return cls(dialog_act_maps, intent_queries, ontology, **kwargs)
+
+    def _choose(self, messages):
+        with self.lock:
+            return self.random.choice(messages)
+
+    def _message(self, dialog, dialog_act):
+        messages = self.dialog_act_maps[dialog].get(dialog_act)
+        return [self._choose(messages)] if messages else []
+
+    def recognise_intent(self, user_message):
+        if user_message in self.intent_queries:
+            dialog = self.intent_queries[user_message]
+        elif self.queries:
+            dialog = self.intent_queries[process.extractOne(user_message, self.queries)[0]]
+        else:
+            return None
+        with self.lock:
+            if self.random.random() < self.intent_error_rate:
+                dialog = self.random.choice(list(self.dialog_act_maps.keys()))
+        return dialog if dialog in self.dialog_act_maps else None
+
+    def welcome(self, session):
+        return [self._choose(self.welcome_messages)] if self.welcome_messages else []
+
+    def respond(self, session, user_message):
+        """
+        Bot messages replying to the user message given the session state
+        :param session: MockSession of the chat
+        :param user_message: user message
+        """
+        if session.dialog is None:
+            dialog = self.recognise_intent(user_message)
+            if dialog is None:
+                any_dialog = self._choose(list(self.dialog_act_maps.keys()))
+                return self._message(any_dialog, "intent_failure_message")
+            session.dialog = dialog
+            session.pending_requests = list(self.dialog_requests[dialog])
+            messages = self._message(dialog, "intent_success_message")
+        else:
+            messages = []
+        if session.pending_requests:
+            return messages + self._message(session.dialog, session.pending_requests.pop(0))
+        return messages + self._message(session.dialog, "dialog_success_message")
+
+
+class MockSession:
+    def __init__(self):
+        self.key = str(uuid.uuid4())
+        self.affinity_token = uuid.uuid4().hex[:8]
+        self.dialog = None
+        self.pending_requests = []
+        # (time from which the message can be polled, message)
+        self.messages = []
+        self.sequence = 0
+        # last message batch returned by a poll and not yet acknowledged by a later poll
+        self.unacknowledged = None
+        self.poll_id = 0
+        self.condition = threading.Condition()
+
+
+class MockLiveAgentServer:
+    """
+    Local HTTP server speaking the subset of the LiveAgent REST API used by LiveAgentClient
+    (SessionId, ChasitorInit, Messages, ChatMessage and ChatEnd) backed by a MockBot.
+    Message polls are held until a bot message is due or client_poll_timeout elapses, as LiveAgent long polls do.
+    Bot response latency and API errors can be injected to benchmark simulation throughput and retries.
+    """
+
+    def __init__(self, bot, host="127.0.0.1", port=0, client_poll_timeout=10,
+                 response_latency=0.5, latency_jitter=0.2, error_rate=0.0, seed=42):
+        """
+        :param bot: MockBot replying to the user messages
+        :param host: host to bind
+        :param port: port to bind, 0 for a free port
+        :param client_poll_timeout: "clientPollTimeout" (in seconds) returned to the clients
+        :param response_latency: mean delay (in seconds) before a bot reply can be polled
+        :param latency_jitter: maximum random deviation (in seconds) from response_latency
+        :param error_rate: probability of failing an API request with HTTP 503
+        :param seed: random seed for latency and error injection
+        """
+        self.bot = bot
+        self.client_poll_timeout = client_poll_timeout
+        self.response_latency = response_latency
+        self.latency_jitter = latency_jitter
+        self.error_rate = error_rate
+        self.random = random.Random(seed)
+        self.random_lock = threading.Lock()
+        self.sessions = {}
+        self.stats = {"requests": 0, "injected_errors": 0, "sessions": 0}
+        self.httpd = ThreadingHTTPServer((host, port), self._handler_class())
+        self.httpd.daemon_threads = True
+        self.thread = None
+
+    @property
+    def end_point(self):
+        host, port = self.httpd.server_address[:2]
+        return "http://{}:{}/chat".format(host, port)
+
+    def start(self):
+        """ Serve in a background thread """
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def serve_forever(self):
+        self.httpd.serve_forever()
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def _inject_error(self):
+        with self.random_lock:
+            self.stats["requests"] += 1
+            if self.random.random() < self.error_rate:
+                self.stats["injected_errors"] += 1
+                return True
+        return False
+
+    def _enqueue_bot_messages(self, session, messages):
+        with self.random_lock:
+            due = time.time() + max(0.0, self.response_latency +
+                                    self.random.uniform(-self.latency_jitter, self.latency_jitter))
+        with session.condition:
+            for message in messages:
+                session.messages.append((due, {"type": "ChatMessage",
+                                               "message": {"text": message, "name": self.bot.bot_name}}))
+            session.condition.notify_all()
+
+    def _poll_messages(self, session, ack):
+        """
+        Long poll of the bot messages of a session. As in LiveAgent, a batch of messages is re-sent until a later
+        poll acknowledges its sequence number, so messages written to a client that has already timed out are not
+        lost. A new poll of the session supersedes the pending one.
+        :param session: MockSession of the chat
+        :param ack: sequence number of the last batch received by the client
+        :return: the message batch or None if no message is due before client_poll_timeout
+        """
+        deadline = time.time() + self.client_poll_timeout
+        with session.condition:
+            session.poll_id += 1
+            poll_id = session.poll_id
+            session.condition.notify_all()
+            if session.unacknowledged and session.unacknowledged["sequence"] <= ack:
+                session.unacknowledged = None
+            while True:
+                if session.unacknowledged:
+                    return session.unacknowledged
+                now = time.time()
+                due_messages = [message for due, message in session.messages if due <= now]
+                if due_messages:
+                    session.messages = [(due, message) for due, message in session.messages if due > now]
+                    session.sequence += 1
+                    session.unacknowledged = {"messages": due_messages, "sequence": session.sequence, "offset": 0}
+                    return session.unacknowledged
+                if now >= deadline or poll_id != session.poll_id:
+                    return None
+                next_due = min([due for due, _ in session.messages] + [deadline])
+                session.condition.wait(timeout=max(0.0, next_due - now))
+
+    def _handler_class(self):
+        server = self
+
+        class MockLiveAgentHandler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, format, *args):
+                pass
+
+            def _send(self, status, body=None):
+                payload = b"" if body is None else json.dumps(body).encode("UTF-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(payload)))
+                self.end_headers()
+                try:
+                    self.wfile.write(payload)
+                except (BrokenPipeError, ConnectionResetError):
+                    # the client has given up the request, e.g., a message poll timed out
+                    pass
+
+            def _session(self):
+                return server.sessions.get(self.headers.get("X-LIVEAGENT-SESSION-KEY"))
+
+            def _read_json(self):
+                length = int(self.headers.get("Content-Length", 0))
+                return json.loads(self.rfile.read(length) or b"{}")
+
+            def do_GET(self):
+                path = urlparse(self.path).path
+                if server._inject_error():
+                    return self._send(503)
+                if path.endswith("/rest/System/SessionId"):
+                    session = MockSession()
+                    server.sessions[session.key] = session
+                    server.stats["sessions"] += 1
+                    return self._send(200, {"id": str(uuid.uuid4()), "key": session.key,
+                                            "affinityToken": session.affinity_token,
+                                            "clientPollTimeout": server.client_poll_timeout})
+                if path.endswith("/rest/System/Messages"):
+                    session = self._session()
+                    if session is None:
+                        return self._send(403)
+                    query = parse_qs(urlparse(self.path).query)
+                    response = server._poll_messages(session, int(query.get("ack", ["-1"])[0]))
+                    return self._send(204) if response is None else self._send(200, response)
+                return self._send(404)
+
+            def do_POST(self):
+                path = urlparse(self.path).path
+                data = self._read_json()
+                if server._inject_error():
+                    return self._send(503)
+                session = self._session()
+                if session is None:
+                    return self._send(403)
+                if path.endswith("/rest/Chasitor/ChasitorInit"):
+                    server._enqueue_bot_messages(session, server.bot.welcome(session))
+                    return self._send(200, "OK")
+                if path.endswith("/rest/Chasitor/ChatMessage"):
+                    server._enqueue_bot_messages(session, server.bot.respond(session, data.get("text", "")))
+                    return self._send(200, "OK")
+                if path.endswith("/rest/Chasitor/ChatEnd"):
+                    server.sessions.pop(session.key, None)
+                    return self._send(200, "OK")
+                return self._send(404)
+
+        return MockLiveAgentHandler
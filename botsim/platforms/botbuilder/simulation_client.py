@@ -3,11 +3,14 @@
 #   SPDX-License-Identifier: BSD-3-Clause
 #   For full license text, see the LICENSE file in the repo root or https://opensource.org/licenses/BSD-3-Clause
 
-import json, time, asyncio, requests, httpx
+import json, time, requests, httpx
 
-from botsim.modules.simulator.user_simulator import UserSimulator
+from botsim.modules.simulator.abus import DialogTurn
 from botsim.botsim_utils.utils import cut_string, seed_everything
 from botsim.modules.simulator.simulation_client_base import UserSimulatorClientInterface
+from botsim.modules.simulator.retry_policy import AsyncRetryPolicy
+from botsim.modules.simulator.rate_limiter import AsyncRateLimiter
+from botsim.modules.simulator.polling_policy import AdaptivePollingPolicy
 
 seed_everything(42)
 
@@ -15,6 +18,12 @@ seed_everything(42)
 requests.packages.urllib3.disable_warnings(
     requests.packages.urllib3.exceptions.InsecureRequestWarning)
 
+# a ChatMessage is not idempotent, once the request has been sent (e.g., a read timeout or a 504) the bot may already
+# have processed the user turn and a retry would send it twice, so only failures to connect and the status codes
+# returned before the message is processed (too many requests, service unavailable) are retried
+CHAT_MESSAGE_RETRY_EXCEPTIONS = (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout)
+CHAT_MESSAGE_RETRY_STATUS_CODES = (429, 503)
+
 headers_raw = {
     "X-LIVEAGENT-AFFINITY": "",
     "X-LIVEAGENT-API-VERSION": "50"
@@ -24,6 +33,27 @@ headers_raw = {
 class LiveAgentClient(UserSimulatorClientInterface):
     def __init__(self, config):
         super().__init__(config)
+        # the requests/second budget applies per bot end point, across all clients of the process
+        self.retry_policy = AsyncRetryPolicy.from_config(
+            config, AsyncRateLimiter.from_config(config, config["api"]["end_point"]), self.metrics)
+        # poll deadlines adapted to the bot response latency of the dialog simulated by this client
+        self.polling_policy = AdaptivePollingPolicy.from_config(config)
+        self.http_client = None
+
+    def _create_http_client(self):
+        """ Create the pooled HTTP client shared by all sessions of a simulation run. The pool size,
+        keep-alive and timeouts are read from the optional "http_client" section of the simulator config.
+        """
+        client_config = self.config["simulator"].get("http_client", {})
+        limits = httpx.Limits(max_connections=client_config.get("max_connections", 50),
+                              max_keepalive_connections=client_config.get("max_keepalive_connections", 20),
+                              keepalive_expiry=client_config.get("keepalive_expiry", 30.0))
+        timeout = httpx.Timeout(client_config.get("timeout", 10.0),
+                                connect=client_config.get("connect_timeout", 10.0))
+        return httpx.AsyncClient(verify=False,
+                                 http2=client_config.get("http2", True),
+                                 limits=limits,
+                                 timeout=timeout)
 
     def _process_bot_response_messages(self, api_response, processed_count, chat_messages, rich_messages):
         chat_response_json = json.loads(api_response.text)
@@ -45,375 +75,302 @@ class LiveAgentClient(UserSimulatorClientInterface):
                     rich_messages.append(text)
         return processed_count, bot_name, bot_message_sequence
 
-    async def perform_batch_simulation(self,
-                                       simulation_goals,
-                                       simulation_intent,
-                                       start_episode,
-                                       simulation_config):
-        """ Async python client for calling LiveAgent API to perform dialog simulation starting from a given
-        episode in a batch of 25 sessions as we need to reset the event loop for 25 sessions
-
-        :param simulation_goals: list of simulation goals
+    async def _poll_bot_turn(self, poll_messages, user_simulator, client_poll_timeout, sequence, processed_count,
+                             chat_messages, rich_messages):
+        """ Poll the bot messages of one bot turn into chat_messages and rich_messages. The poll deadlines are set
+        by self.polling_policy: the turn ends when no further message arrives before the deadline.
+
+        :param poll_messages: coroutine function polling the messages of the session with a timeout
+        :param user_simulator: the UserSimulator of the episode, used to check whether the bot awaits a response
+        :param client_poll_timeout: poll timeout (in seconds) of the LiveAgent session, 10% of its clientPollTimeout
+        :param sequence: sequence number of the last message batch received
+        :param processed_count: number of message batches received
+        :return: (whether the polls succeeded, processed_count, bot_name, sequence)
+        """
+        bot_name = ""
+        timeout = self.polling_policy.first_poll_timeout(client_poll_timeout)
+        last_message_time = time.monotonic()
+        first_reply = True
+        while True:
+            try:
+                api_response = await poll_messages(sequence, processed_count, timeout)
+            except httpx.RequestError:
+                # a poll timeout means the bot has finished its turn
+                return True, processed_count, bot_name, sequence
+            if api_response.status_code != 200:
+                return False, processed_count, bot_name, sequence
+            processed_count, batch_bot_name, sequence = self._process_bot_response_messages(api_response,
+                                                                                            processed_count,
+                                                                                            chat_messages,
+                                                                                            rich_messages)
+            if batch_bot_name == "":
+                continue
+            bot_name = batch_bot_name
+            now = time.monotonic()
+            if first_reply:
+                self.metrics.observe("bot_response", now - last_message_time)
+                first_reply = False
+            self.polling_policy.record_latency(now - last_message_time)
+            last_message_time = now
+            timeout = self.polling_policy.quiet_period(client_poll_timeout,
+                                                       user_simulator.expects_user_response(chat_messages[-1]))
+
+    async def _simulate_episode(self,
+                                user_simulator,
+                                simulation_intent,
+                                episode_index,
+                                simulation_config):
+        """ Simulate one dialog episode against the LiveAgent API. Failed API calls are retried by
+        self.retry_policy within a retry budget per session, user turns (ChatMessage) only if they cannot have
+        reached the bot, otherwise the episode is discarded. A session whose set-up fails is restarted
+        with a fresh session for at most three attempts.
+
+        :param user_simulator: the UserSimulator instance owned by this episode until it finishes
         :param simulation_intent: intent for simulation
-        :param start_episode: episode index to start
+        :param episode_index: index of the simulation goal to simulate
         :param simulation_config: the simulation setting configuration including
                                   the LiveAgent API end_pointers
+        :return: (success, ner_error, intent_error, other_error, num_turns, num_processed) of the episode,
+                 where num_processed is 0 if the episode has been discarded
         """
-
-        batch_success, batch_ner_error, batch_intent_error, batch_other_error = 0, 0, 0, 0
-        batch_turns, num_simulations = 0, 0
-
-        user_simulator = UserSimulator(simulation_goals, simulation_config)
-
+        episode_success, episode_ner_error, episode_intent_error, episode_other_error = 0, 0, 0, 0
+        episode_turns = 0
+        failed = 0
         end_point = simulation_config["api"]["end_point"]
-        while start_episode < len(simulation_goals) and num_simulations < self.batch_size:
-            failed = 0
+        while True:
+            if failed == 3:  # give up the episode if failed three times
+                self.metrics.increment("session_failures", failed)
+                return 0, 0, 0, 0, 0, 0
             discard_episode = False
-            print("Episode ", start_episode)
-            user_simulator.reset(start_episode)
-            self.dialog_logs[start_episode] = {"goal": user_simulator.goal, "chat_log": []}
+            print("Episode ", episode_index)
+            user_simulator.reset(episode_index)
+            self.dialog_logs[episode_index] = {"goal": user_simulator.goal, "chat_log": []}
             bot_action_frame = {"inform_slots": {}, "request_slots": {}, "round": 1,
                                 "action": "", "message": ""}
+            retry_budget = self.retry_policy.new_session_budget()
+            client = self.http_client
             # The following message loop between BotSIM and bot follows LiveAgent API document at
             # https://developer.salesforce.com/docs/atlas.en-us.live_agent_rest.meta/live_agent_rest/live_agent_rest_API_requests.htm
-            async with httpx.AsyncClient(verify=False) as client:
-                # Step 1: create a live agent session
-                retry = False  # retry for failed session connections
-                api_response = ""
-                try:
-                    api_response = await client.get(end_point + "/rest/System/SessionId", headers=headers_raw)
-                except httpx.RequestError as ex:
-                    time.sleep(30)
-                    retry = True
-                if retry:
-                    try:
-                        api_response = await client.get(end_point + "/rest/System/SessionId", headers=headers_raw)
-                    except httpx.RequestError:
-                        time.sleep(30)
-                        failed += 1
-                        if failed == 3:  # return error if failed three times
-                            return batch_success, \
-                                   batch_ner_error, batch_intent_error, batch_other_error, \
-                                   batch_turns, num_simulations
-                        continue
-                # Step 2: create a chat visitor session
-                session_response = json.loads(api_response.text)
-                client_poll_timeout = session_response["clientPollTimeout"] * 0.1
-                chasitor_data = {
-                    "agentId": None,
-                    "buttonId": simulation_config["api"]["button_Id"],
-                    "buttonOverrides": [],
-                    "deploymentId": simulation_config["api"]["deployment_Id"],
-                    "doFallback": True,
-                    "isPost": True,
-                    "language": "en-US",
-                    "organizationId": simulation_config["api"]["org_Id"],
-                    "prechatDetails": [],
-                    "prechatEntities": [],
-                    "receiveQueueUpdates": True,
-                    "screenResolution": "2560x1440",
-                    "sessionId": session_response["id"],
-                    "userAgent": "LiveAgent Python Client v1.0.0",
-                    "visitorName": "BotSIM"
-                }
-                retry = False
-                try:
-                    api_response = await client.post(end_point + "/rest/Chasitor/ChasitorInit",
-                                                     data=json.dumps(chasitor_data),
-                                                     headers={
-                                                         "X-LIVEAGENT-API-VERSION": "50",
-                                                         "X-LIVEAGENT-AFFINITY": session_response["affinityToken"],
-                                                         "X-LIVEAGENT-SESSION-KEY": session_response["key"]
-                                                     })
-                except httpx.RequestError:
-                    retry = True
-                    time.sleep(10)
-                if retry:
-                    try:
-                        api_response = await client.post(end_point + "/rest/Chasitor/ChasitorInit",
-                                                         data=json.dumps(chasitor_data),
-                                                         headers={
-                                                             "X-LIVEAGENT-API-VERSION": "50",
-                                                             "X-LIVEAGENT-AFFINITY": session_response["affinityToken"],
-                                                             "X-LIVEAGENT-SESSION-KEY": session_response["key"]
-                                                         })
-                        if api_response.status_code != 200:
-                            discard_episode = True
-                    except httpx.RequestError:
-                        print("ChasitorId retried", api_response, api_response.text)
-                        time.sleep(10)
-                        continue
-
-                # Step 3 begin conversation
-                bot_name = ""
-                # The bot API response can have two types of messages, namely ChatMessage messages and RichMessage
-                chat_messages = []
-                rich_messages = []
-                sequence = -1
-                processed_count = 0
-                session_finished = False
-                # polling the first agent message
-                while True:
-                    try:
-                        api_response = await client.get(end_point + "/rest/System/Messages",
-                                                        headers={
-                                                            "X-LIVEAGENT-API-VERSION": "50",
-                                                            "X-LIVEAGENT-AFFINITY": session_response["affinityToken"],
-                                                            "X-LIVEAGENT-SESSION-KEY": session_response["key"]
-                                                        },
-                                                        timeout=client_poll_timeout,
-                                                        params={"ack": sequence, "pc": processed_count})
-                    except httpx.RequestError:
-                        break
-                    if api_response.status_code != 200:
-                        break
-                    processed_count, bot_name, sequence = self._process_bot_response_messages(api_response,
-                                                                                              processed_count,
-                                                                                              chat_messages,
-                                                                                              rich_messages)
-                    if bot_name == "":
-                        continue
-                # meaning the initial message from agent is empty, continue for another try
-                if len(chat_messages) == 0:
-                    continue
-                # Start the conversation between BotSIM and bot
-                while not session_finished:
-                    if len(chat_messages) == 0 \
-                            and (user_simulator.state["action"] == "inform" or
-                                 user_simulator.state["action"] == "request") \
-                            and ("Goodbye" not in user_simulator.state["inform_slots"]):
-                        discard_episode = True
-                        break
-                    # get a list of bot actions to respond based on bot messages  and put them
-                    # to a queue user_simulator.state["bot_action_queue"]
-                    # Meanwhile, the chat_messages will be checked for potential simulation errors and return
-                    # the error info in "res". Otherwise, None will be returned
+            # Step 1: create a live agent session
+            try:
+                with self.metrics.span("session"):
+                    api_response = await self.retry_policy.call(
+                        lambda: client.get(end_point + "/rest/System/SessionId", headers=headers_raw),
+                        retry_budget, httpx.RequestError)
+            except httpx.RequestError:
+                failed += 1
+                continue
+            if api_response.status_code != 200:
+                failed += 1
+                continue
+            # Step 2: create a chat visitor session
+            session_response = json.loads(api_response.text)
+            client_poll_timeout = session_response["clientPollTimeout"] * 0.1
+            session_headers = {
+                "X-LIVEAGENT-API-VERSION": "50",
+                "X-LIVEAGENT-AFFINITY": session_response["affinityToken"],
+                "X-LIVEAGENT-SESSION-KEY": session_response["key"]
+            }
+            chasitor_data = {
+                "agentId": None,
+                "buttonId": simulation_config["api"]["button_Id"],
+                "buttonOverrides": [],
+                "deploymentId": simulation_config["api"]["deployment_Id"],
+                "doFallback": True,
+                "isPost": True,
+                "language": "en-US",
+                "organizationId": simulation_config["api"]["org_Id"],
+                "prechatDetails": [],
+                "prechatEntities": [],
+                "receiveQueueUpdates": True,
+                "screenResolution": "2560x1440",
+                "sessionId": session_response["id"],
+                "userAgent": "LiveAgent Python Client v1.0.0",
+                "visitorName": "BotSIM"
+            }
+            try:
+                with self.metrics.span("chasitor_init"):
+                    api_response = await self.retry_policy.call(
+                        lambda: client.post(end_point + "/rest/Chasitor/ChasitorInit",
+                                            data=json.dumps(chasitor_data),
+                                            headers=session_headers),
+                        retry_budget, httpx.RequestError)
+                if api_response.status_code != 200:
+                    discard_episode = True
+            except httpx.RequestError:
+                print("ChasitorInit failed after retries")
+                failed += 1
+                continue
+
+            async def poll_messages(ack, pc, timeout):
+                # a poll timeout means the bot has finished its turn, so only connection
+                # failures are retried
+                with self.metrics.span("poll"):
+                    return await self.retry_policy.call(
+                        lambda: client.get(end_point + "/rest/System/Messages",
+                                           headers=session_headers,
+                                           timeout=timeout,
+                                           params={"ack": ack, "pc": pc}),
+                        retry_budget, httpx.NetworkError)
+
+            # Step 3 begin conversation
+            # The bot API response can have two types of messages, namely ChatMessage messages and RichMessage
+            chat_messages = []
+            rich_messages = []
+            sequence = -1
+            processed_count = 0
+            session_finished = False
+            # polling the first agent message
+            _, processed_count, bot_name, sequence = await self._poll_bot_turn(poll_messages, user_simulator,
+                                                                               client_poll_timeout, sequence,
+                                                                               processed_count, chat_messages,
+                                                                               rich_messages)
+            # meaning the initial message from agent is empty, continue for another try
+            if len(chat_messages) == 0:
+                failed += 1
+                continue
+            # Start the conversation between BotSIM and bot
+            while not session_finished:
+                if len(chat_messages) == 0 \
+                        and (user_simulator.state["action"] == "inform" or
+                             user_simulator.state["action"] == "request") \
+                        and ("Goodbye" not in user_simulator.state["inform_slots"]):
+                    discard_episode = True
+                    break
+                # get a list of bot actions to respond based on bot messages  and put them
+                # to a queue user_simulator.state["bot_action_queue"]
+                # Meanwhile, the chat_messages will be checked for potential simulation errors and return
+                # the error info in "res". Otherwise, None will be returned
+                with self.metrics.span("nlu"):
                     res = user_simulator.enqueue_bot_actions_from_bot_messages(bot_name,
                                                                                chat_messages,
                                                                                bot_action_frame,
-                                                                               start_episode,
+                                                                               episode_index,
                                                                                self.dialog_logs)
-                    if res and not discard_episode:
-                        if "to_discard" in res or len(res) == 0:
-                            discard_episode = True
-                            break
-                        episode_success, \
-                        episode_intent_error, \
-                        episode_ner_error, \
-                        episode_other_error, \
-                        episode_turns = user_simulator.log_episode_simulation_results(res,
-                                                                                      start_episode,
+                if res and not discard_episode:
+                    if "to_discard" in res or len(res) == 0:
+                        discard_episode = True
+                        break
+                    episode_success, \
+                    episode_intent_error, \
+                    episode_ner_error, \
+                    episode_other_error, \
+                    episode_turns = user_simulator.log_episode_simulation_results(res,
+                                                                                  episode_index,
+                                                                                  self.dialog_logs,
+                                                                                  self.dialog_errors)
+                    break
+
+                # now the agent actions of the turn is in bot_action_frame_queue, we need to
+                # process them one by one
+                print(bot_action_frame["round"], "BotSIM: ")
+
+                concat_user_response = "{} BotSIM: ".format(bot_action_frame["round"])
+                # responding to multiple system actions in one turn
+                reply = None
+                for act in user_simulator.state["bot_action_queue"]:
+                    with self.metrics.span("nlg"):
+                        usr_action, natural_language_user_response, user_response_slots = \
+                            user_simulator.policy(act)
+                    user_simulator.state["user_response"] = natural_language_user_response
+                    user_response = natural_language_user_response
+
+                    user_simulator.dialog_turn_stack.append(
+                        DialogTurn(usr_action,
+                                   bot_action_frame["round"],
+                                   natural_language_user_response,
+                                   user_response_slots,
+                                   simulation_intent))
+
+                    print("\t" + cut_string(user_response, 15))
+
+                    concat_user_response += " {} ".format(user_response)
+
+                    replies = user_response
+                    reply = {"text": replies}
+
+                    if user_simulator.state["action"] == "fail":
+                        self.dialog_logs[episode_index]["chat_log"].append(concat_user_response)
+                        result = user_simulator.backtrack_simulation_errors()
+                        session_finished = True
+                    elif "Goodbye" in user_simulator.state["inform_slots"] \
+                            or user_simulator.state["action"] == "thanks":
+                        print("=" * 10 + " SUCCESS dialog " + "=" * 10)
+                        self.dialog_logs[episode_index]["chat_log"].append(concat_user_response)
+                        result = {"num_turns": bot_action_frame["round"], "error": "Success", "status": 0,
+                                  "error_turn_index": -1, "error_turn": "", "error_turn_slots": "",
+                                  "error_slot": ""}
+                        session_finished = True
+                    if session_finished:
+                        episode_success, episode_intent_error, episode_ner_error, episode_other_error, \
+                        episode_turns = user_simulator.log_episode_simulation_results(result,
+                                                                                      episode_index,
                                                                                       self.dialog_logs,
                                                                                       self.dialog_errors)
-                        batch_success += episode_success
-                        batch_turns += episode_turns
-                        batch_ner_error += episode_ner_error
-                        batch_intent_error += episode_intent_error
-                        batch_other_error += episode_other_error
                         break
 
-                    # now the agent actions of the turn is in bot_action_frame_queue, we need to
-                    # process them one by one
-                    print(bot_action_frame["round"], "BotSIM: ")
-
-                    concat_user_response = "{} BotSIM: ".format(bot_action_frame["round"])
-                    # responding to multiple system actions in one turn
-                    for act in user_simulator.state["bot_action_queue"]:
-                        usr_action, natural_language_user_response, user_response_slots = user_simulator.policy(act)
-                        user_simulator.state["user_response"] = natural_language_user_response
-                        user_response = natural_language_user_response
-
-                        user_simulator.dialog_turn_stack.append(
-                            (usr_action,
-                             bot_action_frame["round"],
-                             natural_language_user_response,
-                             user_response_slots,
-                             simulation_intent))
-
-                        print("\t" + cut_string(user_response, 15))
-
-                        concat_user_response += " {} ".format(user_response)
-
-                        replies = user_response
-                        reply = {"text": replies}
-
-                        if user_simulator.state["action"] == "fail":
-                            self.dialog_logs[start_episode]["chat_log"].append(concat_user_response)
-                            result = user_simulator.backtrack_simulation_errors()
-                            session_finished = True
-                        elif "Goodbye" in user_simulator.state["inform_slots"] \
-                                or user_simulator.state["action"] == "thanks":
-                            print("=" * 10 + " SUCCESS dialog " + "=" * 10)
-                            self.dialog_logs[start_episode]["chat_log"].append(concat_user_response)
-                            result = {"num_turns": bot_action_frame["round"], "error": "Success", "status": 0,
-                                      "error_turn_index": -1, "error_turn": "", "error_turn_slots": "",
-                                      "error_slot": ""}
-                            session_finished = True
-                        if session_finished:
-                            episode_success, episode_intent_error, episode_ner_error, episode_other_error, \
-                            episode_turns = user_simulator.log_episode_simulation_results(result,
-                                                                                          start_episode,
-                                                                                          self.dialog_logs,
-                                                                                          self.dialog_errors)
-                            batch_success += episode_success
-                            batch_turns += episode_turns
-                            batch_ner_error += episode_ner_error
-                            batch_intent_error += episode_intent_error
-                            batch_other_error += episode_other_error
-                            break
-
-                    self.dialog_logs[start_episode]["chat_log"].append(concat_user_response)
-
-                    bot_action_frame["round"] = bot_action_frame["round"] + 1
-                    user_simulator.state["bot_action_queue"] = []
-
-                    # post  BotSIM response to bot
-                    retry = False
-                    try:
-                        await client.post("{}/rest/Chasitor/ChatMessage".format(end_point),
-                                          headers={
-                                              "X-LIVEAGENT-API-VERSION": "50",
-                                              "X-LIVEAGENT-AFFINITY": session_response["affinityToken"],
-                                              "X-LIVEAGENT-SESSION-KEY": session_response["key"]
-                                          }, data=json.dumps(reply))
-                    except httpx.RequestError:
-                        time.sleep(2)
-                        retry = True
-
-                    if retry:
-                        try:
-                            api_response = await client.post("{}/rest/Chasitor/ChatMessage".format(end_point),
-                                                             headers={
-                                                                 "X-LIVEAGENT-API-VERSION": "50",
-                                                                 "X-LIVEAGENT-AFFINITY": session_response[
-                                                                     "affinityToken"],
-                                                                 "X-LIVEAGENT-SESSION-KEY": session_response["key"]
-                                                             }, data=json.dumps(reply))
-                            if api_response.status_code != 200:
-                                discard_episode = True
-                        except httpx.RequestError:
-                            time.sleep(5)
-                            break
-
-                    bot_name = ""
-                    chat_messages = []
-                    rich_messages = []
-                    api_response = None
-                    # polling the next agent message
-                    while True:
-                        try:
-                            api_response = await client.get("{}/rest/System/Messages".format(end_point),
-                                                            headers={
-                                                                "X-LIVEAGENT-API-VERSION": "50",
-                                                                "X-LIVEAGENT-AFFINITY": session_response[
-                                                                    "affinityToken"],
-                                                                "X-LIVEAGENT-SESSION-KEY": session_response["key"]
-                                                            },
-                                                            timeout=client_poll_timeout,
-                                                            params={"ack": sequence, "pc": processed_count})
-                        except httpx.RequestError:
-                            if api_response:
-                                pass
-                            break
-                        if api_response.status_code != 200:
-                            discard_episode = True
-                            break
-                        processed_count, bot_name, sequence = self._process_bot_response_messages(api_response,
-                                                                                                  processed_count,
-                                                                                                  chat_messages,
-                                                                                                  rich_messages)
-                        if bot_name == "":
-                            continue
-                retry = False
+                if not session_finished:
+                    self.dialog_logs[episode_index]["chat_log"].append(concat_user_response)
+
+                bot_action_frame["round"] = bot_action_frame["round"] + 1
+                user_simulator.state["bot_action_queue"] = []
+                # no bot dialog act to respond to, e.g., the bot only sent small talk messages
+                if reply is None:
+                    discard_episode = True
+                    break
+
+                # post  BotSIM response to bot
                 try:
-                    await client.post("{}/rest/Chasitor/ChatEnd".format(end_point),
-                                      headers={
-                                          "X-LIVEAGENT-API-VERSION": "50",
-                                          "X-LIVEAGENT-AFFINITY": session_response["affinityToken"],
-                                          "X-LIVEAGENT-SESSION-KEY": session_response["key"]
-                                      },
-                                      data=json.dumps({"type": "ChatEndReason", "reason": "client"}))
-                    await client.aclose()
+                    with self.metrics.span("chat_message"):
+                        api_response = await self.retry_policy.call(
+                            lambda: client.post("{}/rest/Chasitor/ChatMessage".format(end_point),
+                                                headers=session_headers, data=json.dumps(reply)),
+                            retry_budget, CHAT_MESSAGE_RETRY_EXCEPTIONS, CHAT_MESSAGE_RETRY_STATUS_CODES)
+                    if api_response.status_code != 200:
+                        discard_episode = True
                 except httpx.RequestError:
-                    time.sleep(60)
-                    retry = True
-                if retry:
-                    try:
-                        api_response = await client.post("{}/rest/Chasitor/ChatEnd".format(end_point),
-                                                         headers={
-                                                             "X-LIVEAGENT-API-VERSION": "50",
-                                                             "X-LIVEAGENT-AFFINITY": session_response["affinityToken"],
-                                                             "X-LIVEAGENT-SESSION-KEY": session_response["key"]
-                                                         },
-                                                         data=json.dumps({"type": "ChatEndReason", "reason": "client"}))
-                        if api_response.status_code != 200:
-                            discard_episode = True
-                        await client.aclose()
-                    except httpx.RequestError:
-                        print("ChatEnd retry exception")
-
-            start_episode += 1
-            if not discard_episode:
-                num_simulations += 1
-
-        return batch_success, batch_ner_error, batch_intent_error, batch_other_error, \
-               batch_turns, num_simulations
-
-    def simulate_conversation(self, database=None):
-        simulation_goals, chatlog_file, user_error_turns_file = self._prepare_simulation()
-        success, ner_error, intent_error, other_error, total_turns, total_episodes = 0, 0, 0, 0, 0, 0
-
-        self.dialog_logs = {"summary": {}}
-        self.dialog_errors = {}
-
-        for episode_index in range(self.continue_episode, len(simulation_goals), self.batch_size):
-            event_loop = asyncio.new_event_loop()
-            asyncio.set_event_loop(event_loop)
-            episode_success, episode_ner_error, episode_intent_error, episode_other_error, episode_turns, episode_processed = \
-                event_loop.run_until_complete(
-                    self.perform_batch_simulation(
-                        simulation_goals,
-                        self.intent_name,  # .replace("_eval", ""),
-                        episode_index, self.config))
-            success += episode_success
-            ner_error += episode_ner_error
-            intent_error += episode_intent_error
-            other_error += episode_other_error
-            total_turns += episode_turns
-            total_episodes += episode_processed
-
-            if database:
-                database.save_result_to_database(self.config["id"],
-                                                 self.intent_name,
-                                                 self.mode,
-                                                 total_episodes,
-                                                 success,
-                                                 intent_error,
-                                                 ner_error,
-                                                 other_error,
-                                                 total_turns
-                                                 )
-
-            time.sleep(3)
-            if total_episodes % 50 == 0 and total_episodes > 0:
-                header = "\n\n========= Simulation up to Episode " + \
-                         str(total_episodes) + ": ==========\n"
-                self.simulation_summary(header, total_episodes, total_turns, success, intent_error, ner_error,
-                                        other_error)
-        if total_episodes == 0:
-            raise ConnectionRefusedError("all dialogs have been discarded")
-        header = "\n\n========= Simulation summary: ==========\n"
-        summary = self.simulation_summary(header, total_episodes, total_turns, success, intent_error, ner_error,
-                                          other_error)
-
-        return self.dump_simulation_logs(summary,
-                                         database,
-                                         total_episodes,
-                                         total_turns,
-                                         success,
-                                         intent_error,
-                                         ner_error,
-                                         other_error,
-                                         chatlog_file,
-                                         user_error_turns_file)
+                    discard_episode = True
+                    break
 
+                chat_messages = []
+                rich_messages = []
+                # polling the next agent message
+                polled, processed_count, bot_name, sequence = await self._poll_bot_turn(poll_messages,
+                                                                                        user_simulator,
+                                                                                        client_poll_timeout,
+                                                                                        sequence,
+                                                                                        processed_count,
+                                                                                        chat_messages,
+                                                                                        rich_messages)
+                if not polled:
+                    discard_episode = True
+            try:
+                with self.metrics.span("chat_end"):
+                    api_response = await self.retry_policy.call(
+                        lambda: client.post("{}/rest/Chasitor/ChatEnd".format(end_point),
+                                            headers=session_headers,
+                                            data=json.dumps({"type": "ChatEndReason", "reason": "client"})),
+                        retry_budget, httpx.RequestError)
+                if api_response.status_code != 200:
+                    discard_episode = True
+            except httpx.RequestError:
+                print("ChatEnd retry exception")
+
+            if failed:
+                self.metrics.increment("session_failures", failed)
+            if discard_episode:
+                return 0, 0, 0, 0, 0, 0
+            return episode_success, episode_ner_error, episode_intent_error, episode_other_error, \
+                   episode_turns, 1
+
+    def api_client_key(self):
+        return "Einstein_Bot", self.config["api"]["end_point"]
+
+    async def create_api_client(self):
+        return self._create_http_client()
+
+    def set_api_client(self, api_client):
+        self.http_client = api_client
+
+    async def close_api_client(self, api_client):
+        await api_client.aclose()
@@ -70,9 +70,12 @@ class Generator(GeneratorBase):
 
     def __init__(self, parser_config, num_t5_paraphrases=0,
                  num_pegasus_paraphrases=0,
-                 num_goals_per_intent=500):
+                 num_goals_per_intent=500,
+                 paraphrase_device=None,
+                 paraphrase_backend=None):
 
-        super(Generator, self).__init__(parser_config, num_t5_paraphrases, num_pegasus_paraphrases, num_goals_per_intent)
+        super(Generator, self).__init__(parser_config, num_t5_paraphrases, num_pegasus_paraphrases, num_goals_per_intent,
+                                        paraphrase_device, paraphrase_backend)
         self.parser = DialogFlowCXParser(parser_config)
         self.parser_config = parser_config
 
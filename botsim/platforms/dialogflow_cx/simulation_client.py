@@ -3,176 +3,176 @@
 #   SPDX-License-Identifier: BSD-3-Clause
 #   For full license text, see the LICENSE file in the repo root or https://opensource.org/licenses/BSD-3-Clause
 
-import uuid, os
+import uuid, os, time
 
-from google.api_core.exceptions import InvalidArgument
+from google.api_core.exceptions import InvalidArgument, ResourceExhausted, ServiceUnavailable, \
+    DeadlineExceeded, InternalServerError
 from google.cloud.dialogflowcx_v3beta1.types import session
 from botsim.modules.simulator.simulation_client_base import UserSimulatorClientInterface
 
-from botsim.modules.simulator.user_simulator import UserSimulator
+from botsim.modules.simulator.abus import DialogTurn
+from botsim.modules.simulator.retry_policy import AsyncRetryPolicy
+from botsim.modules.simulator.rate_limiter import AsyncRateLimiter
 from botsim.modules.generator.utils.dialogflow_cx import parser_utils
 from botsim.botsim_utils.utils import cut_string, seed_everything
 
 seed_everything(42)
 
+# transient API errors to be retried, i.e., quota exceeded (429) or service unavailable (503), which are returned
+# before the agent processes the turn
+RETRY_EXCEPTIONS = (ResourceExhausted, ServiceUnavailable)
+# detect_intent is not idempotent, after a timeout (504) or an internal error (500) the agent may already have
+# processed the turn and advanced the session, so the episode is discarded instead of replaying the user response
+DISCARD_EXCEPTIONS = RETRY_EXCEPTIONS + (DeadlineExceeded, InternalServerError)
+
 
 class DialogFlowCXClient(UserSimulatorClientInterface):
 
     def __init__(self, config):
         super().__init__(config)
-
-    def perform_batch_simulation(self, simulation_goals, simulation_intent,
-                                 start_episode, simulation_config):
-        """
-        Perform one batch of dialog simulation
-        :param simulation_goals: list of simulation goals
+        project_id = config["api"]["project_id"]
+        location_id = config["api"]["location_id"]
+        agent_id = config["api"]["agent_id"]
+        self.agent_path = f"projects/{project_id}/locations/{location_id}/agents/{agent_id}"
+        self.project_id = project_id
+        # the requests/second budget applies per project, across all clients of the process
+        self.retry_policy = AsyncRetryPolicy.from_config(config, AsyncRateLimiter.from_config(config, project_id),
+                                                         self.metrics)
+        self.session_client = None
+
+    async def _detect_intent(self, session_id, user_response, retry_budget):
+        """ Post the user response to the agent and return the agent messages """
+        text_input = session.TextInput(text=user_response)
+        query_input = session.QueryInput(text=text_input, language_code="en")
+        request = session.DetectIntentRequest(session=session_id, query_input=query_input)
+
+        async def send_request():
+            # the bot response latency excludes the rate limiter and retry delays
+            start = time.perf_counter()
+            response = await self.session_client.detect_intent(request=request)
+            self.metrics.observe("bot_response", time.perf_counter() - start)
+            return response
+
+        with self.metrics.span("detect_intent"):
+            response = await self.retry_policy.call(send_request, retry_budget, RETRY_EXCEPTIONS)
+        return [" ".join(txt.replace("\n", "").split())
+                for msg in response.query_result.response_messages
+                for txt in msg.text.text]
+
+    async def _simulate_episode(self,
+                                user_simulator,
+                                simulation_intent,
+                                episode_index,
+                                simulation_config):
+        """ Simulate one dialog episode against the DialogFlow CX sessions API. Throttled or unavailable API calls
+        are retried by self.retry_policy within a retry budget per session and the episode is discarded once the
+        retries are exhausted or the call times out or fails on the server side.
+
+        :param user_simulator: the UserSimulator instance owned by this episode until it finishes
         :param simulation_intent: intent for simulation
-        :param start_episode: episode index to start
+        :param episode_index: index of the simulation goal to simulate
         :param simulation_config: the simulation configuration
+        :return: (success, NER error, intent error, other error, number of turns, number of simulated episodes)
+                 of the episode
         """
-        project_id = simulation_config["api"]["project_id"]
-        location_id = simulation_config["api"]["location_id"]
-        agent_id = simulation_config["api"]["agent_id"]
-        google_cloud_agent_path = f"projects/{project_id}/locations/{location_id}/agents/{agent_id}"
-
-        batch_success, batch_ner_error, batch_intent_error, batch_other_error = 0, 0, 0, 0
-        batch_turns, num_simulations = 0, 0
-        user_simulator = UserSimulator(simulation_goals, simulation_config)
-
-        while start_episode < len(simulation_goals) and num_simulations < self.batch_size:
-            discard_episode = False
-            # print("Episode ", start_episode)
-            user_simulator.reset(start_episode)
-            self.dialog_logs[start_episode] = {"goal": user_simulator.goal, "chat_log": []}
-
-            bot_action_frame = {"inform_slots": {}, "request_slots": {}, "round": 1, "action": "", "message": ""}
-            session_finished = False
-            session_path, session_client = parser_utils.create_session(google_cloud_agent_path)
-            session_id = google_cloud_agent_path + "/sessions/" + str(uuid.uuid4())
-            normal_message = []
-
-            while not session_finished:
+        episode_success, episode_ner_error, episode_intent_error, episode_other_error, episode_turns = \
+            0, 0, 0, 0, 0
+        discard_episode = False
+        # print("Episode ", episode_index)
+        user_simulator.reset(episode_index)
+        self.dialog_logs[episode_index] = {"goal": user_simulator.goal, "chat_log": []}
+
+        bot_action_frame = {"inform_slots": {}, "request_slots": {}, "round": 1, "action": "", "message": ""}
+        session_finished = False
+        session_id = self.agent_path + "/sessions/" + str(uuid.uuid4())
+        retry_budget = self.retry_policy.new_session_budget()
+        normal_message = []
+
+        while not session_finished:
+            with self.metrics.span("nlu"):
                 res = user_simulator.enqueue_bot_actions_from_bot_messages(
-                    "DialogFlow CX", normal_message, bot_action_frame, start_episode, self.dialog_logs)
-                if res and not discard_episode:
-                    if "to_discard" in res:
-                        discard_episode = True
-                        break
-                    episode_success, \
-                    episode_intent_error, \
-                    episode_ner_error, \
-                    episode_other_error, \
-                    episode_turns = \
-                        user_simulator.log_episode_simulation_results(res, start_episode, self.dialog_logs,
-                                                                      self.dialog_errors)
-                    batch_success += episode_success
-                    batch_turns += episode_turns
-                    batch_ner_error += episode_ner_error
-                    batch_intent_error += episode_intent_error
-                    batch_other_error += episode_other_error
+                    "DialogFlow CX", normal_message, bot_action_frame, episode_index, self.dialog_logs)
+            if res and not discard_episode:
+                if "to_discard" in res:
+                    discard_episode = True
+                    break
+                episode_success, episode_intent_error, episode_ner_error, episode_other_error, episode_turns = \
+                    user_simulator.log_episode_simulation_results(res, episode_index, self.dialog_logs,
+                                                                  self.dialog_errors)
+                break
+            print(bot_action_frame["round"], "BotSIM: ")
+
+            concat_user_response = "{} BotSIM: ".format(bot_action_frame["round"])
+
+            # responding to multiple system actions in one turn
+            for act in user_simulator.state["bot_action_queue"]:
+                if act["action"] == "inform":
+                    continue
+                with self.metrics.span("nlg"):
+                    usr_action, user_response, user_response_slots = user_simulator.policy(act)
+                user_simulator.state["user_response"] = user_response
+                print("\t" + cut_string(user_response, 15))
+
+                concat_user_response += " {} ".format(user_response)
+
+                if user_simulator.state["action"] == "fail":
+                    self.dialog_logs[episode_index]["chat_log"].append(concat_user_response)
+                    result = user_simulator.backtrack_simulation_errors()
+                    session_finished = True
+                elif "Goodbye" in user_simulator.state["inform_slots"] \
+                        or user_simulator.state["action"] == "goodbye":
+
+                    print("=" * 10 + " SUCCESS dialog " + "=" * 10)
+
+                    self.dialog_logs[episode_index]["chat_log"].append(concat_user_response)
+                    result = {"num_turns": bot_action_frame["round"], "error": "Success", "status": 0,
+                              "error_turn_index": -1, "error_turn": "", "error_turn_slots": "", "error_slot": ""}
+                    session_finished = True
+                if session_finished:
+                    episode_success, episode_intent_error, episode_ner_error, \
+                    episode_other_error, episode_turns = user_simulator.log_episode_simulation_results(
+                        result, episode_index, self.dialog_logs, self.dialog_errors)
+                    break
+            user_simulator.dialog_turn_stack.append(
+                DialogTurn(usr_action,
+                           bot_action_frame["round"],
+                           user_response,
+                           user_response_slots,
+                           simulation_intent))
+            bot_action_frame["round"] = bot_action_frame["round"] + 1
+            user_simulator.state["bot_action_queue"] = []
+            if not session_finished:
+                self.dialog_logs[episode_index]["chat_log"].append(concat_user_response)
+            # post user response to agent
+            if len(user_response) > 0 and not session_finished:
+                try:
+                    normal_message = await self._detect_intent(session_id, user_response, retry_budget)
+                except InvalidArgument:
+                    raise
+                except DISCARD_EXCEPTIONS:
+                    discard_episode = True
                     break
-                print(bot_action_frame["round"], "BotSIM: ")
 
-                concat_user_response = "{} BotSIM: ".format(bot_action_frame["round"])
+        if discard_episode:
+            return 0, 0, 0, 0, 0, 0
+        return episode_success, episode_ner_error, episode_intent_error, episode_other_error, episode_turns, 1
 
-                # responding to multiple system actions in one turn
-                for act in user_simulator.state["bot_action_queue"]:
-                    if act["action"] == "inform":
-                        continue
-                    usr_action, user_response, user_response_slots = user_simulator.policy(act)
-                    user_simulator.state["user_response"] = user_response
-                    print("\t" + cut_string(user_response, 15))
-
-                    concat_user_response += " {} ".format(user_response)
-
-                    if user_simulator.state["action"] == "fail":
-                        self.dialog_logs[start_episode]["chat_log"].append(concat_user_response)
-                        result = user_simulator.backtrack_simulation_errors()
-                        session_finished = True
-                    elif "Goodbye" in user_simulator.state["inform_slots"] \
-                            or user_simulator.state["action"] == "goodbye":
-
-                        print("=" * 10 + " SUCCESS dialog " + "=" * 10)
-
-                        self.dialog_logs[start_episode]["chat_log"].append(concat_user_response)
-                        result = {"num_turns": bot_action_frame["round"], "error": "Success", "status": 0,
-                                  "error_turn_index": -1, "error_turn": "", "error_turn_slots": "", "error_slot": ""}
-                        session_finished = True
-                    if session_finished:
-                        episode_success, episode_intent_error, episode_ner_error, \
-                        episode_other_error, episode_turns = user_simulator.log_episode_simulation_results(
-                            result, start_episode, self.dialog_logs, self.dialog_errors)
-                        batch_success += episode_success
-                        batch_turns += episode_turns
-                        batch_ner_error += episode_ner_error
-                        batch_intent_error += episode_intent_error
-                        batch_other_error += episode_other_error
-                        break
-                user_simulator.dialog_turn_stack.append(
-                    (usr_action,
-                     bot_action_frame["round"],
-                     user_response,
-                     user_response_slots,
-                     simulation_intent))
-                bot_action_frame["round"] = bot_action_frame["round"] + 1
-                user_simulator.state["bot_action_queue"] = []
-                self.dialog_logs[start_episode]["chat_log"].append(concat_user_response)
-                # post user response to agent
-                if len(user_response) > 0:
-                    text_input = session.TextInput(text=user_response)
-                    query_input = session.QueryInput(text=text_input, language_code="en")
-                    try:
-                        request = session.DetectIntentRequest(session=session_id, query_input=query_input)
-                        response = session_client.detect_intent(request=request)
-                    except InvalidArgument:
-                        raise
-
-                    text = [" ".join(txt.replace("\n", "").split())
-                            for msg in response.query_result.response_messages
-                            for txt in msg.text.text]
-                    normal_message = text
-            start_episode += 1
-            if not discard_episode:
-                num_simulations += 1
-
-        return batch_success, batch_ner_error, batch_intent_error, batch_other_error, batch_turns, num_simulations
-
-    def simulate_conversation(self, database=None):
-
-        intent_goals, chatlog_file, user_error_turns_file = self._prepare_simulation()
-        success, ner_error, intent_error, other_error, total_turns, total_episodes = 0, 0, 0, 0, 0, 0
+    def start_simulation(self):
         os.environ["GOOGLE_APPLICATION_CREDENTIALS"] = self.config["api"]["cx_credential"]
-        self.dialog_logs["summary"] = {}
-        for episode_index in range(self.continue_episode, len(intent_goals), self.batch_size):
-            succ, ner, intent, other, turns, episode_processed = \
-                self.perform_batch_simulation(
-                    intent_goals,
-                    self.intent_name.replace("_eval", ""),
-                    episode_index, self.config)
-            success += succ
-            ner_error += ner
-            intent_error += intent
-            other_error += other
-            total_turns += turns
-            total_episodes += episode_processed
-            # time.sleep(60)
-            if total_episodes % 50 == 0 and total_episodes > 0:
-                header = "\n\n========= Simulation up to Episode " + \
-                         str(total_episodes) + ": ==========\n"
-                self.simulation_summary(header, total_episodes, total_turns, success, intent_error, ner_error,
-                                        other_error)
-
-        header = "\n\n========= Simulation summary: ==========\n"
-        summary = self.simulation_summary(header, total_episodes, total_turns, success, intent_error, ner_error,
-                                          other_error)
-        return self.dump_simulation_logs(summary,
-                                         database,
-                                         total_episodes,
-                                         total_turns,
-                                         success,
-                                         intent_error,
-                                         ner_error,
-                                         other_error,
-                                         chatlog_file,
-                                         user_error_turns_file)
+        episode_indices, counters = super().start_simulation()
+        self.simulation_intent = self.intent_name.replace("_eval", "")
+        return episode_indices, counters
+
+    def api_client_key(self):
+        return "DialogFlow_CX", self.project_id
+
+    async def create_api_client(self):
+        # the grpc channel of the async client is bound to the running event loop
+        _, session_client = parser_utils.create_async_session(self.agent_path)
+        return session_client
+
+    def set_api_client(self, api_client):
+        self.session_client = api_client
 
+    async def close_api_client(self, api_client):
+        await api_client.transport.close()
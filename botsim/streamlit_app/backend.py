@@ -8,6 +8,8 @@ import os
 
 from botsim.botsim_utils.utils import read_s3_json, dump_json_to_file, S3_BUCKET_NAME
 from botsim.modules.remediator.Remediator import Remediator
+from botsim.models.model_registry import preload_simulation_models
+from botsim.modules.simulator.simulation_scheduler import SimulationScheduler
 from botsim.streamlit_app import postgres_path
 from botsim.streamlit_app.database import Database
 
@@ -52,7 +54,9 @@ def _init_generator(test_instance):
 
     generator = Generator(parser_config,
                           num_t5_paraphrases=config["generator"]["paraphraser_config"]["num_t5_paraphrases"],
-                          num_pegasus_paraphrases=config["generator"]["paraphraser_config"]["num_pegasus_paraphrases"])
+                          num_pegasus_paraphrases=config["generator"]["paraphraser_config"]["num_pegasus_paraphrases"],
+                          paraphrase_device=config["generator"]["paraphraser_config"].get("device"),
+                          paraphrase_backend=config["generator"]["paraphraser_config"].get("backend"))
     return generator, config
 
 def parse_metadata(test_instance):
@@ -115,6 +119,8 @@ def apply_paraphrasing(test_instance):
             config["generator"][intent_set],
             config["generator"]["file_paths"]["goals_dir"],
             config["generator"]["paraphraser_config"]["num_utterances"])
+    if hasattr(generator, "paraphraser"):
+        generator.paraphraser.release_models()
     database.update_stage("s04_paraphrases_generated", test_instance["id"])
 
     ret["messages"] = "You are advised (optionally) to review the paraphrases and" \
@@ -243,9 +249,9 @@ def prepare_simulation_config(botsim_config, test_name, intent_name, mode):
     }
     return simulation_config
 
-def simulate_single_intent(job_json):
+def create_simulation_client(job_json):
     """
-    simulation sub-process for multi-process Einstein Bot simulation
+    Einstein Bot simulation client of one intent and mode
     :param job_json: a dictionary of simulation configurations including 1) test_instance 2) intent name 3) simulation mode
     """
     test_instance = job_json["test_instance"]
@@ -259,16 +265,20 @@ def simulate_single_intent(job_json):
     botsim_config["simulation"] = prepare_simulation_config(botsim_config, test_name, intent_name, mode)
     assert test_instance["type"] == "Einstein_Bot"
     from botsim.platforms.botbuilder.simulation_client import LiveAgentClient  # simulate_conversation
-    client = LiveAgentClient(botsim_config)
-    client.simulate_conversation(database)
+    return LiveAgentClient(botsim_config)
+
+
+def simulate_single_intent(job_json):
+    create_simulation_client(job_json).simulate_conversation(database)
 
 
 def simulate_conversations_multiprocess(test_instance):
     """
-    Multi-process simulation for Einstein bots. One sub-process for one intent.
+    Concurrent simulation for Einstein bots. The episodes of all intents are scheduled together by one
+    SimulationScheduler within the global concurrency cap and requests/second budget of the simulator config.
     :param test_instance: a bot test instance from the database
     """
-    print("multiprocess simulation of Einstein Bot")
+    print("concurrent simulation of Einstein Bot")
     if test_instance["stage"] >= "s06_simulation_completed":
         return {"status": "ok", "requirements": "simulate is done"}
 
@@ -292,31 +302,24 @@ def simulate_conversations_multiprocess(test_instance):
     if len(eval_intents) > 0:
         modes.append("eval")
 
-    intents = set(dev_intents + eval_intents)
-
     processed = {}
-    from multiprocessing import Pool
-    num_process = 4
-    if len(dev_jobs) > 0:
-        try:
-            pool = Pool(num_process)
-            pool.map(simulate_single_intent, dev_jobs)
-        finally:
-            pool.close()
-            pool.join()
-            for intent_name in intents:
-                processed[intent_name] = "success"
-    if len(eval_jobs) > 0:
-        try:
-            pool = Pool(num_process)
-            pool.map(simulate_single_intent, eval_jobs)
-        finally:
-            pool.close()
-            pool.join()
-            for intent_name in eval_intents:
-                processed[intent_name] = "success"
-
-    database.update_stage("s06_simulation_completed", id)
+    botsim_config = _load_simulation_config(test_instance)
+    # load the dialog act map and response template once for all simulation clients
+    preload_simulation_models(botsim_config)
+    scheduler = SimulationScheduler(botsim_config)
+    for job_json in dev_jobs + eval_jobs:
+        scheduler.add_client(create_simulation_client(job_json), database)
+    failed_jobs = []
+    # the jobs are returned in the order they are added, i.e., the dev intents followed by the eval intents
+    for intent_name, job in zip(dev_intents + eval_intents, scheduler.run()):
+        if job.error is not None:
+            print("simulation of {} failed: {}".format(intent_name, job.error))
+            failed_jobs.append(job)
+        processed[intent_name] = "success" if job.error is None else "failed: {}".format(job.error)
+
+    # the remediator reads the simulation logs of all intents, only complete simulations advance the stage
+    if not failed_jobs:
+        database.update_stage("s06_simulation_completed", test_instance["id"])
     return json.dumps(processed)
 
 
@@ -378,7 +381,7 @@ def botsim_simulation(test_id):
         elif test_instance["type"] == "Einstein_Bot":
             result = simulate_conversations_multiprocess(test_instance)
 
-        if result:
+        if result and all(status == "success" for status in json.loads(result).values()):
             database.update_stage("s06_simulation_completed", test_id)
         else:
             database.update_status(test_id, "running")
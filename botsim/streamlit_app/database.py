@@ -291,7 +291,8 @@ class Database:
         return insert(self.conn, test_instance)
 
     def save_result_to_database(self,
-                                test_id, intent, mode, total, success, intent_error, ner_error, other_error, turns):
+                                test_id, intent, mode, total, success, intent_error, ner_error, other_error, turns,
+                                metrics=None):
         """
         Save simulation results to results table
         :param test_id: test id
@@ -303,13 +304,26 @@ class Database:
         :param ner_error: number of episodes with NER errors
         :param other_error: number of episodes with other errors
         :param turns: tota number of dialog turns
+        :param metrics: optional simulation metrics (SimulationMetrics.to_dict) saved to the json column
         """
         if self.type == "postgres":
             from botsim.botsim_utils.database_postgres import save_result_to_database
         else:
             from botsim.botsim_utils.database_sqlite3 import save_result_to_database
         save_result_to_database(self.conn, test_id, intent, mode, total, success, intent_error, ner_error, other_error,
-                                turns)
+                                turns, metrics)
+
+    def retrieve_simulation_metrics(self, test_id):
+        """
+        Retrieve the simulation metrics of all intents of a test
+        :param test_id: test id
+        :return: list of metrics dicts (SimulationMetrics.to_dict)
+        """
+        if self.type == "postgres":
+            from botsim.botsim_utils.database_postgres import retrieve_simulation_metrics
+        else:
+            from botsim.botsim_utils.database_sqlite3 import retrieve_simulation_metrics
+        return retrieve_simulation_metrics(self.conn, test_id)
 
     def delete_bot_test_instance(self, test_id):
         """
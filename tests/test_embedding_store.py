@@ -0,0 +1,35 @@
+#  Copyright (c) 2022, salesforce.com, inc.
+#   All rights reserved.
+#   SPDX-License-Identifier: BSD-3-Clause
+#   For full license text, see the LICENSE file in the repo root or https://opensource.org/licenses/BSD-3-Clause
+
+import zlib
+import numpy as np
+
+from botsim.models.embedding_store import EmbeddingStore
+
+
+class FakeSentenceTransformer:
+    """ Deterministic 3-dimensional embeddings derived from the text """
+
+    def encode(self, sentences, **kwargs):
+        return np.array([[float(len(sentence)), float(zlib.crc32(sentence.encode()) % 1000), 1.0]
+                         for sentence in sentences], dtype=np.float32)
+
+
+def _store(store_dir):
+    store = EmbeddingStore("fake-model", str(store_dir))
+    store.sentence_transformer = FakeSentenceTransformer()
+    return store
+
+
+def test_encode_after_torn_write(tmp_path):
+    store = _store(tmp_path)
+    store.encode(["a", "bb"])
+    # an interrupted writer left a partial row
+    with open(store.matrix_path, "ab") as matrix_file:
+        matrix_file.write(b"\x01\x02\x03\x04\x05")
+    expected = FakeSentenceTransformer().encode(["ccc", "a", "bb"])
+    np.testing.assert_array_equal(store.encode(["ccc", "a", "bb"]), expected)
+    # a new process reads the same embeddings from the files
+    np.testing.assert_array_equal(_store(tmp_path).encode(["ccc", "a", "bb"]), expected)